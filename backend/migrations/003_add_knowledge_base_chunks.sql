@@ -0,0 +1,28 @@
+-- Migration: Add knowledge base chunks
+-- Description: Documents are split into chunks (with overlap); each chunk has its own
+-- vector and the character offsets inside the parent document
+
+CREATE TABLE IF NOT EXISTS knowledge_base_chunks (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES knowledge_base_items(id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    heading VARCHAR(255),
+    content TEXT NOT NULL,
+    embedding vector(1536)
+);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_chunks_document
+    ON knowledge_base_chunks(document_id);
+
+-- Vector similarity search index (HNSW)
+CREATE INDEX IF NOT EXISTS idx_knowledge_base_chunks_embedding
+    ON knowledge_base_chunks
+    USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+-- Documents ingested with chunking keep the vectors on their chunks
+ALTER TABLE knowledge_base_items ALTER COLUMN embedding DROP NOT NULL;
+
+-- Existing documents must be re-ingested (scripts/seed_knowledge_base.py) to get chunks
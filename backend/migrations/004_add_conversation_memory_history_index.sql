@@ -0,0 +1,8 @@
+-- Migration: Composite index for paginated conversation history
+-- Description: ConversationStore.get_history reads one customer's messages
+-- newest first, keyset-paginated on (created_at, id):
+-- WHERE cliente_id = $1 [AND (created_at < $2 OR (created_at = $2 AND id < $3))]
+-- ORDER BY created_at DESC, id DESC
+
+CREATE INDEX IF NOT EXISTS idx_conversation_memory_cliente_created
+    ON conversation_memory(cliente_id, created_at DESC, id DESC);
@@ -0,0 +1,25 @@
+-- Migration: agent_sessions as a SessionManager backend (SESSION_BACKEND=postgres)
+-- Description: anonymous chats have no cliente_id yet, and expired sessions
+-- are swept in small batches so the cleanup never holds long locks.
+
+ALTER TABLE agent_sessions ALTER COLUMN cliente_id DROP NOT NULL;
+
+-- Batched variant of cleanup_expired_sessions() (migrations/002).
+-- Called repeatedly by the session sweeper until it returns < batch_size.
+CREATE OR REPLACE FUNCTION cleanup_expired_sessions(batch_size INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    deleted_count INTEGER;
+BEGIN
+    DELETE FROM agent_sessions
+    WHERE session_id IN (
+        SELECT session_id FROM agent_sessions
+        WHERE expires_at < CURRENT_TIMESTAMP
+        ORDER BY expires_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    );
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
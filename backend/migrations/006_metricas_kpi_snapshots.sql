@@ -0,0 +1,8 @@
+-- Migration: KPI snapshots in metricas
+-- Description: the KPI refresher stores every count of the dashboard in
+-- `kpis` and prunes old snapshots by data_atualizacao
+
+ALTER TABLE metricas ADD COLUMN IF NOT EXISTS kpis JSONB;
+
+CREATE INDEX IF NOT EXISTS ix_metricas_data_atualizacao
+    ON metricas(data_atualizacao);
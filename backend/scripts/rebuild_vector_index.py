@@ -0,0 +1,45 @@
+"""
+Mostra o estado e recria os índices ANN (pgvector) da base de conhecimento
+com a configuração atual (VECTOR_INDEX_TYPE, VECTOR_INDEX_HNSW_*, VECTOR_INDEX_IVFFLAT_*).
+
+Uso:
+    python scripts/rebuild_vector_index.py [--status] [--table knowledge_base_chunks]
+        [--no-concurrently]
+
+Para IVFFlat, recrie após cargas grandes: as listas são calculadas com os dados existentes.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Adiciona o diretório raiz ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.database import engine
+from src.services.vector_index import VECTOR_INDEXES, VectorIndexManager
+
+
+async def print_status():
+    async with engine.connect() as conn:
+        for item in await VectorIndexManager.status(conn):
+            state = "✅ ok" if item["up_to_date"] else ("⚠️ desatualizado" if item["exists"] else "❌ ausente")
+            print(f"{item['index']} ({item['table']}): {state}")
+            if item["definition"]:
+                print(f"    {item['definition']}")
+
+
+async def main(args):
+    if not args.status:
+        print("🔁 Recriando índices vetoriais...")
+        await VectorIndexManager.rebuild(engine, tables=args.table, concurrently=not args.no_concurrently)
+    await print_status()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerencia os índices vetoriais (pgvector).")
+    parser.add_argument("--status", action="store_true", help="Apenas mostra o estado dos índices")
+    parser.add_argument("--table", action="append", choices=[t for t, _, _ in VECTOR_INDEXES])
+    parser.add_argument("--no-concurrently", action="store_true", help="Recria bloqueando escrita (mais rápido)")
+    asyncio.run(main(parser.parse_args()))
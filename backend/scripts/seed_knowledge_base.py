@@ -1,3 +1,11 @@
+"""
+Popula a base de conhecimento a partir dos arquivos .txt de knowledge_base/.
+
+Uso:
+    python scripts/seed_knowledge_base.py [--dir knowledge_base]
+        [--batch-size 64] [--concurrency 4]
+"""
+import argparse
 import asyncio
 import os
 import sys
@@ -5,39 +13,54 @@ import sys
 # Adiciona o diretório raiz ao path para importar os módulos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.services.embedding_cache import flush_embedding_cache
 from src.services.rag_service import RAGService
 from src.config.database import init_db
+from src.config.settings import settings
+
+
+def read_documents(kb_dir):
+    """Lê os documentos sob demanda (um arquivo por vez)."""
+    with os.scandir(kb_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(".txt"):
+                continue
+            topic = entry.name.replace(".txt", "").replace("_", " ").title()
+            with open(entry.path, "r", encoding="utf-8") as f:
+                content = f.read()
+            print(f"📚 Processando: {topic}...")
+            yield topic, content
 
-async def seed():
+
+async def seed(args):
     print("🚀 Iniciando população da Base de Conhecimento...")
     
     # Garante que as tabelas existam
     await init_db()
     
-    kb_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge_base")
-    
-    if not os.path.exists(kb_dir):
-        print(f"❌ Diretório {kb_dir} não encontrado.")
+    if not os.path.exists(args.dir):
+        print(f"❌ Diretório {args.dir} não encontrado.")
         return
 
-    files = [f for f in os.listdir(kb_dir) if f.endswith(".txt")]
-    
-    for filename in files:
-        topic = filename.replace(".txt", "").replace("_", " ").title()
-        filepath = os.path.join(kb_dir, filename)
-        
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
-            
-        print(f"📚 Processando: {topic}...")
-        result = await RAGService.add_document(topic, content)
-        
-        if "error" in result:
-            print(f"❌ Erro ao adicionar {topic}: {result['error']}")
-        else:
-            print(f"✅ {topic} adicionado com sucesso (ID: {result['id']})")
+    report = await RAGService.ingest_documents(
+        read_documents(args.dir),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency
+    )
+    await flush_embedding_cache()
 
+    if report["failed"]:
+        print(f"❌ {report['failed']} documentos falharam (veja o log).")
+    print(
+        f"✅ {report['documents']} documentos em {report['batches']} lotes "
+        f"({report['elapsed_seconds']}s, {report['docs_per_second']} docs/s, {report['retries']} retentativas)"
+    )
     print("✨ Concluído!")
 
 if __name__ == "__main__":
-    asyncio.run(seed())
+    default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge_base")
+    parser = argparse.ArgumentParser(description="Popula a base de conhecimento (RAG).")
+    parser.add_argument("--dir", default=default_dir)
+    parser.add_argument("--batch-size", type=int, default=settings.KB_INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.KB_INGEST_CONCURRENCY)
+    asyncio.run(seed(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Treina os centróides do router local (fast path) a partir das decisões
+registradas do LLM router e reporta a taxa de concordância.
+
+Uso:
+    python scripts/train_router.py [--log data/router_decisions.jsonl]
+        [--output data/router_centroids.json] [--min-confidence 0.7]
+        [--holdout 0.2] [--margin 0.05] [--dry-run]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+# Adiciona o diretório raiz ao path para importar os módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.embedding_router import EmbeddingRouter, RoutingDecisionLog
+from src.config.settings import settings
+from src.services.embedding_cache import flush_embedding_cache
+from src.services.rag_service import RAGService
+
+BATCH_SIZE = 256
+
+
+async def embed_all(messages):
+    embeddings = []
+    for i in range(0, len(messages), BATCH_SIZE):
+        embeddings.extend(await RAGService.generate_embeddings(messages[i:i + BATCH_SIZE]))
+    return embeddings
+
+
+def agreement_report(router, labels, embeddings):
+    total = len(labels)
+    agree = covered = covered_agree = 0
+    for label, embedding in zip(labels, embeddings):
+        agent, _, margin = router.classify(embedding)
+        hit = agent == label
+        agree += hit
+        if margin >= router.margin_threshold:
+            covered += 1
+            covered_agree += hit
+    return {
+        "amostras": total,
+        "concordancia_total": agree / total if total else 0.0,
+        "cobertura_fast_path": covered / total if total else 0.0,
+        "concordancia_fast_path": covered_agree / covered if covered else 0.0,
+    }
+
+
+async def main(args):
+    print("🚀 Treinando router local a partir das decisões do LLM router...")
+
+    decisions = RoutingDecisionLog(args.log).read(min_confidence=args.min_confidence)
+    # Remove mensagens duplicadas mantendo a decisão mais recente
+    unique = {d["text"]: d["agent"] for d in decisions}
+    if len(set(unique.values())) < 2:
+        print(f"❌ Decisões insuficientes em {args.log} (são necessários ao menos 2 agentes).")
+        return
+
+    messages = list(unique.keys())
+    labels = [unique[m] for m in messages]
+    print(f"📚 {len(messages)} mensagens únicas. Gerando embeddings...")
+    embeddings = await embed_all(messages)
+    await flush_embedding_cache()
+
+    # Avaliação em holdout para medir concordância com o LLM router
+    indices = list(range(len(messages)))
+    random.Random(42).shuffle(indices)
+    split = int(len(indices) * (1 - args.holdout))
+    train_idx, test_idx = indices[:split], indices[split:]
+    if test_idx and len({labels[i] for i in train_idx}) >= 2:
+        holdout_router = EmbeddingRouter(
+            EmbeddingRouter.compute_centroids(
+                [labels[i] for i in train_idx], [embeddings[i] for i in train_idx]
+            ),
+            margin_threshold=args.margin,
+            raw_text=settings.ROUTER_DECISIONS_LOG_RAW_TEXT,
+        )
+        report = agreement_report(
+            holdout_router, [labels[i] for i in test_idx], [embeddings[i] for i in test_idx]
+        )
+        print("📊 Concordância com o LLM router (holdout):")
+        print(f"   Amostras:               {report['amostras']}")
+        print(f"   Concordância total:     {report['concordancia_total']:.1%}")
+        print(f"   Cobertura do fast path: {report['cobertura_fast_path']:.1%} (margem >= {args.margin})")
+        print(f"   Concordância no fast path: {report['concordancia_fast_path']:.1%}")
+
+    if args.dry_run:
+        print("ℹ️ Dry-run: centróides não foram salvos.")
+        return
+
+    # O fast path embute as mensagens na mesma forma em que o log as grava
+    router = EmbeddingRouter(
+        EmbeddingRouter.compute_centroids(labels, embeddings),
+        margin_threshold=args.margin,
+        raw_text=settings.ROUTER_DECISIONS_LOG_RAW_TEXT,
+    )
+    router.save(args.output, samples=len(messages))
+    print(f"✅ Centróides salvos em {args.output} (agentes: {', '.join(router.agents)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina o router local por embeddings.")
+    parser.add_argument("--log", default=settings.ROUTER_DECISIONS_LOG_PATH or "data/router_decisions.jsonl")
+    parser.add_argument("--output", default=settings.ROUTER_CENTROIDS_PATH)
+    parser.add_argument("--min-confidence", type=float, default=0.7)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--margin", type=float, default=settings.ROUTER_FAST_PATH_MARGIN)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
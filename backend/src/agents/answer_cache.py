@@ -0,0 +1,223 @@
+"""
+Answer Cache - Semantic cache of GeneralAgent answers
+Institutional questions (hours, address, cancellation, plans) are answered
+thousands of times with the same content. Answers are stored with the query
+embedding and served again when a new query is similar enough (cosine
+similarity above the threshold), skipping the LLM and tool loop.
+
+Entries expire after a TTL and the whole cache is dropped when the `planos`
+table or GeneralService.FAQ changes. Plan changes are detected through a
+fingerprint of the `planos` rows, re-read from the database at most every
+ANSWER_CACHE_CATALOG_CHECK_SECONDS: changes made by other workers, by
+Core/bulk statements or outside the application are seen within that delay.
+ORM writes in this process invalidate immediately. Turns involving customer
+data are never cached (see is_cacheable).
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+
+from src.config.settings import settings
+from src.models.plano import Plano
+from src.services.general_service import GeneralService
+
+logger = logging.getLogger(__name__)
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_CPF_RE = re.compile(r"\d{3}\.?\d{3}\.?\d{3}-?\d{2}")
+_LONG_NUMBER_RE = re.compile(r"\d{6,}")  # telefone, protocolo, código de cliente
+
+# Incremented whenever a Plano row is written through the ORM in this process
+_catalog_generation = 0
+
+
+def invalidate_answer_caches():
+    """Mark every cached answer as stale (plans or FAQ changed)."""
+    global _catalog_generation
+    _catalog_generation += 1
+
+
+@event.listens_for(Plano, "after_insert")
+@event.listens_for(Plano, "after_update")
+@event.listens_for(Plano, "after_delete")
+def _on_plano_change(mapper, connection, target):
+    invalidate_answer_caches()
+
+
+def _faq_fingerprint() -> str:
+    return hashlib.sha1(
+        json.dumps(GeneralService.FAQ, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+def catalog_version() -> Tuple[int, str]:
+    return (_catalog_generation, _faq_fingerprint())
+
+
+async def plans_fingerprint(session_factory=None) -> str:
+    """Hash of every `planos` row (a small catalog table, read in one query)."""
+    if session_factory is None:
+        from src.config.database import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    async with session_factory() as session:
+        rows = (await session.execute(
+            select(Plano.plano_id, Plano.nome, Plano.descricao, Plano.velocidade, Plano.preco, Plano.tipo)
+            .order_by(Plano.plano_id)
+        )).all()
+    return hashlib.sha1(json.dumps([list(row) for row in rows], default=str).encode()).hexdigest()
+
+
+def is_cacheable(message: str, context: Optional[Dict] = None) -> bool:
+    """
+    Only anonymous, first-turn questions without personal identifiers are
+    cacheable: the answer must not depend on who is asking or on earlier turns.
+    """
+    context = context or {}
+    if context.get("is_authenticated") or context.get("client_id"):
+        return False
+    if any(entry.get("role") == "assistant" for entry in context.get("chat_history") or []):
+        return False
+    return not (
+        _EMAIL_RE.search(message) or _CPF_RE.search(message) or _LONG_NUMBER_RE.search(message)
+    )
+
+
+class CachedAnswer(str):
+    """Agent response served from the answer cache (orchestrator reports `cached`)."""
+
+    cached = True
+
+
+class SemanticAnswerCache:
+    """
+    In-process semantic cache: LRU over entries of (unit embedding, answer, expiry).
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 21600,
+        max_entries: int = 1000,
+        catalog_check_seconds: Optional[float] = None,
+        session_factory=None
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # None: only in-process ORM changes and the FAQ are detected
+        self.catalog_check_seconds = catalog_check_seconds
+        self._session_factory = session_factory
+        self._plans_fingerprint: Optional[str] = None
+        self._plans_checked_at: Optional[float] = None
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, float]]" = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._version = (*catalog_version(), None)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def refresh_catalog(self):
+        """Re-reads the `planos` fingerprint when the last check is older than `catalog_check_seconds`."""
+        if self.catalog_check_seconds is None:
+            return
+        now = time.monotonic()
+        if self._plans_checked_at is not None and now - self._plans_checked_at < self.catalog_check_seconds:
+            return
+        self._plans_checked_at = now
+        try:
+            self._plans_fingerprint = await plans_fingerprint(self._session_factory)
+        except Exception as e:
+            # Keeps the last fingerprint; entries still expire by TTL
+            logger.warning(f"Could not check the plans catalog: {e}")
+
+    def _check_version(self):
+        current = (*catalog_version(), self._plans_fingerprint)
+        if current != self._version:
+            if self._entries:
+                logger.info("Plans/FAQ changed, clearing answer cache")
+                self.invalidations += 1
+            self.clear()
+            self._version = current
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at < now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def get(self, embedding) -> Optional[Tuple[str, float]]:
+        """Return (answer, similarity) of the closest fresh entry above the threshold."""
+        self._check_version()
+        self._expire()
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries.keys())
+            self._matrix = np.vstack([self._entries[key][0] for key in self._matrix_ids])
+
+        similarities = self._matrix @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        key = self._matrix_ids[best]
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][1], similarity
+
+    def set(self, embedding, answer: str):
+        self._check_version()
+        self._entries[self._next_id] = (
+            self._normalize(embedding), str(answer), time.monotonic() + self.ttl_seconds
+        )
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> Dict[str, any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def load_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Build the cache from settings; None when disabled."""
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return SemanticAnswerCache(
+        similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        catalog_check_seconds=settings.ANSWER_CACHE_CATALOG_CHECK_SECONDS
+    )
@@ -0,0 +1,83 @@
+"""
+Per-request context for agents and plugins.
+
+Agents (and their Kernel/plugins) are created once per application and shared
+between requests. Customer data needed by the plugins lives in a ContextVar,
+which is isolated per asyncio task, instead of attributes on shared instances.
+"""
+import asyncio
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class AgentRequestContext:
+    """Customer data visible to plugins during a single chat turn."""
+
+    client_id: Optional[int] = None
+    client_email: Optional[str] = None
+    session_id: Optional[str] = None
+    # Set by tools that read or write customer records; such turns are never
+    # stored in the answer cache
+    customer_data_used: bool = False
+
+    @classmethod
+    def from_dict(cls, context: Optional[Dict]) -> "AgentRequestContext":
+        context = context or {}
+        return cls(
+            client_id=context.get("client_id"),
+            client_email=context.get("client_email"),
+            session_id=context.get("session_id"),
+        )
+
+
+_request_context: ContextVar[Optional[AgentRequestContext]] = ContextVar(
+    "agent_request_context", default=None
+)
+
+# Set only inside speculative agent runs (see AgentOrchestrator): side-effecting
+# tools wait on it until the router confirms the speculated agent.
+_speculation_gate: ContextVar[Optional[asyncio.Event]] = ContextVar(
+    "agent_speculation_gate", default=None
+)
+
+
+def get_request_context() -> AgentRequestContext:
+    """Return the context of the current task, creating an empty one if needed."""
+    current = _request_context.get()
+    if current is None:
+        current = AgentRequestContext()
+        _request_context.set(current)
+    return current
+
+
+def set_request_context(context: Optional[Dict]) -> AgentRequestContext:
+    """Bind a fresh context (built from the agent context dict) to the current task."""
+    current = AgentRequestContext.from_dict(context)
+    _request_context.set(current)
+    return current
+
+
+def set_speculation_gate(gate: Optional[asyncio.Event]):
+    _speculation_gate.set(gate)
+
+
+async def confirm_side_effects():
+    """
+    Call before any tool that writes data (tickets, upgrades, subscriptions).
+
+    Outside speculation it returns immediately. In a speculative run it blocks
+    until the router agrees; if the run is cancelled the write never happens.
+    """
+    gate = _speculation_gate.get()
+    if gate is not None:
+        await gate.wait()
+
+
+def last_assistant_agent(context: Optional[Dict]) -> Optional[str]:
+    """Agent that produced the last assistant turn in the context's chat_history."""
+    for entry in reversed((context or {}).get("chat_history") or []):
+        if entry.get("role") == "assistant":
+            return entry.get("agent")
+    return None
@@ -0,0 +1,227 @@
+"""
+Embedding Router - Local fast path for intent classification
+Nearest-centroid classifier over message embeddings, distilled from logged
+RouterAgent (LLM) decisions. Answers in-process when the margin between the
+two closest agents is high enough; otherwise the LLM router is used.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.agents.router_cache import normalize_message
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds between retention prunes of the decision log
+_PRUNE_INTERVAL = 24 * 3600
+
+
+class EmbeddingRouter:
+    """
+    Nearest-centroid router over L2-normalized message embeddings.
+
+    Messages are embedded as the decision log stores them (normalized, or as
+    typed with `raw_text`), so serving sees the same input as training.
+    """
+
+    def __init__(self, centroids: Dict[str, List[float]], margin_threshold: float = 0.05, raw_text: bool = False):
+        self.agents = list(centroids.keys())
+        matrix = np.asarray([centroids[a] for a in self.agents], dtype=np.float32)
+        self.centroids = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.margin_threshold = margin_threshold
+        self.raw_text = raw_text
+
+    # ==================== TRAINING ====================
+
+    @staticmethod
+    def compute_centroids(labels: List[str], embeddings: List[List[float]]) -> Dict[str, List[float]]:
+        """Mean of the normalized embeddings of each agent."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        labels_arr = np.asarray(labels)
+        centroids = {}
+        for agent in sorted(set(labels)):
+            mean = vectors[labels_arr == agent].mean(axis=0)
+            centroids[agent] = (mean / np.linalg.norm(mean)).tolist()
+        return centroids
+
+    def save(self, path: str, samples: int = 0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "deployment": settings.AZURE_OPENAI_DEPLOYMENT_EMBEDDING,
+                    "trained_at": datetime.now(timezone.utc).isoformat(),
+                    "samples": samples,
+                    "raw_text": self.raw_text,
+                    "centroids": {a: self.centroids[i].tolist() for i, a in enumerate(self.agents)},
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str, margin_threshold: float = 0.05) -> "EmbeddingRouter":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["centroids"], margin_threshold=margin_threshold, raw_text=data.get("raw_text", False))
+
+    # ==================== CLASSIFICATION ====================
+
+    def prepare(self, message: str) -> str:
+        """Text that is embedded: the same form the decision log stores."""
+        return message if self.raw_text else normalize_message(message)
+
+    def classify(self, embedding: List[float]) -> Tuple[str, float, float]:
+        """
+        Returns:
+            (agent, similarity with its centroid, margin over the runner-up)
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        scores = self.centroids @ (vector / np.linalg.norm(vector))
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+        return self.agents[order[0]], best, best - runner_up
+
+    async def route(self, message: str) -> Optional[Dict[str, any]]:
+        """
+        Classify locally; returns None when the margin is too low (use the LLM router).
+        """
+        from src.services.rag_service import RAGService
+
+        try:
+            embedding = await RAGService.generate_embedding(self.prepare(message))
+        except Exception as e:
+            logger.warning(f"Embedding router unavailable, falling back to LLM: {e}")
+            return None
+
+        agent, similarity, margin = self.classify(embedding)
+        if margin < self.margin_threshold:
+            return None
+
+        logger.info(f"Fast-path routed to {agent} (similarity {similarity:.3f}, margin {margin:.3f})")
+        return {
+            "agent": agent,
+            "confidence": round(max(0.0, min(1.0, similarity)), 2),
+            "reasoning": f"Classificação local por embeddings (margem {margin:.2f})",
+            "source": "embedding",
+        }
+
+
+def load_embedding_router() -> Optional[EmbeddingRouter]:
+    """Load the fast path from settings; None when disabled or not trained yet."""
+    if not settings.ROUTER_FAST_PATH_ENABLED:
+        return None
+    path = settings.ROUTER_CENTROIDS_PATH
+    if not os.path.exists(path):
+        logger.warning(f"Router centroids not found at {path}. Fast path disabled.")
+        return None
+    try:
+        router = EmbeddingRouter.load(path, margin_threshold=settings.ROUTER_FAST_PATH_MARGIN)
+        logger.info(f"Embedding router loaded with agents: {router.agents}")
+        return router
+    except Exception as e:
+        logger.error(f"Failed to load router centroids: {e}")
+        return None
+
+
+class RoutingDecisionLog:
+    """
+    Append-only JSONL log of LLM routing decisions (training data for the fast path).
+
+    The message is stored normalized (lower-cased, accents folded, numbers and
+    emails masked, see router_cache.normalize_message): enough to train the
+    centroids without keeping CPFs, phone numbers, invoice numbers or emails.
+    `raw_text=True` stores the message as typed (opt-in). Lines older than
+    `retention_days` are pruned on startup and once a day.
+
+    Writes run on a single background thread, so the event loop never waits
+    on the file and lines are never interleaved.
+    """
+
+    def __init__(self, path: str, raw_text: bool = False, retention_days: Optional[int] = 30):
+        self.path = path
+        self.raw_text = raw_text
+        self.retention_days = retention_days
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="routing-log")
+        self._last_prune: Optional[float] = None
+
+    def append(self, message: str, decision: Dict[str, any]) -> Future:
+        """Queues the decision for writing (returns immediately)."""
+        row = {
+            "text": message if self.raw_text else normalize_message(message),
+            "agent": decision.get("agent"),
+            "confidence": decision.get("confidence"),
+            "ts": datetime.now(timezone.utc).isoformat(),
+        }
+        return self._writer.submit(self._write, row)
+
+    def _write(self, row: Dict[str, any]):
+        try:
+            if self._last_prune is None or time.monotonic() - self._last_prune >= _PRUNE_INTERVAL:
+                self.prune()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.warning(f"Could not log routing decision: {e}")
+
+    def prune(self) -> int:
+        """Removes lines older than `retention_days`; returns how many were removed."""
+        self._last_prune = time.monotonic()
+        if not self.retention_days or not os.path.exists(self.path):
+            return 0
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        kept = [line for line in lines if _timestamp(line) >= cutoff]
+        if len(kept) < len(lines):
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.path)
+        return len(lines) - len(kept)
+
+    def flush(self):
+        """Waits for the queued writes (tests and scripts)."""
+        self._writer.submit(lambda: None).result()
+
+    def read(self, min_confidence: float = 0.0) -> List[Dict[str, any]]:
+        if not os.path.exists(self.path):
+            return []
+        decisions = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if row.get("text") and row.get("agent") and (row.get("confidence") or 0.0) >= min_confidence:
+                    decisions.append(row)
+        return decisions
+
+
+def _timestamp(line: str) -> datetime:
+    try:
+        return datetime.fromisoformat(json.loads(line)["ts"])
+    except (ValueError, KeyError, TypeError):
+        # Unreadable lines are dropped by the next prune
+        return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def load_decision_log() -> Optional[RoutingDecisionLog]:
+    path = settings.ROUTER_DECISIONS_LOG_PATH
+    if not path:
+        return None
+    return RoutingDecisionLog(
+        path,
+        raw_text=settings.ROUTER_DECISIONS_LOG_RAW_TEXT,
+        retention_days=settings.ROUTER_DECISIONS_LOG_RETENTION_DAYS
+    )
@@ -1,27 +1,39 @@
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions import kernel_function
 
+from src.agents.context import get_request_context, set_request_context
+from src.agents.streaming import stream_agent_message
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
 from src.services.financial_service import FinancialService
 
 logger = logging.getLogger(__name__)
 
 class FinancialPlugin:
-    """Plugin for financial operations."""
-    
-    def __init__(self):
-        self.client_id: Optional[int] = None
-        self.client_email: Optional[str] = None
+    """Plugin for financial operations.
+
+    Customer data is read from the per-request context, so a single instance
+    can be shared safely between concurrent requests.
+    """
+
+    @property
+    def client_id(self) -> Optional[int]:
+        return get_request_context().client_id
+
+    @property
+    def client_email(self) -> Optional[str]:
+        return get_request_context().client_email
 
     def set_context(self, client_id: Optional[int], client_email: Optional[str]):
-        self.client_id = client_id
-        self.client_email = client_email
+        request_context = get_request_context()
+        request_context.client_id = client_id
+        request_context.client_email = client_email
 
     @kernel_function(description="Gera uma segunda via de boleto para pagamento.")
     async def generate_boleto(self, email: Optional[str] = None, cpf: Optional[str] = None) -> str:
@@ -132,7 +144,8 @@ class FinancialAgent:
                         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_GPT4O_MINI,
                         endpoint=settings.AZURE_OPENAI_ENDPOINT,
                         api_key=settings.AZURE_OPENAI_KEY,
-                        api_version=settings.AZURE_OPENAI_API_VERSION
+                        api_version=settings.AZURE_OPENAI_API_VERSION,
+                        async_client=get_openai_client()
                     )
                 )
                 self.is_configured = True
@@ -144,17 +157,8 @@ class FinancialAgent:
         
         logger.info("Financial Agent initialized")
 
-    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
-        """
-        Process a message using the agent.
-        """
-        # Inject context into plugin
-        if context:
-            self.plugin.set_context(
-                client_id=context.get("client_id"),
-                client_email=context.get("client_email")
-            )
-
+    def _build_chat_history(self, message: str, context: Optional[Dict] = None) -> ChatHistory:
+        """Build the prompt (system prompt, customer context and user message)."""
         chat_history = ChatHistory()
         chat_history.add_system_message(self.SYSTEM_PROMPT)
         
@@ -163,6 +167,25 @@ class FinancialAgent:
              chat_history.add_system_message(f"Contexto do Cliente: {json.dumps(context, default=str)}")
 
         chat_history.add_user_message(message)
+        return chat_history
+
+    def _execution_settings(self):
+        from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
+        from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+        
+        return AzureChatPromptExecutionSettings(
+            temperature=0.3,
+            function_choice_behavior=FunctionChoiceBehavior.Auto()
+        )
+
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
+        """
+        Process a message using the agent.
+        """
+        # Bind customer data to this request (read by the shared plugin)
+        set_request_context(context)
+
+        chat_history = self._build_chat_history(message, context)
         
         if not self.is_configured:
             return "Erro de Configuração: As credenciais do Azure OpenAI não foram detectadas. Por favor, configure AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT nas configurações do App Service."
@@ -173,21 +196,20 @@ class FinancialAgent:
             logger.error(f"Failed to get chat service: {e}")
             return "Desculpe, estou com problemas técnicos no momento."
         
-        from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
-        from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-        
-        execution_settings = AzureChatPromptExecutionSettings(
-            temperature=0.3,
-            function_choice_behavior=FunctionChoiceBehavior.Auto()
-        )
-        
         try:
             result = await chat_service.get_chat_message_content(
                 chat_history=chat_history,
-                settings=execution_settings,
+                settings=self._execution_settings(),
                 kernel=self.kernel
             )
             return str(result)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return "Ocorreu um erro ao processar sua solicitação."
+
+    async def stream_message(self, message: str, context: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+        """
+        Stream the agent response as events (tool calls and text deltas).
+        """
+        async for event in stream_agent_message(self, "financial", message, context):
+            yield event
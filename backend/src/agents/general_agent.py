@@ -1,14 +1,23 @@
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions import kernel_function
 
+from src.agents.answer_cache import CachedAnswer, is_cacheable, load_answer_cache
+from src.agents.context import (
+    confirm_side_effects,
+    get_request_context,
+    set_request_context,
+)
+from src.agents.streaming import stream_agent_message
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
 from src.services.general_service import GeneralService
+from src.services.rag_service import RAGService
 from src.services.subscription_service import SubscriptionService
 
 logger = logging.getLogger(__name__)
@@ -51,6 +60,7 @@ class GeneralPlugin:
     @kernel_function(description="Busca 2ª via de fatura pelo email do cliente.")
     async def get_invoice_by_email(self, email: str) -> str:
         """Busca fatura por email."""
+        get_request_context().customer_data_used = True
         return await GeneralService.get_invoice_by_email(email)
 
     @kernel_function(description="Retorna guia de solução de problemas de internet.")
@@ -61,12 +71,15 @@ class GeneralPlugin:
     @kernel_function(description="Verifica status do cliente pelo email (se já existe, plano atual, faturas).")
     async def check_client_status(self, email: str) -> str:
         """Verifica cliente."""
+        get_request_context().customer_data_used = True
         result = await GeneralService.get_client_summary_by_email(email)
         return json.dumps(result)
 
     @kernel_function(description="Realiza a contratação completa (Cliente + Contrato + Boleto).")
     async def create_subscription(self, nome: str, email: str, plano_nome: str, cpf: str, endereco: str, telefone: str = "11999999999") -> str:
         """Cria assinatura."""
+        get_request_context().customer_data_used = True
+        await confirm_side_effects()
         result = await SubscriptionService.create_subscription(nome, email, plano_nome, cpf, endereco, telefone)
         return json.dumps(result)
 
@@ -126,7 +139,8 @@ class GeneralAgent:
                         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_GPT4O_MINI,
                         endpoint=settings.AZURE_OPENAI_ENDPOINT,
                         api_key=settings.AZURE_OPENAI_KEY,
-                        api_version=settings.AZURE_OPENAI_API_VERSION
+                        api_version=settings.AZURE_OPENAI_API_VERSION,
+                        async_client=get_openai_client()
                     )
                 )
                 self.is_configured = True
@@ -134,13 +148,12 @@ class GeneralAgent:
                 logger.error(f"Failed to initialize AzureChatCompletion in General Agent: {e}")
         
         self.kernel.add_plugin(GeneralPlugin(), plugin_name="GeneralPlugin")
+        self.answer_cache = load_answer_cache()
         
         logger.info("General Agent initialized")
 
-    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
-        """
-        Process a message using the agent.
-        """
+    def _build_chat_history(self, message: str, context: Optional[Dict] = None) -> ChatHistory:
+        """Build the prompt (system prompt, customer context and user message)."""
         chat_history = ChatHistory()
         chat_history.add_system_message(self.SYSTEM_PROMPT)
         
@@ -161,6 +174,51 @@ class GeneralAgent:
                 chat_history.add_system_message(f"Contexto do Cliente: {json.dumps(other_context, default=str)}")
 
         chat_history.add_user_message(message)
+        return chat_history
+
+    def _execution_settings(self):
+        from semantic_kernel.connectors.ai.function_choice_behavior import (
+            FunctionChoiceBehavior,
+        )
+        from semantic_kernel.connectors.ai.open_ai import (
+            AzureChatPromptExecutionSettings,
+        )
+        
+        return AzureChatPromptExecutionSettings(
+            temperature=0.2, # Lower temperature for even stricter adherence
+            function_choice_behavior=FunctionChoiceBehavior.Auto()
+        )
+
+    async def _lookup_answer(self, message: str, context: Optional[Dict]):
+        """
+        Return (cached answer, query embedding). Both are None when the turn is
+        not cacheable or the embedding fails; the answer is None on a miss.
+        """
+        if self.answer_cache is None or not is_cacheable(message, context):
+            return None, None
+        await self.answer_cache.refresh_catalog()
+        try:
+            embedding = await RAGService.generate_embedding(message)
+        except Exception as e:
+            logger.warning(f"Answer cache skipped, embedding failed: {e}")
+            return None, None
+        hit = self.answer_cache.get(embedding)
+        if hit is None:
+            return None, embedding
+        answer, similarity = hit
+        logger.info(f"Answer cache hit (similarity: {similarity:.3f})")
+        return CachedAnswer(answer), embedding
+
+    def _store_answer(self, embedding, answer: str):
+        if embedding is not None and not get_request_context().customer_data_used:
+            self.answer_cache.set(embedding, answer)
+
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
+        """
+        Process a message using the agent.
+        """
+        set_request_context(context)
+        chat_history = self._build_chat_history(message, context)
         
         if not self.is_configured:
             return "Erro de Configuração: As credenciais do Azure OpenAI não foram detectadas. Por favor, configure AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT nas configurações do App Service."
@@ -171,21 +229,36 @@ class GeneralAgent:
             logger.error(f"Failed to get chat service: {e}")
             return f"Desculpe, estou com problemas técnicos no momento. Detalhe: {str(e)}"
         
-        from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
-        from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-        
-        execution_settings = AzureChatPromptExecutionSettings(
-            temperature=0.2, # Lower temperature for even stricter adherence
-            function_choice_behavior=FunctionChoiceBehavior.Auto()
-        )
+        cached, embedding = await self._lookup_answer(message, context)
+        if cached is not None:
+            return cached
         
         try:
             result = await chat_service.get_chat_message_content(
                 chat_history=chat_history,
-                settings=execution_settings,
+                settings=self._execution_settings(),
                 kernel=self.kernel
             )
+            self._store_answer(embedding, str(result))
             return str(result)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return f"Ocorreu um erro técnico detalhado: {str(e)}"
+
+    async def stream_message(self, message: str, context: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+        """
+        Stream the agent response as events (tool calls and text deltas).
+        """
+        embedding = None
+
+        async def cached_answer():
+            nonlocal embedding
+            cached, embedding = await self._lookup_answer(message, context)
+            return cached
+
+        async for event in stream_agent_message(
+            self, "general", message, context,
+            cached_answer=cached_answer,
+            on_complete=lambda answer: self._store_answer(embedding, answer)
+        ):
+            yield event
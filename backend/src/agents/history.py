@@ -0,0 +1,55 @@
+"""
+History Assembler - Token-budgeted conversation history for the agents
+Instead of a fixed number of messages, the most recent turns are packed into
+a token budget (per agent, see AGENT_HISTORY_TOKEN_BUDGETS). Long assistant
+turns are truncated so that a single verbose answer cannot push the rest of
+the conversation out of the prompt.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Role/formatting tokens added by the chat format for each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def history_budget(agent_name: Optional[str] = None) -> int:
+    """Token budget of the chat history for an agent (or the router when None)."""
+    return settings.AGENT_HISTORY_TOKEN_BUDGETS.get(agent_name or "router_agent", settings.AGENT_HISTORY_TOKEN_BUDGET)
+
+
+def assemble_history(
+    history: List[Dict],
+    budget_tokens: int,
+    max_assistant_tokens: Optional[int] = None
+) -> Tuple[List[Dict], int]:
+    """
+    Select the most recent turns that fit in `budget_tokens`.
+
+    Returns (turns in chronological order, tokens used). The newest turn is
+    always kept (truncated to the budget if needed).
+    """
+    if max_assistant_tokens is None:
+        max_assistant_tokens = settings.AGENT_HISTORY_MAX_ASSISTANT_TOKENS
+
+    selected: List[Dict] = []
+    used = 0
+    for entry in reversed(history):
+        content = entry.get("content") or ""
+        limit = max_assistant_tokens if entry.get("role") == "assistant" else budget_tokens
+        if not selected:
+            limit = min(limit, max(budget_tokens - MESSAGE_OVERHEAD_TOKENS, 1))
+        content = truncate_to_tokens(content, limit)
+
+        tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if selected and used + tokens > budget_tokens:
+            break
+        selected.append({**entry, "content": content})
+        used += tokens
+
+    selected.reverse()
+    return selected, used
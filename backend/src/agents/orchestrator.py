@@ -1,12 +1,32 @@
+import asyncio
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 
+from src.agents.context import set_speculation_gate
+from src.agents.embedding_router import load_decision_log, load_embedding_router
 from src.agents.financial_agent import FinancialAgent
 from src.agents.general_agent import GeneralAgent
+from src.agents.history import assemble_history, history_budget
 from src.agents.router_agent import RouterAgent
+from src.agents.router_batcher import load_router_batcher
+from src.agents.router_cache import load_router_cache
 from src.agents.sales_agent import SalesAgent
+from src.agents.speculation import (
+    SpeculationStats,
+    estimate_prompt_tokens,
+    predict_agent,
+)
+from src.agents.streaming import agent_event
 from src.agents.technical_agent import TechnicalAgent
+from src.config.database import pool_stats as db_pool_stats
+from src.config.openai_client import pool_stats
+from src.config.settings import settings
+from src.memory.conversation_store import get_conversation_store
+from src.memory.session_manager import get_session_manager
+from src.services.embedding_cache import get_embedding_cache
+from src.services.kpi_snapshot import get_kpi_refresher
+from src.utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -16,39 +36,158 @@ class AgentOrchestrator:
     """
 
     def __init__(self):
-        self.router = RouterAgent()
+        self.router = RouterAgent(
+            fast_path=load_embedding_router(),
+            decision_log=load_decision_log(),
+            cache=load_router_cache()
+        )
+        self.router.batcher = load_router_batcher(self.router)
         self.agents = {
             "financial_agent": FinancialAgent(),
             "technical_agent": TechnicalAgent(),
             "sales_agent": SalesAgent(),
             "general_agent": GeneralAgent()
         }
+        self.speculation_mode = settings.AGENT_SPECULATION_MODE
+        self.speculation_stats = SpeculationStats()
         logger.info("Agent Orchestrator initialized with all specialized agents")
 
-    async def process_message(self, message: str, context: Optional[Dict] = None) -> Dict[str, any]:
+    def get_stats(self) -> Dict[str, any]:
+        """Runtime counters of the agent pipeline (exposed on /api/chat/stats)."""
+        stats = {
+            "speculation": self.speculation_stats.stats(),
+            "openai_pool": pool_stats(),
+            "db_pool": db_pool_stats(),
+            "sessions": get_session_manager().stats(),
+        }
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            stats["embedding_cache"] = embedding_cache.stats()
+        if getattr(self.router, "cache", None) is not None:
+            stats["router_cache"] = self.router.cache.stats()
+        if getattr(self.router, "batcher", None) is not None:
+            stats["router_batcher"] = self.router.batcher.stats()
+        conversation_store = get_conversation_store()
+        if conversation_store is not None:
+            stats["conversation_store"] = conversation_store.stats()
+        kpi_refresher = get_kpi_refresher()
+        if kpi_refresher is not None:
+            stats["kpi_snapshots"] = kpi_refresher.stats()
+        answer_cache = getattr(self.agents["general_agent"], "answer_cache", None)
+        if answer_cache is not None:
+            stats["answer_cache"] = answer_cache.stats()
+        return stats
+
+    async def _load_session(self, message: str, context: Optional[Dict]):
         """
-        Process a user message:
-        1. Retrieve/Update Session Context
-        2. Route to the correct agent
-        3. Execute the agent
-        4. Return the response
+        Retrieve the session, append the user message and build the agent context.
         """
-        from src.memory.session_manager import SessionManager
-        
-        session_manager = SessionManager()
+        session_manager = get_session_manager()
         session_id = context.get("session_id", "default") if context else "default"
         
-        # 1. Retrieve Session
-        session_data = session_manager.get_session(session_id) or {}
-        history = session_data.get("history", [])
+        history, _ = await session_manager.get_history(session_id)
         
         # Append user message to history (for context window)
         history.append({"role": "user", "content": message})
         
-        # Update context with history for agents
+        # Update context with history for the router (token-budgeted)
         agent_context = context.copy() if context else {}
-        agent_context["chat_history"] = history[-5:] # Pass last 5 messages
+        agent_context["chat_history"], _ = assemble_history(history, history_budget())
         agent_context["is_authenticated"] = "client_id" in agent_context
+        return session_manager, session_id, history, agent_context
+
+    async def _save_turn(self, session_manager, session_id: str, message: str, response: str, agent_name: str):
+        """
+        Append the user message and the answer to the session history (no full rewrite).
+        No version check: appends never overwrite each other, so a turn of the
+        same session that finished first is kept and this one goes after it.
+        """
+        turn = [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": str(response), "agent": agent_name},
+        ]
+        await session_manager.append_history(session_id, turn)
+
+    def _agent_context(self, agent_name: str, history: list, router_context: Dict) -> Dict:
+        """Context for a specialist agent: the history packed into that agent's budget."""
+        agent_context = dict(router_context)
+        agent_context["chat_history"], history_tokens = assemble_history(history, history_budget(agent_name))
+        logger.debug(f"{agent_name} history: {len(agent_context['chat_history'])} turns, {history_tokens} tokens")
+        return agent_context
+
+    def _persist_turn(self, context: Dict, message: str, response: str, agent_name: str):
+        """Queue the turn for the long-term history (write-behind, identified clients only)."""
+        store = get_conversation_store()
+        client_id = context.get("client_id")
+        if store is None or not client_id:
+            return
+        metadata = {"session_id": context["session_id"]} if context.get("session_id") else None
+        store.add_message(client_id, "user", message, agent_name, metadata)
+        store.add_message(client_id, "assistant", str(response), agent_name, metadata)
+
+    def _select_agent(self, agent_name: str):
+        agent = self.agents.get(agent_name)
+        if not agent:
+            logger.warning(f"Agent {agent_name} not found, falling back to general_agent")
+            return self.agents["general_agent"], "general_agent"
+        return agent, agent_name
+
+    async def _run_speculative(self, agent, message: str, agent_context: Dict, gate: asyncio.Event) -> str:
+        # Runs in its own task: the gate only applies to this run's tools
+        set_speculation_gate(gate)
+        return await agent.process_message(message, agent_context)
+
+    def _start_speculation(self, message: str, history: list, router_context: Dict):
+        """
+        Start the most likely agent while the router is still classifying.
+        Returns (predicted agent name, task, gate) or None.
+        """
+        predicted = predict_agent(router_context, self.speculation_mode)
+        if predicted not in self.agents:
+            return None
+        gate = asyncio.Event()
+        agent_context = self._agent_context(predicted, history, router_context)
+        task = asyncio.create_task(
+            self._run_speculative(self.agents[predicted], message, agent_context, gate)
+        )
+        self.speculation_stats.attempts += 1
+        logger.info(f"Speculatively starting {predicted} while routing")
+        return predicted, task, gate
+
+    def _cancel_speculation(self, speculation, message: str, agent_context: Dict):
+        predicted, task, _ = speculation
+        wasted = estimate_prompt_tokens(self.agents[predicted], message, agent_context)
+        if task.done() and not task.cancelled() and task.exception() is None:
+            wasted += count_tokens(str(task.result()))
+        task.cancel()
+        # Avoid "exception was never retrieved" warnings for the discarded run
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.speculation_stats.record_miss(wasted)
+
+    async def _execute_agent(self, speculation, agent, agent_name: str, message: str, agent_context: Dict) -> str:
+        """Run the routed agent, reusing the speculative run when the router agrees."""
+        if speculation is not None:
+            predicted, task, gate = speculation
+            if predicted == agent_name:
+                gate.set()
+                self.speculation_stats.record_hit()
+                return await task
+            logger.info(f"Speculation miss: predicted {predicted}, routed to {agent_name}")
+            self._cancel_speculation(speculation, message, agent_context)
+        return await agent.process_message(message, agent_context)
+
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> Dict[str, any]:
+        """
+        Process a user message:
+        1. Retrieve/Update Session Context
+        2. Route to the correct agent
+        3. Execute the agent
+        4. Return the response
+        """
+        # 1. Retrieve Session
+        session_manager, session_id, history, router_context = await self._load_session(message, context)
+        agent_context = router_context
+        speculation = None
         
         try:
             # Start a custom span for the transaction
@@ -60,9 +199,10 @@ class AgentOrchestrator:
                 tracer = None
                 span = None
 
-            # 2. Route
+            # 2. Route (optionally speculating on the most likely agent meanwhile)
             # We pass the raw message to router, but maybe in future we pass history too
-            routing_result = await self.router.route(message, agent_context)
+            speculation = self._start_speculation(message, history, router_context)
+            routing_result = await self.router.route(message, router_context)
             agent_name = routing_result.get("agent")
             confidence = routing_result.get("confidence", 0.0)
             
@@ -73,19 +213,20 @@ class AgentOrchestrator:
             logger.info(f"Orchestrator routing to {agent_name} (confidence: {confidence})")
             
             # 3. Select Agent
-            agent = self.agents.get(agent_name)
-            if not agent:
-                logger.warning(f"Agent {agent_name} not found, falling back to general_agent")
-                agent = self.agents["general_agent"]
-                agent_name = "general_agent"
+            agent, agent_name = self._select_agent(agent_name)
+            agent_context = self._agent_context(agent_name, history, router_context)
+            prompt_tokens = estimate_prompt_tokens(agent, message, agent_context)
+            logger.info(f"{agent_name} prompt: ~{prompt_tokens} tokens")
+            if span:
+                span.set_attribute("agent.prompt_tokens", prompt_tokens)
 
             # 4. Execute
-            response = await agent.process_message(message, agent_context)
+            pending, speculation = speculation, None
+            response = await self._execute_agent(pending, agent, agent_name, message, agent_context)
             
             # 5. Update Session
-            history.append({"role": "assistant", "content": response, "agent": agent_name})
-            session_data["history"] = history
-            session_manager.save_session(session_id, session_data)
+            await self._save_turn(session_manager, session_id, message, response, agent_name)
+            self._persist_turn(router_context, message, response, agent_name)
             
             if span:
                 span.end()
@@ -94,10 +235,14 @@ class AgentOrchestrator:
                 "response": response,
                 "agent_used": agent_name,
                 "confidence": confidence,
-                "routing_reasoning": routing_result.get("reasoning")
+                "routing_reasoning": routing_result.get("reasoning"),
+                "cached": getattr(response, "cached", False),
+                "prompt_tokens": prompt_tokens
             }
 
         except Exception as e:
+            if speculation is not None:
+                self._cancel_speculation(speculation, message, agent_context)
             if span:
                 span.record_exception(e)
                 span.set_status(trace.Status(trace.StatusCode.ERROR))
@@ -108,3 +253,57 @@ class AgentOrchestrator:
                 "agent_used": "system_error",
                 "error": str(e)
             }
+
+    async def stream_message(self, message: str, context: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+        """
+        Stream a user message through the agents.
+
+        Yields a "routing" event (agent name and confidence) as soon as the router
+        answers, then the agent's "tool_call" and "delta" events, and finally a
+        "done" event once the session has been updated. If the agent fails, its
+        "error" event ends the stream and the turn is not saved.
+        """
+        session_manager, session_id, history, router_context = await self._load_session(message, context)
+        
+        try:
+            routing_result = await self.router.route(message, router_context)
+            agent, agent_name = self._select_agent(routing_result.get("agent"))
+            confidence = routing_result.get("confidence", 0.0)
+            agent_context = self._agent_context(agent_name, history, router_context)
+            prompt_tokens = estimate_prompt_tokens(agent, message, agent_context)
+            logger.info(f"{agent_name} prompt: ~{prompt_tokens} tokens")
+            
+            logger.info(f"Orchestrator streaming from {agent_name} (confidence: {confidence})")
+            yield agent_event(
+                "routing",
+                agent=agent_name,
+                confidence=confidence,
+                reasoning=routing_result.get("reasoning")
+            )
+            
+            chunks = []
+            cached = False
+            async for event in agent.stream_message(message, agent_context):
+                if event["event"] == "delta":
+                    chunks.append(event["data"]["text"])
+                    cached = cached or event["data"].get("cached", False)
+                yield event
+                if event["event"] == "error":
+                    # Fallback text is not an answer: keep it out of the history
+                    return
+            
+            response = "".join(chunks)
+            await self._save_turn(session_manager, session_id, message, response, agent_name)
+            self._persist_turn(router_context, message, response, agent_name)
+            
+            yield agent_event(
+                "done", agent_used=agent_name, confidence=confidence, cached=cached, prompt_tokens=prompt_tokens
+            )
+
+        except Exception as e:
+            logger.error(f"Error in orchestrator stream: {e}", exc_info=True)
+            yield agent_event(
+                "error",
+                message="Desculpe, ocorreu um erro interno ao processar sua mensagem.",
+                error=str(e)
+            )
@@ -4,13 +4,14 @@ Classifies incoming messages and routes to specialized agents
 """
 import json
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.prompt_template import PromptTemplateConfig
 
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -44,9 +45,38 @@ REGRAS:
 4. O campo confidence deve ser um número entre 0 e 1
 5. Seja preciso e rápido na classificação"""
 
-    def __init__(self):
-        """Initialize Router Agent with Azure OpenAI connection"""
+    BATCH_SYSTEM_PROMPT = """Você é o Router Agent da Central de Atendimento. Sua única função é classificar a intenção de VÁRIOS clientes e direcionar cada um ao agente especializado correto.
+
+AGENTES DISPONÍVEIS:
+- financial_agent: Boletos, pagamentos, faturas, cobranças, parcelamentos
+- technical_agent: Problemas técnicos, bugs, erros de sistema, suporte
+- sales_agent: Upgrades, downgrades, novos planos, cancelamentos, comercial
+- general_agent: Dúvidas gerais, agradecimentos, saudações, FAQ
+
+Você receberá uma lista JSON de itens no formato {"id": 0, "mensagem": "...", "contexto": {...}}.
+
+REGRAS:
+1. Classifique CADA item de forma independente, analisando APENAS a intenção principal da mensagem
+2. Em caso de dúvida, use general_agent
+3. Retorne APENAS um objeto JSON válido no formato: {"decisions": [{"id": 0, "agent": "nome_do_agente", "confidence": 0.95, "reasoning": "breve explicação"}]}
+4. Retorne exatamente uma decisão para cada id recebido
+5. O campo confidence deve ser um número entre 0 e 1"""
+
+    def __init__(self, fast_path=None, decision_log=None, cache=None):
+        """
+        Initialize Router Agent with Azure OpenAI connection
+
+        Args:
+            fast_path: Optional EmbeddingRouter consulted before the LLM
+            decision_log: Optional RoutingDecisionLog that records LLM decisions
+            cache: Optional RouterDecisionCache consulted before anything else
+        """
         self.kernel = Kernel()
+        self.fast_path = fast_path
+        self.decision_log = decision_log
+        self.cache = cache
+        # Optional RouterBatcher (micro-batching of concurrent classifications)
+        self.batcher = None
         
         # Add Azure OpenAI service
         # Add Azure OpenAI service
@@ -63,7 +93,8 @@ REGRAS:
                         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_GPT4O_MINI,
                         endpoint=settings.AZURE_OPENAI_ENDPOINT,
                         api_key=settings.AZURE_OPENAI_KEY,
-                        api_version=settings.AZURE_OPENAI_API_VERSION
+                        api_version=settings.AZURE_OPENAI_API_VERSION,
+                        async_client=get_openai_client()
                     )
                 )
                 self.is_configured = True
@@ -90,42 +121,24 @@ REGRAS:
                 "reasoning": "Erro de Configuração: Credenciais do Azure OpenAI não encontradas. Verifique AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT."
             }
 
+        if self.cache is not None:
+            cached = self.cache.get(message, context)
+            if cached:
+                cached["cached"] = True
+                return cached
+
+        if self.fast_path is not None:
+            fast_result = await self.fast_path.route(message)
+            if fast_result:
+                if self.cache is not None:
+                    self.cache.set(message, context, fast_result)
+                return fast_result
+
         try:
-            # Build prompt with context if available
-            user_prompt = f"Mensagem do cliente: {message}"
-            if context:
-                user_prompt += f"\n\nContexto adicional: {json.dumps(context, ensure_ascii=False)}"
-            
-            # Create chat history
-            chat_history = ChatHistory()
-            chat_history.add_system_message(self.SYSTEM_PROMPT)
-            chat_history.add_user_message(user_prompt)
-            
-            # Get classification from LLM using service directly
-            chat_service = self.kernel.get_service(service_id="router")
-            
-            # Create execution settings
-            from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
-            execution_settings = AzureChatPromptExecutionSettings(
-                temperature=0.3,  # Low temperature for consistent classification
-                max_tokens=150
-            )
-            
-            response = await chat_service.get_chat_message_content(
-                chat_history=chat_history,
-                settings=execution_settings
-            )
-            
-            
-            # Parse JSON response
-            content = str(response)
-            # Remove markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].strip()
-                
-            result = json.loads(content)
+            if self.batcher is not None:
+                result = await self.batcher.submit(message, context)
+            else:
+                result = await self._classify(message, context)
             
             # Validate agent name
             if result["agent"] not in self.AVAILABLE_AGENTS:
@@ -134,6 +147,10 @@ REGRAS:
                 result["confidence"] = 0.5
             
             logger.info(f"Routed to {result['agent']} with confidence {result['confidence']}")
+            if self.decision_log is not None:
+                self.decision_log.append(message, result)
+            if self.cache is not None:
+                self.cache.set(message, context, result)
             return result
             
         except json.JSONDecodeError as e:
@@ -151,6 +168,84 @@ REGRAS:
                 "reasoning": f"Erro: {str(e)}"
             }
     
+    @staticmethod
+    def _parse_json(content: str) -> Dict[str, any]:
+        # Remove markdown code blocks if present
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].strip()
+        return json.loads(content)
+
+    async def _classify(self, message: str, context: Optional[Dict] = None) -> Dict[str, any]:
+        """Single LLM classification call (raises on LLM or JSON errors)."""
+        # Build prompt with context if available
+        user_prompt = f"Mensagem do cliente: {message}"
+        if context:
+            user_prompt += f"\n\nContexto adicional: {json.dumps(context, ensure_ascii=False)}"
+        
+        # Create chat history
+        chat_history = ChatHistory()
+        chat_history.add_system_message(self.SYSTEM_PROMPT)
+        chat_history.add_user_message(user_prompt)
+        
+        # Get classification from LLM using service directly
+        chat_service = self.kernel.get_service(service_id="router")
+        
+        # Create execution settings
+        from semantic_kernel.connectors.ai.open_ai import (
+            AzureChatPromptExecutionSettings,
+        )
+        execution_settings = AzureChatPromptExecutionSettings(
+            temperature=0.3,  # Low temperature for consistent classification
+            max_tokens=150
+        )
+        
+        response = await chat_service.get_chat_message_content(
+            chat_history=chat_history,
+            settings=execution_settings
+        )
+        return self._parse_json(str(response))
+
+    async def classify_batch(self, items: List[Tuple[str, Optional[Dict]]]) -> List[Optional[Dict[str, any]]]:
+        """
+        Classify several messages in a single LLM call.
+
+        Returns one decision per item, in order; None where the model
+        did not return a decision for that item.
+        """
+        payload = [
+            {"id": i, "mensagem": message, "contexto": context or {}}
+            for i, (message, context) in enumerate(items)
+        ]
+        chat_history = ChatHistory()
+        chat_history.add_system_message(self.BATCH_SYSTEM_PROMPT)
+        chat_history.add_user_message(json.dumps(payload, ensure_ascii=False, default=str))
+        
+        chat_service = self.kernel.get_service(service_id="router")
+        
+        from semantic_kernel.connectors.ai.open_ai import (
+            AzureChatPromptExecutionSettings,
+        )
+        execution_settings = AzureChatPromptExecutionSettings(
+            temperature=0.3,
+            max_tokens=100 * len(items),
+            response_format={"type": "json_object"}
+        )
+        
+        response = await chat_service.get_chat_message_content(
+            chat_history=chat_history,
+            settings=execution_settings
+        )
+        decisions = self._parse_json(str(response)).get("decisions", [])
+        
+        results: List[Optional[Dict[str, any]]] = [None] * len(items)
+        for decision in decisions:
+            index = decision.pop("id", None)
+            if isinstance(index, int) and 0 <= index < len(items) and "agent" in decision:
+                results[index] = decision
+        return results
+    
     async def get_agent_info(self, agent_name: str) -> Optional[str]:
         """Get description of a specific agent"""
         return self.AVAILABLE_AGENTS.get(agent_name)
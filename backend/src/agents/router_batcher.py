@@ -0,0 +1,107 @@
+"""
+Router Batcher - Micro-batching of concurrent routing classifications
+Messages that arrive within a short window (or until the batch is full) are
+classified by RouterAgent in a single structured LLM call, and each decision
+is delivered back to the coroutine awaiting it. Keeps the requests-per-minute
+sent to Azure OpenAI low during traffic bursts.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RouterBatcher:
+    """
+    Collects RouterAgent classifications for up to `window_ms` or `max_batch`
+    items and resolves them with RouterAgent.classify_batch.
+    """
+
+    def __init__(self, router, window_ms: float = 20, max_batch: int = 16):
+        self.router = router
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, Optional[Dict], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    async def submit(self, message: str, context: Optional[Dict] = None) -> Dict[str, any]:
+        """Queue a message and wait for its routing decision."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, context, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._classify(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _classify(self, batch: List[Tuple[str, Optional[Dict], asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        items = [(message, context) for message, context, _ in batch]
+
+        results: List[Optional[Dict]] = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                results = await self.router.classify_batch(items)
+            except Exception as e:
+                logger.warning(f"Batch classification failed ({len(batch)} items), classifying individually: {e}")
+
+        # Items without a decision (single item, model omission or batch error)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            if len(batch) > 1:
+                self.fallbacks += len(missing)
+            individual = await asyncio.gather(
+                *[self.router._classify(*items[i]) for i in missing],
+                return_exceptions=True
+            )
+            for i, result in zip(missing, individual):
+                results[i] = result
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():  # caller was cancelled
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "individual_fallbacks": self.fallbacks,
+        }
+
+
+def load_router_batcher(router) -> Optional[RouterBatcher]:
+    """Build the batcher from settings; None when disabled."""
+    if not settings.ROUTER_BATCH_ENABLED:
+        return None
+    return RouterBatcher(
+        router,
+        window_ms=settings.ROUTER_BATCH_WINDOW_MS,
+        max_batch=settings.ROUTER_BATCH_MAX_SIZE
+    )
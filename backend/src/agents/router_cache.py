@@ -0,0 +1,99 @@
+"""
+Router Cache - Memoizes routing decisions for near-identical messages
+Keys are built from a normalized message (lower-cased, accent-folded,
+whitespace-collapsed, numbers and emails masked) plus the context fields that
+actually influence routing. Bounded LRU eviction with a TTL per entry.
+"""
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.agents.context import last_assistant_agent
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_NUMBER_RE = re.compile(r"\d+([.,/-]\d+)*")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a message so that trivial variations share the same cache key."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _EMAIL_RE.sub("<email>", text)
+    text = _NUMBER_RE.sub("<num>", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def routing_context_key(context: Optional[Dict]) -> Tuple:
+    """Context fields that influence routing (authentication and current agent)."""
+    if not context:
+        return (False, None)
+    return (bool(context.get("is_authenticated")), last_assistant_agent(context))
+
+
+class RouterDecisionCache:
+    """
+    In-process LRU cache of routing decisions with TTL and hit/miss counters.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(message: str, context: Optional[Dict] = None) -> str:
+        return json.dumps([normalize_message(message), *routing_context_key(context)])
+
+    def get(self, message: str, context: Optional[Dict] = None) -> Optional[Dict]:
+        key = self.make_key(message, context)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def set(self, message: str, context: Optional[Dict], decision: Dict):
+        key = self.make_key(message, context)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(decision))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def load_router_cache() -> Optional[RouterDecisionCache]:
+    """Build the cache from settings; None when disabled."""
+    if not settings.ROUTER_CACHE_ENABLED:
+        return None
+    return RouterDecisionCache(
+        max_entries=settings.ROUTER_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.ROUTER_CACHE_TTL_SECONDS
+    )
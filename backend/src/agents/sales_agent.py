@@ -1,20 +1,38 @@
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions import kernel_function
 
+from src.agents.context import (
+    confirm_side_effects,
+    get_request_context,
+    set_request_context,
+)
+from src.agents.streaming import stream_agent_message
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
 from src.services.sales_service import SalesService
 
 logger = logging.getLogger(__name__)
 
 class SalesPlugin:
-    """Plugin for sales and plan management."""
-    
+    """Plugin for sales and plan management.
+
+    The current client lives in the per-request context, so a single
+    instance can be shared safely between concurrent requests.
+    """
+
+    @property
+    def current_client_id(self) -> Optional[int]:
+        return get_request_context().client_id
+
+    def set_context(self, client_id: int):
+        get_request_context().client_id = client_id
+
     @kernel_function(description="Obtém o perfil e uso atual do cliente.")
     async def get_customer_profile(self, cliente_id: int) -> str:
         """
@@ -53,6 +71,7 @@ class SalesPlugin:
             cliente_id: ID do cliente.
             new_plan_name: Nome do novo plano.
         """
+        await confirm_side_effects()
         return await SalesService.upgrade_plan(cliente_id, new_plan_name)
 
     @kernel_function(description="Aplica desconto de retenção (20% por 6 meses).")
@@ -62,35 +81,14 @@ class SalesPlugin:
         Args:
             cliente_id: ID do cliente.
         """
+        await confirm_side_effects()
         return json.dumps(await SalesService.apply_discount(cliente_id))
 
-    @kernel_function(description="Cria um ticket manual para vendas ou financeiro.")
-    async def create_ticket(self, description: str, priority: str = "normal") -> str:
-        """
-        Cria ticket.
-        Args:
-            description: Descrição.
-            priority: Prioridade.
-        """
-        # Precisamos do cliente_id do contexto, mas o plugin não tem acesso direto ao self.agent
-        # Vamos assumir que o contexto foi injetado ou passar como argumento se mudarmos a arquitetura
-        # Por simplificação, vamos usar um método que o agente chama injetando o ID, 
-        # mas como kernel_function é stateless, precisamos de um jeito de passar o ID.
-        # O SalesPlugin atual não tem estado do cliente_id como o TechnicalPlugin.
-        # Vamos adicionar o estado.
-        pass 
-
-    # CORREÇÃO: O SalesPlugin precisa de estado para o cliente_id igual ao TechnicalPlugin
-    def __init__(self):
-        self.current_client_id = None
-
-    def set_context(self, client_id: int):
-        self.current_client_id = client_id
-
     @kernel_function(description="Cria um ticket manual para vendas ou financeiro.")
     async def create_ticket(self, description: str, priority: str = "normal") -> str:
         if not self.current_client_id:
             return "Erro: Cliente não identificado."
+        await confirm_side_effects()
         return json.dumps(await SalesService.create_ticket(self.current_client_id, description, priority))
 
 class SalesAgent:
@@ -142,7 +140,8 @@ class SalesAgent:
                         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_GPT4O_MINI,
                         endpoint=settings.AZURE_OPENAI_ENDPOINT,
                         api_key=settings.AZURE_OPENAI_KEY,
-                        api_version=settings.AZURE_OPENAI_API_VERSION
+                        api_version=settings.AZURE_OPENAI_API_VERSION,
+                        async_client=get_openai_client()
                     )
                 )
                 self.is_configured = True
@@ -154,20 +153,38 @@ class SalesAgent:
         
         logger.info("Sales Agent initialized")
 
-    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
-        """
-        Process a message using the agent.
-        """
+    def _build_chat_history(self, message: str, context: Optional[Dict] = None) -> ChatHistory:
+        """Build the prompt (system prompt, customer context and user message)."""
         chat_history = ChatHistory()
         chat_history.add_system_message(self.SYSTEM_PROMPT)
-        
-        if context and "client_id" in context:
-            self.plugin.set_context(context["client_id"])
-            
+
         if context:
              chat_history.add_system_message(f"Contexto do Cliente: {json.dumps(context, default=str)}")
 
         chat_history.add_user_message(message)
+        return chat_history
+
+    def _execution_settings(self):
+        from semantic_kernel.connectors.ai.function_choice_behavior import (
+            FunctionChoiceBehavior,
+        )
+        from semantic_kernel.connectors.ai.open_ai import (
+            AzureChatPromptExecutionSettings,
+        )
+        
+        return AzureChatPromptExecutionSettings(
+            temperature=0.4, # Slightly higher creativity for sales
+            function_choice_behavior=FunctionChoiceBehavior.Auto()
+        )
+
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
+        """
+        Process a message using the agent.
+        """
+        # Bind customer data to this request (read by the shared plugin)
+        set_request_context(context)
+
+        chat_history = self._build_chat_history(message, context)
         
         if not self.is_configured:
             return "Erro de Configuração: As credenciais do Azure OpenAI não foram detectadas. Por favor, configure AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT nas configurações do App Service."
@@ -178,21 +195,20 @@ class SalesAgent:
             logger.error(f"Failed to get chat service: {e}")
             return "Desculpe, estou com problemas técnicos no momento."
         
-        from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
-        from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-        
-        execution_settings = AzureChatPromptExecutionSettings(
-            temperature=0.4, # Slightly higher creativity for sales
-            function_choice_behavior=FunctionChoiceBehavior.Auto()
-        )
-        
         try:
             result = await chat_service.get_chat_message_content(
                 chat_history=chat_history,
-                settings=execution_settings,
+                settings=self._execution_settings(),
                 kernel=self.kernel
             )
             return str(result)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return "Ocorreu um erro ao processar sua solicitação."
+
+    async def stream_message(self, message: str, context: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+        """
+        Stream the agent response as events (tool calls and text deltas).
+        """
+        async for event in stream_agent_message(self, "sales", message, context):
+            yield event
@@ -0,0 +1,66 @@
+"""
+Speculative execution support for the orchestrator.
+While RouterAgent classifies a message, the most likely specialist agent
+(the one that answered the previous turn) can already start. If the router
+agrees its result is kept, otherwise the run is cancelled.
+"""
+import logging
+from typing import Dict, Optional
+
+from src.agents.context import last_assistant_agent
+from src.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# off: never speculate
+# authenticated: only logged-in customers with a previous agent in the session
+# history: any session with a previous agent
+SPECULATION_MODES = ("off", "authenticated", "history")
+
+
+def predict_agent(context: Optional[Dict], mode: str) -> Optional[str]:
+    """Cheap local prior: follow-up messages usually stay with the same agent."""
+    if mode not in SPECULATION_MODES or mode == "off":
+        return None
+    if mode == "authenticated" and not (context or {}).get("is_authenticated"):
+        return None
+    return last_assistant_agent(context)
+
+
+def estimate_prompt_tokens(agent, message: str, context: Optional[Dict]) -> int:
+    """Approximate prompt size of one agent call (used to account wasted tokens)."""
+    # The prompt always contains at least the user message
+    tokens = count_tokens(message)
+    try:
+        chat_history = agent._build_chat_history(message, context)
+        tokens = max(tokens, sum(count_tokens(str(m.content)) for m in chat_history.messages))
+    except Exception:
+        pass
+    return tokens
+
+
+class SpeculationStats:
+    """Counters for speculation hit rate and (estimated) wasted tokens."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_miss(self, wasted_tokens: int):
+        self.misses += 1
+        self.wasted_tokens += wasted_tokens
+
+    def stats(self) -> Dict[str, any]:
+        resolved = self.hits + self.misses
+        return {
+            "attempts": self.attempts,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / resolved, 4) if resolved else 0.0,
+            "wasted_tokens_estimated": self.wasted_tokens,
+        }
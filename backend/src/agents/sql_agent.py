@@ -2,6 +2,7 @@ import logging
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_openai import AzureChatOpenAI
+from src.config.openai_client import get_http_client
 from src.config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,7 @@ class SQLAgent:
                 openai_api_version=settings.AZURE_OPENAI_API_VERSION,
                 azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
                 api_key=settings.AZURE_OPENAI_KEY,
+                http_async_client=get_http_client(),
                 temperature=0,
                 verbose=True
             )
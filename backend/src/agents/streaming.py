@@ -0,0 +1,116 @@
+"""
+Streaming helpers for agents.
+
+Converts Semantic Kernel streaming chunks into simple events
+({"event": ..., "data": {...}}) and serializes them as Server-Sent Events.
+"""
+import json
+import logging
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+from semantic_kernel.contents import FunctionCallContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from src.agents.context import set_request_context
+
+logger = logging.getLogger(__name__)
+
+CONFIGURATION_ERROR = (
+    "Erro de Configuração: As credenciais do Azure OpenAI não foram detectadas. Por favor, configure "
+    "AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT nas configurações do App Service."
+)
+
+
+def agent_event(event: str, **data: Any) -> Dict[str, Any]:
+    """Build an agent event."""
+    return {"event": event, "data": data}
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Serialize an agent event in the Server-Sent Events wire format."""
+    payload = json.dumps(event["data"], ensure_ascii=False, default=str)
+    return f"event: {event['event']}\ndata: {payload}\n\n"
+
+
+async def stream_chat_events(
+    chat_service, chat_history, settings, kernel
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Stream a chat completion (including auto-invoked tool turns) as events.
+
+    Yields:
+        "tool_call" events when the model requests a kernel function and
+        "delta" events with assistant text as it is generated.
+    """
+    async for messages in chat_service.get_streaming_chat_message_contents(
+        chat_history=chat_history,
+        settings=settings,
+        kernel=kernel
+    ):
+        for message in messages or []:
+            if message is None or message.role != AuthorRole.ASSISTANT:
+                continue
+            for item in message.items:
+                # Only the first chunk of a streamed tool call carries its name
+                if isinstance(item, FunctionCallContent) and item.name:
+                    yield agent_event(
+                        "tool_call",
+                        plugin=item.plugin_name,
+                        function=item.function_name
+                    )
+            if message.content:
+                yield agent_event("delta", text=message.content)
+
+
+async def stream_agent_message(
+    agent,
+    service_id: str,
+    message: str,
+    context: Optional[Dict],
+    cached_answer: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+    on_complete: Optional[Callable[[str], None]] = None
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Shared `stream_message` body of the agents.
+
+    Binds the request context, builds the agent's chat history and streams
+    the completion of the `service_id` chat service. `cached_answer` may
+    short-circuit the model call; `on_complete` receives the full answer
+    text. Failures are reported as an "error" event (never as a "delta"),
+    so callers do not mistake the fallback text for an assistant answer.
+    """
+    # Bind customer data to this request (read by the shared plugins)
+    set_request_context(context)
+    chat_history = agent._build_chat_history(message, context)
+
+    if not agent.is_configured:
+        yield agent_event("error", message=CONFIGURATION_ERROR)
+        return
+
+    try:
+        chat_service = agent.kernel.get_service(service_id=service_id)
+    except Exception as e:
+        logger.error(f"Failed to get chat service: {e}")
+        yield agent_event("error", message="Desculpe, estou com problemas técnicos no momento.", error=str(e))
+        return
+
+    if cached_answer is not None:
+        cached = await cached_answer()
+        if cached is not None:
+            yield agent_event("delta", text=str(cached), cached=True)
+            return
+
+    try:
+        chunks = []
+        async for event in stream_chat_events(
+            chat_service, chat_history, agent._execution_settings(), agent.kernel
+        ):
+            if event["event"] == "delta":
+                chunks.append(event["data"]["text"])
+            yield event
+    except Exception as e:
+        logger.error(f"Error streaming message: {e}")
+        yield agent_event("error", message="Ocorreu um erro ao processar sua solicitação.", error=str(e))
+        return
+    if on_complete is not None:
+        on_complete("".join(chunks))
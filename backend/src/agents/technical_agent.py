@@ -1,22 +1,39 @@
 import json
 import logging
-from typing import Dict, Optional
+from typing import AsyncGenerator, Dict, Optional
 
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions import kernel_function
 
+from src.agents.context import (
+    confirm_side_effects,
+    get_request_context,
+    set_request_context,
+)
+from src.agents.streaming import stream_agent_message
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
+from src.memory.conversation_store import get_conversation_store
 from src.services.technical_service import TechnicalService
 
 logger = logging.getLogger(__name__)
 
 class TechnicalPlugin:
-    """Plugin for technical support operations."""
-    
-    def __init__(self):
-        self.current_client_id = None
+    """Plugin for technical support operations.
+
+    The identified client lives in the per-request context, so a single
+    instance can be shared safely between concurrent requests.
+    """
+
+    @property
+    def current_client_id(self) -> Optional[int]:
+        return get_request_context().client_id
+
+    @current_client_id.setter
+    def current_client_id(self, client_id: Optional[int]):
+        get_request_context().client_id = client_id
 
     def set_context(self, client_id: int):
         self.current_client_id = client_id
@@ -33,6 +50,26 @@ class TechnicalPlugin:
             return json.dumps(results)
         return "Não encontrei informações específicas sobre isso na minha base de conhecimento."
 
+    @kernel_function(description="Busca trechos relevantes de conversas anteriores do cliente atual.")
+    async def recall_past_conversations(self, query: str) -> str:
+        """
+        Busca em conversas anteriores do cliente.
+        Args:
+            query: O assunto ou problema a procurar no histórico.
+        """
+        if not self.current_client_id:
+            return "Erro: Cliente não identificado no contexto."
+        store = get_conversation_store()
+        if store is None:
+            return "Histórico de conversas indisponível no momento."
+        # A conversa atual já está no histórico do agente
+        results = await store.search_similar(
+            query, self.current_client_id, exclude_session_id=get_request_context().session_id
+        )
+        if results:
+            return json.dumps(results, ensure_ascii=False)
+        return "Não há conversas anteriores relevantes sobre esse assunto."
+
     @kernel_function(description="Cria um ticket de suporte técnico para o cliente.")
     async def create_ticket(self, description: str, priority: str = "normal") -> str:
         """
@@ -44,6 +81,7 @@ class TechnicalPlugin:
         if not self.current_client_id:
             return "Erro: Não foi possível identificar o cliente para criar o ticket."
             
+        await confirm_side_effects()
         result = await TechnicalService.create_ticket(description, priority, self.current_client_id)
         return json.dumps(result)
 
@@ -91,6 +129,7 @@ class TechnicalPlugin:
             priority: Nova prioridade (ex: alta).
             note: Nota ou observação a adicionar.
         """
+        await confirm_side_effects()
         result = await TechnicalService.update_ticket(ticket_id, status, priority, note)
         return json.dumps(result)
 
@@ -109,6 +148,7 @@ class TechnicalAgent:
     4. create_ticket: Use APENAS se não houver ticket aberto e não conseguir resolver com a base de conhecimento.
     5. update_ticket: Use para modificar um ticket existente (resolver, escalar, adicionar nota).
     6. identify_client: Use para encontrar o cadastro do cliente pelo EMAIL.
+    7. recall_past_conversations: Use para recuperar o que o cliente já relatou em atendimentos anteriores, em vez de perguntar de novo.
     
     REGRAS DE FLUXO:
     1. **Identificação**: Se não tiver o ID do cliente, peça o email e use `identify_client`.
@@ -139,7 +179,8 @@ class TechnicalAgent:
                         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_GPT4O_MINI,
                         endpoint=settings.AZURE_OPENAI_ENDPOINT,
                         api_key=settings.AZURE_OPENAI_KEY,
-                        api_version=settings.AZURE_OPENAI_API_VERSION
+                        api_version=settings.AZURE_OPENAI_API_VERSION,
+                        async_client=get_openai_client()
                     )
                 )
                 self.is_configured = True
@@ -150,14 +191,8 @@ class TechnicalAgent:
         
         logger.info("Technical Agent initialized")
 
-    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
-        """
-        Process a message using the agent.
-        """
-        # Inject context into plugin
-        if context and "client_id" in context:
-            self.plugin.set_context(context["client_id"])
-            
+    def _build_chat_history(self, message: str, context: Optional[Dict] = None) -> ChatHistory:
+        """Build the prompt (system prompt, customer context and user message)."""
         chat_history = ChatHistory()
         chat_history.add_system_message(self.SYSTEM_PROMPT)
         
@@ -165,6 +200,29 @@ class TechnicalAgent:
              chat_history.add_system_message(f"Contexto do Cliente: {json.dumps(context, default=str)}")
 
         chat_history.add_user_message(message)
+        return chat_history
+
+    def _execution_settings(self):
+        from semantic_kernel.connectors.ai.function_choice_behavior import (
+            FunctionChoiceBehavior,
+        )
+        from semantic_kernel.connectors.ai.open_ai import (
+            AzureChatPromptExecutionSettings,
+        )
+        
+        return AzureChatPromptExecutionSettings(
+            temperature=0.3,
+            function_choice_behavior=FunctionChoiceBehavior.Auto()
+        )
+
+    async def process_message(self, message: str, context: Optional[Dict] = None) -> str:
+        """
+        Process a message using the agent.
+        """
+        # Bind customer data to this request (read by the shared plugin)
+        set_request_context(context)
+
+        chat_history = self._build_chat_history(message, context)
         
         if not self.is_configured:
             return "Erro de Configuração: As credenciais do Azure OpenAI não foram detectadas. Por favor, configure AZURE_OPENAI_KEY e AZURE_OPENAI_ENDPOINT nas configurações do App Service."
@@ -175,21 +233,20 @@ class TechnicalAgent:
             logger.error(f"Failed to get chat service: {e}")
             return "Desculpe, estou com problemas técnicos no momento."
         
-        from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
-        from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-        
-        execution_settings = AzureChatPromptExecutionSettings(
-            temperature=0.3,
-            function_choice_behavior=FunctionChoiceBehavior.Auto()
-        )
-        
         try:
             result = await chat_service.get_chat_message_content(
                 chat_history=chat_history,
-                settings=execution_settings,
+                settings=self._execution_settings(),
                 kernel=self.kernel
             )
             return str(result)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
             return "Ocorreu um erro ao processar sua solicitação."
+
+    async def stream_message(self, message: str, context: Optional[Dict] = None) -> AsyncGenerator[Dict, None]:
+        """
+        Stream the agent response as events (tool calls and text deltas).
+        """
+        async for event in stream_agent_message(self, "technical", message, context):
+            yield event
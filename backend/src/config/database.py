@@ -6,15 +6,90 @@ para criar a engine e a sessão do banco de dados de forma assíncrona.
 """
 
 import logging
-from typing import AsyncGenerator
+import time
+import uuid
+from typing import AsyncGenerator, Dict
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from src.config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# ===================== POOL DE CONEXÕES =====================
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    QueuePool que mede o tempo de espera de cada checkout (aguardando uma
+    conexão livre ou abrindo uma nova). Exibido em /api/chat/stats.
+
+    `timeouts` conta só o pool esgotado (pool_timeout); falhas ao abrir a
+    conexão (recusada, autenticação, DNS) são contadas em `connect_errors`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connect_errors = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.connect_errors += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+def engine_options(mode: str) -> Dict[str, any]:
+    """
+    Argumentos do create_async_engine para DB_POOL_MODE:
+    - queue: pool de conexões reaproveitadas (pre-ping e recycle);
+    - pgbouncer: mesmo pool, com os caches de prepared statements do asyncpg
+      desativados (incompatíveis com PgBouncer em modo transaction);
+    - null: uma conexão nova por sessão (NullPool).
+    """
+    connect_args = {
+        "server_settings": {
+            "application_name": "central-atendimento-api"
+        }
+    }
+    if mode == "null":
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    if mode not in ("queue", "pgbouncer"):
+        raise ValueError(f"DB_POOL_MODE inválido: {mode}")
+    if mode == "pgbouncer":
+        connect_args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # Nomes únicos: o backend do PgBouncer muda entre transações
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        })
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
 # ===================== ENGINE SQLALCHEMY (ASYNC) =====================
 
 try:
@@ -23,19 +98,38 @@ try:
     
     engine = create_async_engine(
         database_url,
-        poolclass=NullPool,  # Para conexão limitada (ex: Azure free tier)
         echo=False,
-        connect_args={
-            "server_settings": {
-                "application_name": "central-atendimento-api"
-            }
-        },
+        **engine_options(settings.DB_POOL_MODE),
     )
-    logger.info("✅ Engine SQLAlchemy Async criada com sucesso")
+    logger.info(f"✅ Engine SQLAlchemy Async criada com sucesso (pool: {settings.DB_POOL_MODE})")
 except Exception as e:
     logger.error(f"❌ Erro ao criar engine: {str(e)}")
     raise
 
+
+def pool_stats() -> Dict[str, any]:
+    """
+    Estatísticas do pool de conexões do banco (exibidas em /api/chat/stats).
+    """
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "connect_errors": pool.connect_errors,
+            "avg_wait_ms": round(1000 * pool.wait_total / pool.checkouts, 3) if pool.checkouts else 0.0,
+            "max_wait_ms": round(1000 * pool.wait_max, 3),
+        })
+    return stats
+
 # ===================== SESSION FACTORY (ASYNC) =====================
 
 AsyncSessionLocal = async_sessionmaker(
@@ -79,7 +173,16 @@ Base = declarative_base()
 from src.models.user import User  # noqa
 from src.models.cliente import Cliente  # noqa
 from src.models.chamado import Chamado  # noqa
-from src.models.knowledge_base import KnowledgeBaseItem  # noqa
+from src.models.knowledge_base import KnowledgeBaseItem, KnowledgeBaseChunk  # noqa
+from src.models.embedding_cache import EmbeddingCacheEntry  # noqa
+from src.models.conversation_memory import ConversationMemory  # noqa
+from src.models.agent_session import AgentSession  # noqa
+from src.models.metrica import Metrica  # noqa
+
+
+# Definido no init_db: True/False no Postgres (extensão vector criada ou não),
+# None enquanto desconhecido ou em outros bancos
+pgvector_available = None
 
 
 async def init_db():
@@ -87,14 +190,34 @@ async def init_db():
     Cria todas as tabelas definidas em Base no banco de dados atual.
     Usar no startup da aplicação.
     """
+    global pgvector_available
     try:
+        # Garante que a extensão vector existe (apenas Postgres). Em transação
+        # separada: se o plano do banco não oferece pgvector, segue sem índices.
+        # Precisa vir antes do create_all: com pgvector_available False as
+        # colunas EmbeddingVector são criadas como JSONB (src/models/types.py).
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy import text
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                pgvector_available = True
+            except Exception as e:
+                pgvector_available = False
+                logger.warning(f"⚠️ pgvector indisponível ({e}). Busca vetorial sem índice ANN.")
+
         async with engine.begin() as conn:
-            # Garante que a extensão vector existe (apenas Postgres)
-            if engine.dialect.name == "postgresql":
-                from sqlalchemy import text
-                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-            
             await conn.run_sync(Base.metadata.create_all)
+            
+            # Índices ANN (HNSW/IVFFlat) da base de conhecimento
+            if pgvector_available:
+                from src.services.vector_index import VectorIndexManager
+                await VectorIndexManager.ensure_indexes(conn)
+
+            # Sessões no Postgres (SESSION_BACKEND=auto sem Redis): migrations/005
+            if engine.dialect.name == "postgresql":
+                from src.memory.pg_session_store import PostgresSessionStore
+                await PostgresSessionStore.ensure_schema(conn)
         logger.info("✅ Tabelas criadas/validadas com sucesso (Async)")
     except Exception as e:
         logger.error(f"❌ Erro ao criar tabelas: {str(e)}")
@@ -0,0 +1,121 @@
+"""
+Cliente Azure OpenAI compartilhado pelo processo.
+
+RAGService, AzureOpenAIService, os agentes Semantic Kernel e o SQLAgent usam
+o mesmo `AsyncAzureOpenAI` (e o mesmo pool httpx com keep-alive), evitando um
+novo handshake TLS com o endpoint do Azure a cada chamada.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_openai_client: Optional[AsyncAzureOpenAI] = None
+_requests_sent = 0
+
+
+async def _count_request(request: httpx.Request):
+    global _requests_sent
+    _requests_sent += 1
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# ===================== POOL HTTP (httpx) =====================
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Retorna o httpx.AsyncClient do processo (criado no primeiro uso).
+    """
+    global _http_client, _openai_client
+    if _http_client is None or _http_client.is_closed:
+        http2 = settings.AZURE_OPENAI_HTTP2
+        if http2 and not _http2_available():
+            logger.warning("⚠️ AZURE_OPENAI_HTTP2 ativo mas o pacote 'h2' não está instalado. Usando HTTP/1.1.")
+            http2 = False
+
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.AZURE_OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.AZURE_OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.AZURE_OPENAI_TIMEOUT, connect=10.0),
+            event_hooks={"request": [_count_request]},
+        )
+        _openai_client = None  # recriado sobre o novo pool
+        logger.info(f"✅ Pool HTTP do Azure OpenAI criado (http2={http2})")
+    return _http_client
+
+
+# ===================== CLIENTE AZURE OPENAI =====================
+
+
+def get_openai_client() -> Optional[AsyncAzureOpenAI]:
+    """
+    Retorna o AsyncAzureOpenAI compartilhado, ou None se as credenciais
+    não estiverem configuradas.
+    """
+    global _openai_client
+    if not settings.AZURE_OPENAI_ENDPOINT or not settings.AZURE_OPENAI_KEY:
+        return None
+    http_client = get_http_client()
+    if _openai_client is None:
+        _openai_client = AsyncAzureOpenAI(
+            api_key=settings.AZURE_OPENAI_KEY,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            http_client=http_client,
+            timeout=settings.AZURE_OPENAI_TIMEOUT,
+        )
+    return _openai_client
+
+
+def pool_stats() -> Dict[str, any]:
+    """
+    Estatísticas do pool de conexões (exibidas em /api/chat/stats).
+    """
+    stats = {
+        "http2": False,
+        "requests": _requests_sent,
+        "connections": 0,
+        "idle_connections": 0,
+    }
+    if _http_client is None:
+        return stats
+    try:
+        pool = _http_client._transport._pool
+        stats["http2"] = pool._http2
+        stats["connections"] = len(pool.connections)
+        stats["idle_connections"] = sum(1 for c in pool.connections if c.is_idle())
+    except AttributeError:
+        # Atributos internos do httpcore podem mudar entre versões
+        pass
+    return stats
+
+
+async def close_openai_client():
+    """
+    Fecha o pool HTTP compartilhado. Usar no shutdown da aplicação.
+    """
+    global _http_client, _openai_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        logger.info("✅ Pool HTTP do Azure OpenAI fechado")
+    _http_client = None
+    _openai_client = None
@@ -11,7 +11,15 @@ from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from src.agents.orchestrator import AgentOrchestrator
 from src.config.database import close_db, init_db
+from src.config.openai_client import close_openai_client
+from src.memory.conversation_store import start_conversation_store, stop_conversation_store
+from src.memory.session_manager import close_session_manager, init_session_manager
+from src.services.embedding_cache import flush_embedding_cache
+from src.services.kpi_snapshot import start_kpi_refresher, stop_kpi_refresher
+from src.services.lexical_index import load_lexical_index
+from src.services.vector_store import load_vector_store, save_vector_store
 from src.routes.auth import router as auth_router
 from src.routes.chamados import router as chamados_router
 from src.routes.clientes import router as clientes_router
@@ -39,8 +47,30 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Iniciando aplicação...")
     await init_db()  # Inicializa o banco de dados (Async)
     logger.info("✅ Banco de dados inicializado!")
+    try:
+        await load_vector_store()  # Índice vetorial em memória (quando não há pgvector)
+    except Exception as e:
+        logger.error(f"❌ Erro ao carregar o índice vetorial em memória: {e}")
+    try:
+        await load_lexical_index()  # BM25 da busca híbrida
+    except Exception as e:
+        logger.error(f"❌ Erro ao carregar o índice lexical: {e}")
+    await init_session_manager()  # Pool Redis compartilhado (sessões de curto prazo)
+    start_conversation_store()  # Histórico durável gravado em lote (write-behind)
+    start_kpi_refresher()  # Snapshots de KPIs do dashboard (tabela metricas)
+    # Registro de agentes com ciclo de vida da aplicação (Kernel e clientes HTTP
+    # são criados uma única vez e compartilhados entre requisições)
+    app.state.orchestrator = AgentOrchestrator()
+    logger.info("✅ Agentes inicializados!")
     yield  # A aplicação roda aqui
     logger.info("🛑 Encerrando aplicação...")
+    app.state.orchestrator = None
+    await stop_conversation_store()  # Grava as mensagens pendentes
+    await stop_kpi_refresher()
+    await close_session_manager()
+    save_vector_store()
+    await flush_embedding_cache()  # Embeddings ainda não gravados no banco
+    await close_openai_client()  # Fecha o pool HTTP compartilhado do Azure OpenAI
     await close_db()  # Fecha as conexões com o banco de dados (Async)
 
 
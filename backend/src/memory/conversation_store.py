@@ -1,56 +1,388 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
-from datetime import datetime
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
 
-# We will use a raw SQL execution or a new model for this.
-# For simplicity in this phase, let's assume we might use SQLAlchemy models later,
-# but here we can define a simple interface.
+import numpy as np
+from sqlalchemy import and_, insert, inspect, or_, select
+
+from src.config.settings import settings
+from src.models.conversation_memory import ConversationMemory
+from src.utils.tokens import count_tokens, truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
+# Consecutive failed writes before a batch is dropped
+_MAX_WRITE_ATTEMPTS = 3
+
+# Longest text sent to the embeddings API for one message
+_MAX_EMBEDDING_TOKENS = 2000
+
+
+def _aware(value: Optional[datetime]) -> datetime:
+    # SQLite returns naive datetimes (stored as UTC)
+    if value is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
 class ConversationStore:
     """
-    Manages long-term conversation history in PostgreSQL.
+    Manages long-term conversation history in the `conversation_memory` table.
+
+    Writes are write-behind: `add_message` only appends to an in-memory queue
+    and a background task flushes it with one multi-row INSERT per batch, when
+    `batch_size` messages are pending or every `flush_interval` seconds.
+    Messages not yet flushed are still returned by `get_history`.
+
+    With `embed_messages` the flush also embeds the customer messages of the
+    batch (one API call), so `search_similar` can recall earlier
+    conversations of the same customer. Assistant replies are stored without
+    a vector: they would double the embedding cost and mostly echo the
+    knowledge base.
     """
 
-    def __init__(self, db_session: Session):
-        self.db = db_session
+    def __init__(
+        self,
+        session_factory=None,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        embed_messages: bool = False
+    ):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.embed_messages = embed_messages
+        self._embedding_column: Optional[str] = None
+        self._embedding_column_checked = False
+        self._pending: Deque[Dict] = deque()
+        self._inflight: List[Dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._failed_attempts = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from src.config.database import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory()
+
+    # ==================== WRITE-BEHIND ====================
 
-    def add_message(self, cliente_id: int, role: str, content: str, agent_name: str):
+    def add_message(self, cliente_id: int, role: str, content: str, agent_name: str, metadata: Optional[Dict] = None):
         """
-        Saves a message to the database.
-        In a real implementation with pgvector, this would also generate embeddings.
+        Queues a message for persistence (never waits on the database).
         """
-        # Placeholder for DB insertion
-        # For now, we just log it as we haven't created the SQLAlchemy model class for 'conversation_memory' yet
-        # in the main codebase (it was in the migration SQL but not in python models).
-        # We will implement a simple raw SQL execution or just log for now to avoid breaking if table doesn't exist in dev.
-        
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            logger.warning(f"⚠️ Conversation store queue full, dropping message for client {cliente_id}")
+            return
+        self._pending.append({
+            "id": uuid.uuid4(),
+            "cliente_id": cliente_id,
+            "agent_name": agent_name,
+            "content": content,
+            "metadata": {**(metadata or {}), "role": role},
+            # Message time, not flush time: keeps the history order
+            "created_at": datetime.now(timezone.utc),
+        })
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _detect_embedding_column(self, session) -> Optional[str]:
+        """`embedding` (pgvector), `embedding_json` (JSONB) or None, checked once."""
+        if not self._embedding_column_checked:
+            from src.config import database
+            columns = await session.run_sync(
+                lambda sync_session: {c["name"] for c in inspect(sync_session.connection()).get_columns("conversation_memory")}
+            )
+            if "embedding" in columns and database.pgvector_available is not False:
+                self._embedding_column = "embedding"
+            elif "embedding_json" in columns:
+                self._embedding_column = "embedding_json"
+            self._embedding_column_checked = True
+        return self._embedding_column
+
+    async def _embed(self, batch: List[Dict]):
+        """Embeds the user messages of the batch not embedded yet (failures leave them without vector)."""
+        rows = []
+        for row in batch:
+            if "embedding" in row:
+                continue
+            if row["metadata"].get("role") == "user":
+                rows.append(row)
+            else:
+                row["embedding"] = None
+        if not rows:
+            return
+        from src.services.rag_service import RAGService
         try:
-            # This is a placeholder. In production, use a proper SQLAlchemy model.
-            logger.info(f"💾 [DB Save] Client {cliente_id} | {role}: {content[:50]}... (Agent: {agent_name})")
-            
-            # Example of how it would look with raw SQL if table exists:
-            # self.db.execute(
-            #     text("INSERT INTO conversation_memory (cliente_id, agent_name, content, metadata) VALUES (:cid, :agent, :content, :meta)"),
-            #     {"cid": cliente_id, "agent": agent_name, "content": content, "meta": json.dumps({"role": role})}
-            # )
-            # self.db.commit()
+            embeddings = await RAGService.generate_embeddings(
+                [truncate_to_tokens(row["content"], _MAX_EMBEDDING_TOKENS) for row in rows]
+            )
         except Exception as e:
-            logger.error(f"Error saving message to DB: {e}")
+            logger.warning(f"⚠️ Could not embed conversation messages: {e}")
+            embeddings = [None] * len(rows)
+        for row, embedding in zip(rows, embeddings):
+            row["embedding"] = embedding
+
+    async def _write(self, batch: List[Dict]):
+        if self.embed_messages:
+            await self._embed(batch)
+        async with self._sessions() as session:
+            column = await self._detect_embedding_column(session)
+            rows = []
+            for row in batch:
+                values = {k: v for k, v in row.items() if k != "embedding"}
+                if column:
+                    values[column] = row.get("embedding")
+                rows.append(values)
+            await session.execute(insert(ConversationMemory.__table__).values(rows))
+            await session.commit()
+
+    async def flush(self) -> int:
+        """Writes every pending message now; returns how many were written."""
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._inflight = batch
+            try:
+                await self._write(batch)
+                written += len(batch)
+                self.written += len(batch)
+                self._failed_attempts = 0
+            except Exception as e:
+                self._failed_attempts += 1
+                self.write_errors += 1
+                if self._failed_attempts >= _MAX_WRITE_ATTEMPTS:
+                    self.dropped += len(batch)
+                    logger.error(f"❌ Dropping {len(batch)} conversation messages after {self._failed_attempts} failed writes: {e}")
+                    self._failed_attempts = 0
+                else:
+                    # Back to the front of the queue, retried on the next flush
+                    self._pending.extendleft(reversed(batch))
+                    logger.warning(f"⚠️ Conversation store write failed ({e}), retrying")
+                    break
+            finally:
+                self._inflight = []
+        return written
+
+    async def _run(self):
+        while True:
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            await self.flush()
+            if self._closing and not self._pending:
+                return
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes what is pending and stops the background task."""
+        if self._task is None:
+            await self.flush()
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    # ==================== READS ====================
+
+    @staticmethod
+    def _to_dict(row: Dict) -> Dict:
+        metadata = row.get("metadata") or {}
+        created_at = row.get("created_at")
+        return {
+            "id": str(row["id"]),
+            "role": metadata.get("role"),
+            "agent_name": row["agent_name"],
+            "content": row["content"],
+            "created_at": created_at.isoformat() if created_at else None,
+        }
 
-    def get_history(self, cliente_id: int, limit: int = 10) -> List[Dict]:
+    async def get_history(
+        self,
+        cliente_id: int,
+        limit: int = 20,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[Dict]:
         """
-        Retrieves recent conversation history.
+        Retrieves one page of a customer's history, newest first.
+        For the next page pass the `created_at` and `id` of the last message as
+        `before` and `before_id`: messages with the same `created_at` are
+        ordered by id, so none is skipped at a page boundary. With `before`
+        alone only strictly older messages are returned.
+        Served by the (cliente_id, created_at DESC, id DESC) index.
         """
-        # Placeholder return
-        return []
+        table = ConversationMemory.__table__
+        query = (
+            select(table.c.id, table.c.agent_name, table.c.content, table.c.metadata, table.c.created_at)
+            .where(table.c.cliente_id == cliente_id)
+            .order_by(table.c.created_at.desc(), table.c.id.desc())
+            .limit(limit)
+        )
+        if before_id is not None:
+            before_id = uuid.UUID(str(before_id))
+        if before is not None:
+            older = table.c.created_at < before
+            if before_id is not None:
+                older = or_(older, and_(table.c.created_at == before, table.c.id < before_id))
+            query = query.where(older)
 
-    def search_similar(self, query: str, cliente_id: int) -> List[str]:
+        async with self._sessions() as session:
+            rows = [dict(row._mapping) for row in (await session.execute(query)).all()]
+
+        # Messages still waiting in the write-behind queue
+        seen = {row["id"] for row in rows}
+        for row in list(self._inflight) + list(self._pending):
+            if row["cliente_id"] != cliente_id or row["id"] in seen:
+                continue
+            if before is None:
+                rows.append(row)
+            elif before_id is None:
+                if row["created_at"] < _aware(before):
+                    rows.append(row)
+            elif (row["created_at"], row["id"]) < (_aware(before), before_id):
+                rows.append(row)
+
+        rows.sort(key=lambda row: (_aware(row["created_at"]), row["id"]), reverse=True)
+        return [self._to_dict(row) for row in rows[:limit]]
+
+    async def search_similar(
+        self,
+        query: str,
+        cliente_id: int,
+        limit: int = 5,
+        max_tokens: Optional[int] = None,
+        min_similarity: Optional[float] = None,
+        exclude_session_id: Optional[str] = None
+    ) -> List[Dict]:
         """
-        Searches for similar past messages using vector search.
+        Searches the customer's past messages most similar to `query`.
+        Messages of `exclude_session_id` (the current conversation, already in
+        the agent's history) are left out.
+
+        pgvector: ORDER BY cosine distance in the database. JSONB (or SQLite):
+        the customer's most recent vectors are loaded and scored with NumPy.
+        Results are capped at `max_tokens` of content in total.
         """
-        # Placeholder for RAG
-        return []
+        from src.services.rag_service import RAGService
+
+        max_tokens = max_tokens if max_tokens is not None else settings.CONVERSATION_RECALL_MAX_TOKENS
+        min_similarity = min_similarity if min_similarity is not None else settings.CONVERSATION_RECALL_MIN_SIMILARITY
+        query_embedding = await RAGService.generate_embedding(query)
+
+        table = ConversationMemory.__table__
+        async with self._sessions() as session:
+            column = await self._detect_embedding_column(session)
+            if column is None:
+                return []
+            vectors = table.c[column]
+            base = (
+                select(table.c.id, table.c.agent_name, table.c.content, table.c.metadata, table.c.created_at)
+                .where(table.c.cliente_id == cliente_id, vectors.isnot(None))
+            )
+            if exclude_session_id is not None:
+                message_session = table.c.metadata["session_id"].as_string()
+                base = base.where(or_(message_session.is_(None), message_session != exclude_session_id))
+
+            if column == "embedding" and session.get_bind().dialect.name == "postgresql":
+                distance = vectors.cosine_distance(query_embedding)
+                result = await session.execute(
+                    base.add_columns(distance.label("distance")).order_by(distance).limit(limit * 2)
+                )
+                scored = [(1.0 - row.distance, dict(row._mapping)) for row in result.all()]
+            else:
+                # Served by idx_conversation_memory_cliente_created (migrations/004)
+                result = await session.execute(
+                    base.add_columns(vectors.label("vector"))
+                    .order_by(table.c.created_at.desc())
+                    .limit(settings.CONVERSATION_RECALL_MAX_CANDIDATES)
+                )
+                rows = result.all()
+                if not rows:
+                    return []
+                matrix = np.asarray(
+                    [json.loads(row.vector) if isinstance(row.vector, str) else row.vector for row in rows],
+                    dtype=np.float32
+                )
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                scores = matrix @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+                top = np.argsort(-scores)[:limit * 2]
+                scored = [(float(scores[i]), dict(rows[i]._mapping)) for i in top]
+
+        results, used_tokens, seen = [], 0, set()
+        for similarity, row in scored:
+            if similarity < min_similarity or row["content"] in seen or len(results) >= limit:
+                continue
+            item = {**self._to_dict(row), "similarity": round(similarity, 4)}
+            tokens = count_tokens(item["content"])
+            if used_tokens + tokens > max_tokens:
+                if results:
+                    break
+                # A single long message: keep its beginning
+                item["content"] = truncate_to_tokens(item["content"], max_tokens)
+                tokens = max_tokens
+            seen.add(row["content"])
+            results.append(item)
+            used_tokens += tokens
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+
+# ==================== PROCESS INSTANCE ====================
+
+_conversation_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> Optional[ConversationStore]:
+    """Store started by the application lifespan (None when disabled or not started)."""
+    return _conversation_store
+
+
+def start_conversation_store() -> Optional[ConversationStore]:
+    global _conversation_store
+    if not settings.CONVERSATION_STORE_ENABLED:
+        return None
+    if _conversation_store is None:
+        _conversation_store = ConversationStore(
+            batch_size=settings.CONVERSATION_STORE_BATCH_SIZE,
+            flush_interval=settings.CONVERSATION_STORE_FLUSH_INTERVAL,
+            max_pending=settings.CONVERSATION_STORE_MAX_PENDING,
+            embed_messages=settings.CONVERSATION_STORE_EMBEDDINGS
+        )
+    _conversation_store.start()
+    return _conversation_store
+
+
+async def stop_conversation_store():
+    global _conversation_store
+    if _conversation_store is not None:
+        await _conversation_store.stop()
+        _conversation_store = None
@@ -0,0 +1,44 @@
+"""
+Compact encoding of session history entries.
+
+Each entry is stored as a single bytes value: one header byte naming the
+codec followed by the payload. msgpack is used when installed (JSON
+otherwise) and payloads above the threshold are zlib-compressed, so long
+agent answers cost a fraction of their JSON size in Redis and in memory.
+Entries written with any codec can always be decoded.
+"""
+import json
+import zlib
+from typing import Dict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_JSON, _JSON_ZLIB, _MSGPACK, _MSGPACK_ZLIB = b"j", b"J", b"m", b"M"
+
+# Payloads smaller than this are not worth compressing
+COMPRESS_THRESHOLD = 512
+
+
+def encode_entry(entry: Dict, compress_threshold: int = COMPRESS_THRESHOLD) -> bytes:
+    if msgpack is not None:
+        payload, header, compressed = msgpack.packb(entry, use_bin_type=True), _MSGPACK, _MSGPACK_ZLIB
+    else:
+        payload = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        header, compressed = _JSON, _JSON_ZLIB
+    if len(payload) >= compress_threshold:
+        return compressed + zlib.compress(payload)
+    return header + payload
+
+
+def decode_entry(data: bytes) -> Dict:
+    header, payload = data[:1], data[1:]
+    if header in (_JSON_ZLIB, _MSGPACK_ZLIB):
+        payload = zlib.decompress(payload)
+    if header in (_MSGPACK, _MSGPACK_ZLIB):
+        if msgpack is None:
+            raise ValueError("Session entry encoded with msgpack, which is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
@@ -0,0 +1,112 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSessionStore:
+    """
+    Bounded in-process session store (used when Redis is not available).
+
+    LRU order with a per-entry TTL and two limits: number of sessions and an
+    approximate byte budget (size of the JSON encoding, measured on save).
+    History logs (`append`) hold already-encoded entries and are sized by
+    their byte length.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # session_id -> (data, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[Dict, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _size(data: Dict) -> int:
+        return len(json.dumps(data, default=str))
+
+    def _remove(self, session_id: str):
+        _, _, size = self._entries.pop(session_id)
+        self._bytes -= size
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._remove(session_id)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(session_id)
+        return entry[0]
+
+    def set(self, session_id: str, data: Dict, ttl_seconds: float, size: Optional[int] = None):
+        if session_id in self._entries:
+            self._remove(session_id)
+        size = self._size(data) if size is None else size
+        if size > self.max_bytes:
+            self.evictions += 1
+            logger.warning(f"⚠️ Session {session_id} ({size} bytes) exceeds the local session budget, not cached")
+            return
+        self._entries[session_id] = (data, time.monotonic() + ttl_seconds, size)
+        self._bytes += size
+        self._evict()
+
+    def append(
+        self,
+        key: str,
+        items: List[bytes],
+        cap: int,
+        ttl_seconds: float,
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Appends encoded entries to a history log, keeping the last `cap`.
+        Returns the new version, or None if `expected_version` does not match.
+        """
+        log = self.get(key) or {"entries": [], "version": 0}
+        if expected_version is not None and log["version"] != expected_version:
+            return None
+        log = {"entries": (log["entries"] + list(items))[-cap:], "version": log["version"] + 1}
+        self.set(key, log, ttl_seconds, size=sum(len(item) for item in log["entries"]))
+        return log["version"]
+
+    def delete(self, session_id: str):
+        if session_id in self._entries:
+            self._remove(session_id)
+
+    def _over_limits(self) -> bool:
+        return len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+
+    def _evict(self):
+        if not self._over_limits():
+            return
+        # Expired entries first, then least recently used
+        now = time.monotonic()
+        for session_id in [key for key, (_, expires_at, _) in self._entries.items() if expires_at < now]:
+            self._remove(session_id)
+            self.expirations += 1
+        while self._entries and self._over_limits():
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
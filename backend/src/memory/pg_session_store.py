@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+_AGENT_NAME = "orchestrator"
+
+# Messages, data and version of an expired (not yet swept) session are
+# discarded on the next write: it starts over as a new session
+_LIVE_MESSAGES = "CASE WHEN agent_sessions.expires_at > now() THEN agent_sessions.messages ELSE '[]'::jsonb END"
+_LIVE_CONTEXT = (
+    "CASE WHEN agent_sessions.expires_at > now() "
+    "THEN COALESCE(agent_sessions.context, '{}'::jsonb) ELSE '{}'::jsonb END"
+)
+_LIVE_VERSION = (
+    "CASE WHEN agent_sessions.expires_at > now() "
+    "THEN COALESCE((agent_sessions.context->>'version')::int, 0) ELSE 0 END"
+)
+
+_APPEND_SQL = text(f"""
+    INSERT INTO agent_sessions (session_id, agent_name, messages, context, created_at, expires_at)
+    VALUES (
+        :session_id, :agent_name, CAST(:messages AS JSONB), jsonb_build_object('version', 1),
+        now(), now() + make_interval(secs => CAST(:ttl AS DOUBLE PRECISION))
+    )
+    ON CONFLICT (session_id) DO UPDATE SET
+        messages = (
+            SELECT COALESCE(jsonb_agg(e.value ORDER BY e.position), '[]'::jsonb)
+            FROM jsonb_array_elements({_LIVE_MESSAGES} || EXCLUDED.messages)
+                WITH ORDINALITY AS e(value, position)
+            WHERE e.position > jsonb_array_length({_LIVE_MESSAGES} || EXCLUDED.messages) - :cap
+        ),
+        context = jsonb_set({_LIVE_CONTEXT}, '{{version}}', to_jsonb({_LIVE_VERSION} + 1)),
+        agent_name = EXCLUDED.agent_name,
+        expires_at = EXCLUDED.expires_at
+    WHERE CAST(:expected_version AS INTEGER) IS NULL OR {_LIVE_VERSION} = CAST(:expected_version AS INTEGER)
+    RETURNING (context->>'version')::int AS version
+""")
+
+_SAVE_DATA_SQL = text(f"""
+    INSERT INTO agent_sessions (session_id, agent_name, messages, context, created_at, expires_at)
+    VALUES (
+        :session_id, :agent_name, '[]'::jsonb, jsonb_build_object('data', CAST(:data AS JSONB)),
+        now(), now() + make_interval(secs => CAST(:ttl AS DOUBLE PRECISION))
+    )
+    ON CONFLICT (session_id) DO UPDATE SET
+        messages = {_LIVE_MESSAGES},
+        context = jsonb_set({_LIVE_CONTEXT}, '{{data}}', EXCLUDED.context->'data'),
+        expires_at = EXCLUDED.expires_at
+""")
+
+_GET_SQL = text("""
+    SELECT messages, context FROM agent_sessions
+    WHERE session_id = :session_id AND expires_at > now()
+""")
+
+_DELETE_SQL = text("DELETE FROM agent_sessions WHERE session_id = :session_id")
+
+_SWEEP_SQL = text("SELECT cleanup_expired_sessions(CAST(:batch_size AS INTEGER))")
+
+# Schema from migrations/005, applied by init_db (create_all does not alter
+# tables created by migrations/002 nor create functions)
+_CLIENTE_ID_NOT_NULL_SQL = text("""
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'agent_sessions'
+      AND column_name = 'cliente_id' AND is_nullable = 'NO'
+""")
+
+_DROP_CLIENTE_ID_NOT_NULL_SQL = text("ALTER TABLE agent_sessions ALTER COLUMN cliente_id DROP NOT NULL")
+
+_CLEANUP_FUNCTION_SQL = text("""
+    CREATE OR REPLACE FUNCTION cleanup_expired_sessions(batch_size INTEGER)
+    RETURNS INTEGER AS $$
+    DECLARE
+        deleted_count INTEGER;
+    BEGIN
+        DELETE FROM agent_sessions
+        WHERE session_id IN (
+            SELECT session_id FROM agent_sessions
+            WHERE expires_at < CURRENT_TIMESTAMP
+            ORDER BY expires_at
+            LIMIT batch_size
+            FOR UPDATE SKIP LOCKED
+        );
+        GET DIAGNOSTICS deleted_count = ROW_COUNT;
+        RETURN deleted_count;
+    END;
+    $$ LANGUAGE plpgsql
+""")
+
+
+def session_uuid(session_id: str) -> uuid.UUID:
+    """agent_sessions.session_id is a UUID; other ids map to a stable uuid5."""
+    try:
+        return uuid.UUID(str(session_id))
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"session:{session_id}")
+
+
+class PostgresSessionStore:
+    """
+    Sessions in the `agent_sessions` table (PostgreSQL), shared by every
+    worker and instance.
+
+    Each turn is one upsert that appends to the `messages` JSONB array (capped
+    to the last N entries in SQL) and bumps `context.version`; `expires_at`
+    is pushed forward on every write. A background sweeper deletes expired
+    rows in batches via cleanup_expired_sessions(batch_size) (migrations/005).
+    """
+
+    @staticmethod
+    async def ensure_schema(conn):
+        """
+        Applies migrations/005 on an existing database (called by init_db on
+        PostgreSQL): nullable cliente_id for anonymous chats and the batched
+        cleanup_expired_sessions(batch_size) used by the sweeper.
+        """
+        if (await conn.execute(_CLIENTE_ID_NOT_NULL_SQL)).first() is not None:
+            await conn.execute(_DROP_CLIENTE_ID_NOT_NULL_SQL)
+            logger.info("✅ agent_sessions.cliente_id is now nullable (migrations/005)")
+        await conn.execute(_CLEANUP_FUNCTION_SQL)
+
+    def __init__(self, session_factory=None, sweep_interval: float = 300, sweep_batch_size: int = 1000):
+        self._session_factory = session_factory
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._sweeper: Optional[asyncio.Task] = None
+        self.swept = 0
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from src.config.database import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory()
+
+    async def _row(self, session_id: str):
+        async with self._sessions() as session:
+            result = await session.execute(_GET_SQL, {"session_id": session_uuid(session_id)})
+            return result.first()
+
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        row = await self._row(session_id)
+        return (row.context or {}).get("data") if row else None
+
+    async def save_session(self, session_id: str, data: Dict, ttl_seconds: float):
+        async with self._sessions() as session:
+            await session.execute(_SAVE_DATA_SQL, {
+                "session_id": session_uuid(session_id),
+                "agent_name": _AGENT_NAME,
+                "data": json.dumps(data),
+                "ttl": ttl_seconds,
+            })
+            await session.commit()
+
+    async def clear_session(self, session_id: str):
+        async with self._sessions() as session:
+            await session.execute(_DELETE_SQL, {"session_id": session_uuid(session_id)})
+            await session.commit()
+
+    async def get_history(self, session_id: str, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        row = await self._row(session_id)
+        if row is None:
+            return [], 0
+        messages = row.messages or []
+        return (messages[-limit:] if limit else messages), int((row.context or {}).get("version", 0))
+
+    async def append_history(
+        self,
+        session_id: str,
+        entries: List[Dict],
+        cap: int,
+        ttl_seconds: float,
+        expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """New version, or None if `expected_version` does not match (nothing written)."""
+        async with self._sessions() as session:
+            result = await session.execute(_APPEND_SQL, {
+                "session_id": session_uuid(session_id),
+                # Last agent that answered in the session
+                "agent_name": next((e["agent"] for e in reversed(entries) if e.get("agent")), _AGENT_NAME),
+                "messages": json.dumps(entries[-cap:]),
+                "ttl": ttl_seconds,
+                "cap": cap,
+                "expected_version": expected_version,
+            })
+            version = result.scalar()
+            await session.commit()
+        return version
+
+    # ==================== EXPIRY SWEEPER ====================
+
+    async def sweep(self) -> int:
+        """Deletes expired sessions, one short transaction per batch."""
+        total = 0
+        while True:
+            async with self._sessions() as session:
+                deleted = (await session.execute(_SWEEP_SQL, {"batch_size": self.sweep_batch_size})).scalar() or 0
+                await session.commit()
+            total += deleted
+            if deleted < self.sweep_batch_size:
+                break
+            await asyncio.sleep(0)  # let requests run between batches
+        self.swept += total
+        if total:
+            logger.info(f"🧹 Removed {total} expired sessions")
+        return total
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping expired sessions: {e}")
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
@@ -1,81 +1,307 @@
 import json
 import logging
-from typing import Dict, Optional
-import uuid
+import time
+from typing import Dict, List, Optional, Tuple
 from datetime import timedelta
 
 try:
-    import redis
+    import redis.asyncio as redis
+    from redis.asyncio.retry import Retry
+    from redis.backoff import ExponentialBackoff
+    from redis.exceptions import WatchError
 except ImportError:
     redis = None
 
 from src.config.settings import settings
+from src.memory.encoding import decode_entry, encode_entry
+from src.memory.local_session_store import LocalSessionStore
+from src.memory.pg_session_store import PostgresSessionStore
 
 logger = logging.getLogger(__name__)
 
-class SessionManager:
+
+class SessionConflictError(Exception):
+    """The session history changed since it was read (optimistic versioning)."""
+
+
+def create_redis_client():
     """
-    Manages short-term user sessions using Redis.
-    Falls back to in-memory dictionary if Redis is not configured.
+    Async Redis client backed by one connection pool for the whole process.
+    Idle connections are health-checked (PING) before reuse and failed
+    commands are retried with backoff on a fresh connection.
     """
+    if not (settings.REDIS_HOST and redis):
+        return None
+    return redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        ssl=settings.REDIS_SSL,
+        db=settings.REDIS_DB,
+        # Binary values: history entries are msgpack/zlib encoded. This applies
+        # to the whole client, so every reply is bytes (session JSON included:
+        # json.loads accepts bytes); decode explicitly when adding text reads.
+        decode_responses=False,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), retries=2),
+    )
 
-    _local_cache = {}
 
-    def __init__(self):
-        self.redis_client = None
-        # self._local_cache is now shared via class attribute
-        
-        if settings.REDIS_HOST and redis:
-            try:
-                self.redis_client = redis.Redis(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    password=settings.REDIS_PASSWORD,
-                    ssl=settings.REDIS_SSL,
-                    db=settings.REDIS_DB,
-                    decode_responses=True
-                )
-                self.redis_client.ping()
-                logger.info("✅ Connected to Redis for Session Management")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not connect to Redis: {e}. Using in-memory fallback.")
-                self.redis_client = None
-        else:
+class SessionManager:
+    """
+    Manages short-term user sessions using Redis (redis.asyncio, pooled) or,
+    without Redis, the `agent_sessions` table in PostgreSQL (shared by all
+    workers, see PostgresSessionStore). Falls back to a bounded in-memory
+    store (LRU + TTL) when neither is configured or reachable.
+
+    While Redis is unreachable the in-memory fallback is used and Redis is
+    tried again after REDIS_RECONNECT_INTERVAL seconds, so one outage does
+    not make every request wait on connection timeouts.
+
+    The conversation history is append-only: each turn pushes its encoded
+    entries (RPUSH + LTRIM in Redis, an append log in memory) instead of
+    rewriting the whole session, and the log keeps only the last
+    SESSION_HISTORY_MAX_ENTRIES entries. Every append bumps the session
+    version; passing `expected_version` turns the append into a
+    compare-and-set.
+    """
+
+    def __init__(self, redis_client=None, db_store: Optional[PostgresSessionStore] = None):
+        # No I/O here: connections are opened lazily by the pool
+        self.redis_client = redis_client
+        self.db_store = db_store
+        self._local_cache = LocalSessionStore(
+            max_entries=settings.SESSION_LOCAL_MAX_ENTRIES,
+            max_bytes=settings.SESSION_LOCAL_MAX_BYTES
+        )
+        self._unavailable_until = 0.0
+        if self.redis_client is None and self.db_store is None:
             logger.info("ℹ️ Redis not configured. Using in-memory fallback for sessions.")
 
-    def save_session(self, session_id: str, data: Dict, ttl_minutes: int = 30):
+    def _use_redis(self) -> bool:
+        return self.redis_client is not None and time.monotonic() >= self._unavailable_until
+
+    def _mark_unavailable(self, action: str, error: Exception):
+        self._unavailable_until = time.monotonic() + settings.REDIS_RECONNECT_INTERVAL
+        logger.error(
+            f"Error {action} Redis: {error}. Using in-memory fallback for "
+            f"{settings.REDIS_RECONNECT_INTERVAL}s."
+        )
+
+    async def ping(self) -> bool:
+        """Checks the connection (startup and health checks)."""
+        if self.redis_client is None:
+            return False
+        try:
+            await self.redis_client.ping()
+            self._unavailable_until = 0.0
+            return True
+        except Exception as e:
+            self._mark_unavailable("pinging", e)
+            return False
+
+    async def save_session(self, session_id: str, data: Dict, ttl_minutes: int = 30):
         """Save session data."""
-        if self.redis_client:
+        if self._use_redis():
             try:
-                self.redis_client.setex(
+                await self.redis_client.setex(
                     f"session:{session_id}",
                     timedelta(minutes=ttl_minutes),
                     json.dumps(data)
                 )
+                return
             except Exception as e:
-                logger.error(f"Error saving session to Redis: {e}")
-        else:
-            self._local_cache[session_id] = data
+                self._mark_unavailable("saving session to", e)
+        elif self.db_store is not None:
+            try:
+                await self.db_store.save_session(session_id, data, ttl_minutes * 60)
+                return
+            except Exception as e:
+                logger.error(f"Error saving session to Postgres: {e}")
+        self._local_cache.set(session_id, data, ttl_seconds=ttl_minutes * 60)
 
-    def get_session(self, session_id: str) -> Optional[Dict]:
+    async def get_session(self, session_id: str) -> Optional[Dict]:
         """Retrieve session data."""
-        if self.redis_client:
+        if self._use_redis():
             try:
-                data = self.redis_client.get(f"session:{session_id}")
+                data = await self.redis_client.get(f"session:{session_id}")
                 return json.loads(data) if data else None
             except Exception as e:
-                logger.error(f"Error getting session from Redis: {e}")
-                return None
-        else:
-            return self._local_cache.get(session_id)
+                self._mark_unavailable("getting session from", e)
+        elif self.db_store is not None:
+            try:
+                return await self.db_store.get_session(session_id)
+            except Exception as e:
+                logger.error(f"Error getting session from Postgres: {e}")
+        return self._local_cache.get(session_id)
 
-    def clear_session(self, session_id: str):
+    async def clear_session(self, session_id: str):
         """Delete session."""
-        if self.redis_client:
+        if self._use_redis():
+            try:
+                await self.redis_client.delete(f"session:{session_id}")
+            except Exception as e:
+                self._mark_unavailable("clearing session in", e)
+        self._local_cache.delete(session_id)
+        self._local_cache.delete(f"history:{session_id}")
+        if self._use_redis():
             try:
-                self.redis_client.delete(f"session:{session_id}")
+                await self.redis_client.delete(*self._history_keys(session_id))
             except Exception as e:
-                logger.error(f"Error clearing session in Redis: {e}")
+                self._mark_unavailable("clearing history in", e)
+        if self.db_store is not None:
+            try:
+                await self.db_store.clear_session(session_id)
+            except Exception as e:
+                logger.error(f"Error clearing session in Postgres: {e}")
+
+    # ==================== HISTORY (append-only) ====================
+
+    @staticmethod
+    def _history_keys(session_id: str) -> Tuple[str, str]:
+        return f"session:{session_id}:history", f"session:{session_id}:version"
+
+    async def get_history(self, session_id: str, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Returns (entries, version); `limit` reads only the most recent entries."""
+        start = -limit if limit else 0
+        if self._use_redis():
+            history_key, version_key = self._history_keys(session_id)
+            try:
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    pipe.lrange(history_key, start, -1)
+                    pipe.get(version_key)
+                    items, version = await pipe.execute()
+                return [decode_entry(item) for item in items], int(version or 0)
+            except Exception as e:
+                self._mark_unavailable("getting history from", e)
+        elif self.db_store is not None:
+            try:
+                return await self.db_store.get_history(session_id, limit)
+            except Exception as e:
+                logger.error(f"Error getting history from Postgres: {e}")
+        log = self._local_cache.get(f"history:{session_id}") or {"entries": [], "version": 0}
+        return [decode_entry(item) for item in log["entries"][start:]], log["version"]
+
+    async def append_history(
+        self,
+        session_id: str,
+        entries: List[Dict],
+        expected_version: Optional[int] = None,
+        ttl_minutes: int = 30
+    ) -> int:
+        """
+        Appends entries to the session history and returns the new version.
+        Raises SessionConflictError if `expected_version` is given and another
+        append happened since that version was read.
+        """
+        items = [encode_entry(entry) for entry in entries]
+        cap = settings.SESSION_HISTORY_MAX_ENTRIES
+        if self._use_redis():
+            history_key, version_key = self._history_keys(session_id)
+            try:
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    if expected_version is not None:
+                        await pipe.watch(version_key)
+                        if int(await pipe.get(version_key) or 0) != expected_version:
+                            raise SessionConflictError(session_id)
+                        pipe.multi()
+                    pipe.rpush(history_key, *items)
+                    pipe.ltrim(history_key, -cap, -1)
+                    pipe.incr(version_key)
+                    pipe.expire(history_key, timedelta(minutes=ttl_minutes))
+                    pipe.expire(version_key, timedelta(minutes=ttl_minutes))
+                    results = await pipe.execute()
+                return int(results[2])
+            except WatchError:
+                raise SessionConflictError(session_id)
+            except SessionConflictError:
+                raise
+            except Exception as e:
+                self._mark_unavailable("appending history to", e)
+        elif self.db_store is not None:
+            try:
+                version = await self.db_store.append_history(
+                    session_id, entries, cap, ttl_minutes * 60, expected_version=expected_version
+                )
+            except Exception as e:
+                logger.error(f"Error appending history to Postgres: {e}")
+            else:
+                if version is None:
+                    raise SessionConflictError(session_id)
+                return version
+
+        version = self._local_cache.append(
+            f"history:{session_id}", items, cap, ttl_minutes * 60, expected_version=expected_version
+        )
+        if version is None:
+            raise SessionConflictError(session_id)
+        return version
+
+    def stats(self) -> Dict[str, any]:
+        backend = "redis" if self.redis_client is not None else "postgres" if self.db_store is not None else "memory"
+        return {
+            "backend": backend,
+            "redis_available": self._use_redis(),
+            "local": self._local_cache.stats(),
+            **({"postgres": {"swept": self.db_store.swept}} if self.db_store is not None else {}),
+        }
+
+    async def close(self):
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+        if self.db_store is not None:
+            await self.db_store.stop()
+
+
+# ==================== PROCESS INSTANCE ====================
+
+_session_manager: Optional[SessionManager] = None
+
+
+def get_session_manager() -> SessionManager:
+    """Shared SessionManager (created on first use or by the lifespan)."""
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = SessionManager(*_session_backends())
+    return _session_manager
+
+
+def _session_backends():
+    """(redis client, Postgres store) for SESSION_BACKEND (auto: Redis, else Postgres, else memory)."""
+    from src.config import database
+
+    backend = settings.SESSION_BACKEND
+    redis_client = create_redis_client() if backend in ("auto", "redis") else None
+    db_store = None
+    if backend == "postgres" or (
+        backend == "auto" and redis_client is None and database.engine.dialect.name == "postgresql"
+    ):
+        db_store = PostgresSessionStore(
+            sweep_interval=settings.SESSION_SWEEP_INTERVAL,
+            sweep_batch_size=settings.SESSION_SWEEP_BATCH_SIZE
+        )
+    return redis_client, db_store
+
+
+async def init_session_manager() -> SessionManager:
+    """Creates the shared manager at startup and checks the Redis connection."""
+    manager = get_session_manager()
+    if manager.redis_client is not None:
+        if await manager.ping():
+            logger.info("✅ Connected to Redis for Session Management")
         else:
-            if session_id in self._local_cache:
-                del self._local_cache[session_id]
+            logger.warning("⚠️ Could not connect to Redis. Using in-memory fallback until it is reachable.")
+    elif manager.db_store is not None:
+        manager.db_store.start()  # Expired sessions sweeper
+        logger.info("✅ Using Postgres (agent_sessions) for Session Management")
+    return manager
+
+
+async def close_session_manager():
+    global _session_manager
+    if _session_manager is not None:
+        await _session_manager.close()
+        _session_manager = None
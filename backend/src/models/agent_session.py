@@ -0,0 +1,39 @@
+import uuid
+
+from sqlalchemy import (
+    JSON,
+    CheckConstraint,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Uuid,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.config.database import Base
+
+
+class AgentSession(Base):
+    """Short-term session storage without Redis (table from migrations/002)."""
+
+    __tablename__ = "agent_sessions"
+    __table_args__ = (CheckConstraint("expires_at > created_at", name="valid_expiry"),)
+
+    session_id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    # Anonymous chats have no client yet (nullable since migrations/005)
+    cliente_id = Column(Integer, nullable=True)
+    agent_name = Column(String(50), nullable=False)
+    # Conversation history (append-only, capped) and {"version": n, "data": {...}}
+    messages = Column(JSON().with_variant(JSONB(), "postgresql"), default=list)
+    context = Column(JSON().with_variant(JSONB(), "postgresql"), default=dict)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<AgentSession(session_id={self.session_id}, expires_at={self.expires_at})>"
+
+
+Index("idx_agent_sessions_expires", AgentSession.expires_at)
@@ -0,0 +1,39 @@
+import uuid
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text, Uuid, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.config.database import Base
+from src.models.types import EmbeddingVector
+
+
+class ConversationMemory(Base):
+    """Long-term conversation history (table from migrations/001 and 002)."""
+
+    __tablename__ = "conversation_memory"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    cliente_id = Column(Integer, nullable=False, index=True)
+    agent_name = Column(String(50), nullable=False)
+    content = Column(Text, nullable=False)
+    # Deployed databases have only one of the two: `embedding` (pgvector,
+    # migrations/001) or `embedding_json` (migrations/002, no pgvector).
+    # ConversationStore detects which one exists.
+    embedding = Column(EmbeddingVector(1536))
+    embedding_json = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
+    # "metadata" is reserved by the declarative base
+    metadata_ = Column("metadata", JSON().with_variant(JSONB(), "postgresql"), default=dict)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ConversationMemory(cliente_id={self.cliente_id}, agent={self.agent_name})>"
+
+
+# Paginated history reads: WHERE cliente_id = ? ORDER BY created_at DESC, id DESC (migrations/004)
+Index(
+    "idx_conversation_memory_cliente_created",
+    ConversationMemory.cliente_id,
+    ConversationMemory.created_at.desc(),
+    ConversationMemory.id.desc()
+)
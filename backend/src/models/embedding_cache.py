@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, func
+
+from src.config.database import Base
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    # Chave: (deployment, sha256 do texto)
+    deployment = Column(String(100), primary_key=True)
+    text_hash = Column(String(64), primary_key=True)
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 (numpy.tobytes)
+    data_criacao = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<EmbeddingCacheEntry(deployment={self.deployment}, hash={self.text_hash[:12]})>"
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text
-from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, ForeignKey, Integer, String, Text
+from sqlalchemy.orm import relationship
 from src.config.database import Base
+from src.models.types import EmbeddingVector
 
 class KnowledgeBaseItem(Base):
     __tablename__ = "knowledge_base_items"
@@ -9,7 +10,34 @@ class KnowledgeBaseItem(Base):
     topic = Column(String(255), nullable=False, index=True)
     content = Column(Text, nullable=False)
     # Dimension 1536 is for text-embedding-3-small and ada-002
-    embedding = Column(Vector(1536))
+    # Documents ingested with chunking have the vectors on their chunks instead
+    embedding = Column(EmbeddingVector(1536))
+
+    chunks = relationship(
+        "KnowledgeBaseChunk",
+        back_populates="document",
+        cascade="all, delete-orphan",
+        order_by="KnowledgeBaseChunk.chunk_index"
+    )
 
     def __repr__(self):
         return f"<KnowledgeBaseItem(id={self.id}, topic={self.topic})>"
+
+
+class KnowledgeBaseChunk(Base):
+    __tablename__ = "knowledge_base_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("knowledge_base_items.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    # Character offsets of the chunk inside the parent document content
+    start_offset = Column(Integer, nullable=False)
+    end_offset = Column(Integer, nullable=False)
+    heading = Column(String(255))
+    content = Column(Text, nullable=False)
+    embedding = Column(EmbeddingVector(1536))
+
+    document = relationship("KnowledgeBaseItem", back_populates="chunks")
+
+    def __repr__(self):
+        return f"<KnowledgeBaseChunk(document_id={self.document_id}, index={self.chunk_index})>"
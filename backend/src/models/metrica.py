@@ -1,9 +1,12 @@
-from sqlalchemy import Column, DateTime, Float, Integer, func
+from sqlalchemy import JSON, Column, DateTime, Float, Integer, func
+from sqlalchemy.dialects.postgresql import JSONB
 
 from src.config.database import Base
 
 
 class Metrica(Base):
+    """Snapshot das contagens de KPIs, gravado periodicamente (ver services/kpi_snapshot)."""
+
     __tablename__ = "metricas"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -11,7 +14,9 @@ class Metrica(Base):
     chamados_automaticos = Column(Integer, default=0)
     chamados_encaminhados = Column(Integer, default=0)
     tempo_medio_resposta = Column(Float, default=0.0)
-    data_atualizacao = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Todas as contagens de KPIService.get_counts (migrations/006)
+    kpis = Column(JSON().with_variant(JSONB(), "postgresql"))
+    data_atualizacao = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True)
 
     def __repr__(self):
         return f"<Metrica(id={self.id}, total={self.total_chamados})>"
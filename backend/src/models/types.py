@@ -0,0 +1,32 @@
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+
+class EmbeddingVector(TypeDecorator):
+    """
+    Coluna de embedding: `vector(n)` do pgvector quando disponível.
+
+    No Postgres sem a extensão (ver init_db / pgvector_available) o vetor é
+    gravado como JSONB; a busca usa então o índice em memória
+    (src/services/vector_store.py).
+    """
+
+    impl = Vector
+    cache_ok = True
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.dim = dim
+
+    def load_dialect_impl(self, dialect):
+        from src.config import database
+        if dialect.name == "postgresql" and database.pgvector_available is False:
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Vector(self.dim))
+
+    def process_bind_param(self, value, dialect):
+        # numpy -> lista (aceito tanto pelo pgvector quanto pelo JSON)
+        if value is not None and hasattr(value, "tolist"):
+            return value.tolist()
+        return value
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Optional, Any
 import logging
+import threading
 
 from src.agents.orchestrator import AgentOrchestrator
+from src.agents.streaming import format_sse
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 logger = logging.getLogger(__name__)
@@ -19,16 +22,80 @@ class ChatResponse(BaseModel):
     agent_used: str
     confidence: float
     routing_reasoning: Optional[str] = None
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
 
-# Dependency to get orchestrator (could be singleton)
-def get_orchestrator():
-    return AgentOrchestrator()
+_orchestrator_lock = threading.Lock()
 
-from src.utils.security import get_optional_current_client
+# Dependency to get the application-lifetime orchestrator (created in main.lifespan)
+def get_orchestrator(request: Request) -> AgentOrchestrator:
+    orchestrator = getattr(request.app.state, "orchestrator", None)
+    if orchestrator is None:
+        # Lifespan not executed (e.g. TestClient used without context manager):
+        # created once and kept on app.state, never per request. Sync
+        # dependencies run in the threadpool, hence the lock.
+        with _orchestrator_lock:
+            orchestrator = getattr(request.app.state, "orchestrator", None)
+            if orchestrator is None:
+                logger.warning("Orchestrator not created by the lifespan, creating it on first use")
+                orchestrator = AgentOrchestrator()
+                request.app.state.orchestrator = orchestrator
+    return orchestrator
+
+from src.utils.security import get_current_user, get_optional_current_client
 from src.models.cliente import Cliente
 from src.config.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
+async def build_chat_context(request: ChatRequest, client: Optional[Cliente], db: AsyncSession) -> Dict[str, Any]:
+    """
+    Build the agent context (session + authenticated client summary).
+    """
+    context = request.context or {}
+    context["session_id"] = request.session_id
+    
+    if client:
+        context["client_id"] = client.id
+        context["client_name"] = client.nome
+        context["client_email"] = client.email
+        
+        # Fetch Active Plan
+        from sqlalchemy import select
+        from src.models.contrato import Contrato
+        from src.models.plano import Plano
+        from sqlalchemy.orm import selectinload
+        
+        contrato_result = await db.execute(
+            select(Contrato)
+            .options(selectinload(Contrato.plano))
+            .filter(Contrato.cliente_id == client.id, Contrato.status == 'ativo')
+        )
+        contrato = contrato_result.scalars().first()
+        
+        if contrato:
+            context["client_plan"] = {
+                "name": contrato.plano.nome,
+                "speed": contrato.plano.velocidade,
+                "price": float(contrato.plano.preco)
+            }
+        else:
+            context["client_plan"] = "Nenhum plano ativo"
+
+        # Fetch Recent Tickets
+        from src.models.chamado import Chamado
+        chamados_result = await db.execute(
+            select(Chamado)
+            .filter(Chamado.cliente_id == client.id)
+            .order_by(Chamado.data_criacao.desc())
+            .limit(3)
+        )
+        chamados = chamados_result.scalars().all()
+        context["client_tickets"] = [
+            {"id": c.id, "subject": c.mensagem, "status": c.status} for c in chamados
+        ]
+    
+    return context
+
 @router.post("/", response_model=ChatResponse)
 async def chat_endpoint(
     request: ChatRequest,
@@ -41,57 +108,7 @@ async def chat_endpoint(
     """
     try:
         # Prepare context
-        context = request.context or {}
-        context["session_id"] = request.session_id
-        
-        if client:
-            context["client_id"] = client.id
-            context["client_name"] = client.nome
-            context["client_email"] = client.email
-            
-            # Fetch Active Plan
-            from sqlalchemy import select
-            from src.models.contrato import Contrato
-            from src.models.plano import Plano
-            from sqlalchemy.orm import selectinload
-            
-            contrato_result = await db.execute(
-                select(Contrato)
-                .options(selectinload(Contrato.plano))
-                .filter(Contrato.cliente_id == client.id, Contrato.status == 'ativo')
-            )
-            contrato = contrato_result.scalars().first()
-            
-            if contrato:
-                context["client_plan"] = {
-                    "name": contrato.plano.nome,
-                    "speed": contrato.plano.velocidade,
-                    "price": float(contrato.plano.preco)
-                }
-            else:
-                context["client_plan"] = "Nenhum plano ativo"
-
-            # Fetch Recent Tickets
-            from src.models.chamado import Chamado
-            chamados_result = await db.execute(
-                select(Chamado)
-                .filter(Chamado.cliente_id == client.id)
-                .order_by(Chamado.data_criacao.desc())
-                .limit(3)
-            )
-            chamados = chamados_result.scalars().all()
-            context["client_tickets"] = [
-                {"id": c.id, "subject": c.mensagem, "status": c.status} for c in chamados
-            ]
-            
-            # Inject Client Summary (Plan & Recent Tickets)
-            # We need a DB session here. Since we don't have one injected in the endpoint signature directly for this logic,
-            # we should add it.
-            # BUT, wait, we can't easily add 'db' to the signature if it wasn't there. 
-            # Let's check the file content again. It DOES NOT have 'db' in signature.
-            # I will add 'db: AsyncSession = Depends(get_db)' to the signature in a separate edit or assume I can add it here.
-            # Actually, I'll add the db dependency to the function signature first.
-            pass
+        context = await build_chat_context(request, client, db)
         
         # Process
         result = await orchestrator.process_message(request.message, context)
@@ -100,9 +117,47 @@ async def chat_endpoint(
             response=result.get("response", "Erro ao processar resposta."),
             agent_used=result.get("agent_used", "unknown"),
             confidence=result.get("confidence", 0.0),
-            routing_reasoning=result.get("routing_reasoning")
+            routing_reasoning=result.get("routing_reasoning"),
+            cached=result.get("cached", False),
+            prompt_tokens=result.get("prompt_tokens")
         )
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    orchestrator: AgentOrchestrator = Depends(get_orchestrator),
+    client: Optional[Cliente] = Depends(get_optional_current_client),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream a chat response as Server-Sent Events.
+
+    Events: "routing" (agent, confidence), "tool_call", "delta" (text),
+    then "done" or "error".
+    """
+    try:
+        context = await build_chat_context(request, client, db)
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        async for event in orchestrator.stream_message(request.message, context):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stats", dependencies=[Depends(get_current_user)])
+async def chat_stats(orchestrator: AgentOrchestrator = Depends(get_orchestrator)):
+    """
+    Runtime counters of the agent pipeline (router cache, etc).
+    """
+    return orchestrator.get_stats()
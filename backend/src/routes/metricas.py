@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import func, select
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.config.database import get_db
-from src.models.chamado import Chamado
-from src.models.cliente import Cliente
+from src.services.kpi_service import DIMENSOES, KPIService
+from src.services.kpi_snapshot import get_kpi_counts
 from src.utils.security import get_current_user
 
 router = APIRouter(prefix="/metricas", tags=["Métricas"])
@@ -13,35 +15,26 @@ router = APIRouter(prefix="/metricas", tags=["Métricas"])
 @router.get("/", response_model=dict, dependencies=[Depends(get_current_user)])
 async def obter_metricas(db: AsyncSession = Depends(get_db)):
     """Retorna métricas gerais de atendimento"""
-
-    total_chamados_result = await db.execute(select(func.count(Chamado.id)))
-    total_chamados = total_chamados_result.scalar() or 0
-    
-    chamados_automaticos_result = await db.execute(
-        select(func.count(Chamado.id)).filter(Chamado.encaminhado_para_humano == False)
-    )
-    chamados_automaticos = chamados_automaticos_result.scalar() or 0
-    
-    chamados_encaminhados_result = await db.execute(
-        select(func.count(Chamado.id)).filter(Chamado.encaminhado_para_humano == True)
-    )
-    chamados_encaminhados = chamados_encaminhados_result.scalar() or 0
-
-    total_clientes_result = await db.execute(select(func.count(Cliente.id)))
-    total_clientes = total_clientes_result.scalar() or 0
-
-    taxa_resolucao = (
-        (chamados_automaticos / total_chamados * 100) if total_chamados > 0 else 0
-    )
-
-    return {
-        "total_chamados": total_chamados,
-        "total_clientes": total_clientes,
-        "chamados_resolvidos_automaticamente": chamados_automaticos,
-        "chamados_encaminhados_para_humano": chamados_encaminhados,
-        "taxa_resolucao_automatica": f"{taxa_resolucao:.1f}%",
-        "tempo_medio_resposta_segundos": "< 1s (mock)",
-    }
+    snapshot = await get_kpi_counts(db)
+    return {**KPIService.metricas_gerais(snapshot["counts"]), "data_atualizacao": snapshot["data_atualizacao"]}
+
+
+@router.get("/agrupadas", response_model=dict, dependencies=[Depends(get_current_user)])
+async def metricas_agrupadas(
+    dimensoes: List[str] = Query(["canal"], description=f"Dimensões: {', '.join(DIMENSOES)}"),
+    data_inicio: Optional[date] = Query(None, description="Chamados criados a partir de (inclusive)"),
+    data_fim: Optional[date] = Query(None, description="Chamados criados até (inclusive)"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Total, resolvidos automaticamente e taxa de resolução por combinação das
+    dimensões (ex.: ?dimensoes=canal&dimensoes=status), em uma única consulta.
+    """
+    try:
+        grupos = await KPIService.get_grouped(db, dimensoes, data_inicio, data_fim)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"dimensoes": dimensoes, "grupos": grupos}
 
 
 @router.get(
@@ -49,27 +42,17 @@ async def obter_metricas(db: AsyncSession = Depends(get_db)):
 )
 async def metricas_por_canal(db: AsyncSession = Depends(get_db)):
     """Retorna métricas detalhadas por canal"""
-    canais = ["site", "whatsapp", "email"]
-    resultado = {}
-
-    for canal in canais:
-        total_result = await db.execute(
-            select(func.count(Chamado.id)).filter(Chamado.canal == canal)
-        )
-        total = total_result.scalar() or 0
-        
-        automaticos_result = await db.execute(
-            select(func.count(Chamado.id))
-            .filter(Chamado.canal == canal, Chamado.encaminhado_para_humano == False)
-        )
-        automaticos = automaticos_result.scalar() or 0
-
-        resultado[canal] = {
-            "total": total,
-            "resolvidos_automaticamente": automaticos,
-            "taxa_resolucao": f"{(automaticos/total*100):.1f}%" if total > 0 else "0%",
+    # Canais conhecidos aparecem mesmo sem chamados; os demais, quando existirem
+    resultado = {
+        canal: {"total": 0, "resolvidos_automaticamente": 0, "taxa_resolucao": "0%"}
+        for canal in ("site", "whatsapp", "email")
+    }
+    for grupo in await KPIService.get_grouped(db, ["canal"]):
+        resultado[grupo["canal"]] = {
+            "total": grupo["total"],
+            "resolvidos_automaticamente": grupo["resolvidos_automaticamente"],
+            "taxa_resolucao": grupo["taxa_resolucao"],
         }
-
     return resultado
 
 
@@ -78,14 +61,7 @@ async def metricas_por_canal(db: AsyncSession = Depends(get_db)):
 )
 async def metricas_por_status(db: AsyncSession = Depends(get_db)):
     """Retorna distribuição de chamados por status"""
-    statuses = ["aberto", "resolvido", "encaminhado"]
-    resultado = {}
-
-    for status in statuses:
-        count_result = await db.execute(
-            select(func.count(Chamado.id)).filter(Chamado.status == status)
-        )
-        count = count_result.scalar() or 0
-        resultado[status] = count
-
+    resultado = {status: 0 for status in ("aberto", "resolvido", "encaminhado")}
+    for grupo in await KPIService.get_grouped(db, ["status"]):
+        resultado[grupo["status"] or "sem_status"] = grupo["total"]
     return resultado
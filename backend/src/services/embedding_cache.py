@@ -0,0 +1,180 @@
+"""
+Cache de embeddings por conteúdo.
+
+Chave: (deployment, sha256(texto)). Duas camadas:
+- memória: LRU no processo;
+- durável (EMBEDDING_CACHE_PERSIST, desligada por padrão): tabela
+  `embedding_cache` no banco da aplicação (Postgres em produção, SQLite em
+  desenvolvimento/testes). Cada falta na memória custa uma consulta ao banco
+  antes da chamada à API.
+
+Evita reprocessar documentos já embutidos (ex: reexecutar
+scripts/seed_knowledge_base.py) e consultas repetidas ("internet lenta").
+
+A gravação na camada durável não atrasa a resposta: é feita em segundo plano
+com um único INSERT ... ON CONFLICT DO NOTHING (chaves gravadas ao mesmo
+tempo por outra instância são simplesmente ignoradas). `flush()` aguarda as
+gravações pendentes (shutdown e scripts).
+"""
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.config.settings import settings
+from src.models.embedding_cache import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings em duas camadas com contadores de acerto.
+    Falhas na camada durável são registradas e ignoradas (nunca impedem a
+    geração do embedding).
+    """
+
+    def __init__(self, max_entries: int = 10000, persist: bool = True, session_factory=None):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._session_factory = session_factory
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._pending_writes: Set[asyncio.Task] = set()
+        self.memory_hits = 0
+        self.durable_hits = 0
+        self.misses = 0
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from src.config.database import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory()
+
+    def _remember(self, key: Tuple[str, str], embedding: List[float]):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, deployment: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings em cache na ordem de `texts` (None para os ausentes)."""
+        hashes = [text_hash(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        for i, h in enumerate(hashes):
+            embedding = self._entries.get((deployment, h))
+            if embedding is not None:
+                self._entries.move_to_end((deployment, h))
+                results[i] = embedding
+                self.memory_hits += 1
+
+        missing = {hashes[i] for i, r in enumerate(results) if r is None}
+        if missing and self.persist:
+            try:
+                async with self._sessions() as session:
+                    rows = (await session.execute(
+                        select(EmbeddingCacheEntry).filter(
+                            EmbeddingCacheEntry.deployment == deployment,
+                            EmbeddingCacheEntry.text_hash.in_(missing)
+                        )
+                    )).scalars().all()
+                found = {
+                    row.text_hash: np.frombuffer(row.embedding, dtype=np.float32).tolist()
+                    for row in rows
+                }
+                for i, h in enumerate(hashes):
+                    if results[i] is None and h in found:
+                        results[i] = found[h]
+                        self._remember((deployment, h), found[h])
+                        self.durable_hits += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Cache de embeddings (banco) indisponível na leitura: {e}")
+
+        self.misses += sum(1 for r in results if r is None)
+        return results
+
+    async def put_many(self, deployment: str, texts: List[str], embeddings: List[List[float]], wait: bool = False):
+        """
+        Grava embeddings novos: na memória na hora; no banco em segundo plano
+        (ou antes de retornar, com `wait`).
+        """
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            h = text_hash(text)
+            self._remember((deployment, h), embedding)
+            rows[h] = {
+                "deployment": deployment,
+                "text_hash": h,
+                "dimensions": len(embedding),
+                "embedding": np.asarray(embedding, dtype=np.float32).tobytes(),
+            }
+
+        if not rows or not self.persist:
+            return
+        if wait:
+            await self._persist(list(rows.values()))
+            return
+        task = asyncio.create_task(self._persist(list(rows.values())))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    async def _persist(self, rows: List[Dict[str, any]]):
+        try:
+            async with self._sessions() as session:
+                dialect = session.get_bind().dialect.name
+                insert = pg_insert if dialect == "postgresql" else sqlite_insert
+                await session.execute(insert(EmbeddingCacheEntry).values(rows).on_conflict_do_nothing())
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Cache de embeddings (banco) indisponível na escrita: {e}")
+
+    async def flush(self):
+        """Aguarda as gravações em segundo plano."""
+        while self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, any]:
+        lookups = self.memory_hits + self.durable_hits + self.misses
+        hits = self.memory_hits + self.durable_hits
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "durable_hits": self.durable_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Cache do processo (criado no primeiro uso); None quando desativado."""
+    global _embedding_cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            persist=settings.EMBEDDING_CACHE_PERSIST
+        )
+    return _embedding_cache
+
+
+async def flush_embedding_cache():
+    """Aguarda as gravações pendentes do cache do processo (shutdown e scripts)."""
+    if _embedding_cache is not None:
+        await _embedding_cache.flush()
@@ -0,0 +1,160 @@
+"""
+Contagens de KPIs compartilhadas pelo dashboard (/api/dashboard/kpis) e
+pelas métricas gerais (/api/metricas).
+
+Uma agregação por tabela com contagens condicionais (COUNT(*) FILTER no
+PostgreSQL, SUM(CASE ...) nos demais bancos). As agregações retornam uma
+linha cada e são combinadas em um único SELECT: uma ida ao banco por
+requisição. As métricas agrupadas (por canal, status...) também são um
+único GROUP BY, qualquer que seja o número de grupos.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.chamado import Chamado
+from src.models.cliente import Cliente
+from src.models.contrato import Contrato
+
+# Custo médio por chamado (estimativa do dashboard)
+CUSTO_HUMANO_UNITARIO = 15.00
+CUSTO_IA_UNITARIO = 0.50
+# Receita estimada: contratos ativos * ticket médio
+TICKET_MEDIO = 100.00
+
+# Dimensões aceitas nas métricas agrupadas
+DIMENSOES = {
+    "canal": Chamado.canal,
+    "status": Chamado.status,
+    "categoria": Chamado.categoria,
+    "prioridade": Chamado.prioridade,
+}
+
+
+def _count_if(condition, dialect: str):
+    if dialect == "postgresql":
+        return func.count().filter(condition)
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+class KPIService:
+
+    @staticmethod
+    async def get_counts(db: AsyncSession) -> Dict[str, int]:
+        """Todas as contagens dos KPIs em uma única consulta."""
+        dialect = db.get_bind().dialect.name
+
+        clientes = select(func.count().label("total_clientes")).select_from(Cliente).subquery()
+        contratos = select(
+            func.count().label("total_contratos"),
+            _count_if(Contrato.status == "ativo", dialect).label("contratos_ativos"),
+            _count_if(Contrato.status == "cancelado", dialect).label("contratos_cancelados"),
+        ).select_from(Contrato).subquery()
+        chamados = select(
+            func.count().label("total_chamados"),
+            _count_if(Chamado.status == "aberto", dialect).label("chamados_abertos"),
+            _count_if(Chamado.encaminhado_para_humano == False, dialect).label("chamados_automaticos"),  # noqa: E712
+            _count_if(Chamado.encaminhado_para_humano == True, dialect).label("chamados_encaminhados"),  # noqa: E712
+            _count_if(
+                (Chamado.canal == "chat_ia")
+                & (Chamado.status == "resolvido")
+                & (Chamado.encaminhado_para_humano == False),  # noqa: E712
+                dialect
+            ).label("chamados_ia_resolvidos"),
+        ).select_from(Chamado).subquery()
+
+        # Cada agregação tem exatamente uma linha: o produto cartesiano também
+        query = select(clientes, contratos, chamados).select_from(
+            clientes.join(contratos, true()).join(chamados, true())
+        )
+        row = (await db.execute(query)).one()
+        return {key: int(value or 0) for key, value in row._mapping.items()}
+
+    @staticmethod
+    async def get_grouped(
+        db: AsyncSession,
+        dimensoes: List[str],
+        data_inicio: Optional[date] = None,
+        data_fim: Optional[date] = None
+    ) -> List[Dict[str, any]]:
+        """
+        Total de chamados e resolvidos automaticamente por combinação das
+        dimensões, em um único GROUP BY. O período é inclusivo nas duas pontas.
+        """
+        invalidas = [d for d in dimensoes if d not in DIMENSOES]
+        if not dimensoes or invalidas:
+            raise ValueError(f"Dimensões inválidas: {invalidas or dimensoes}. Use: {', '.join(DIMENSOES)}")
+
+        dialect = db.get_bind().dialect.name
+        colunas = [DIMENSOES[d].label(d) for d in dict.fromkeys(dimensoes)]
+        total = func.count().label("total")
+        query = (
+            select(
+                *colunas,
+                total,
+                _count_if(Chamado.encaminhado_para_humano == False, dialect).label("resolvidos_automaticamente"),  # noqa: E712
+            )
+            .group_by(*colunas)
+            .order_by(total.desc(), *colunas)
+        )
+        if data_inicio is not None:
+            query = query.where(Chamado.data_criacao >= datetime.combine(data_inicio, time.min))
+        if data_fim is not None:
+            query = query.where(Chamado.data_criacao < datetime.combine(data_fim + timedelta(days=1), time.min))
+
+        grupos = []
+        for row in (await db.execute(query)).all():
+            grupo = dict(row._mapping)
+            automaticos = int(grupo["resolvidos_automaticamente"] or 0)
+            grupo["resolvidos_automaticamente"] = automaticos
+            grupo["taxa_resolucao"] = f"{(automaticos / grupo['total'] * 100):.1f}%"
+            grupos.append(grupo)
+        return grupos
+
+    @staticmethod
+    def dashboard_kpis(counts: Dict[str, int]) -> Dict[str, any]:
+        """KPIs do dashboard (churn, resolução pela IA e estimativas financeiras)."""
+        total_contratos = counts["total_contratos"]
+        total_chamados = counts["total_chamados"]
+        chamados_ia = counts["chamados_ia_resolvidos"]
+
+        churn_rate = round(counts["contratos_cancelados"] / total_contratos * 100, 2) if total_contratos else 0
+        ai_resolution_rate = round(chamados_ia / total_chamados * 100, 2) if total_chamados else 0
+
+        # Economia Gerada = Chamados IA * (Custo Humano - Custo IA)
+        economia_total = chamados_ia * (CUSTO_HUMANO_UNITARIO - CUSTO_IA_UNITARIO)
+        receita_mensal = counts["contratos_ativos"] * TICKET_MEDIO
+        custo_operacional = (total_chamados - chamados_ia) * CUSTO_HUMANO_UNITARIO + chamados_ia * CUSTO_IA_UNITARIO
+        profit_margin = (
+            round((receita_mensal - custo_operacional) / receita_mensal * 100, 2) if receita_mensal > 0 else 0
+        )
+
+        return {
+            "total_clientes": counts["total_clientes"],
+            "contratos_ativos": counts["contratos_ativos"],
+            "chamados_abertos": counts["chamados_abertos"],
+            "churn_rate": f"{churn_rate}%",
+            "ai_resolution_rate": f"{ai_resolution_rate}%",
+            "total_savings": f"R$ {economia_total:,.2f}",
+            "profit_margin": f"{profit_margin}%",
+            "nps_medio": 78,  # Mock fixo por enquanto
+            "avg_ai_response_time": "1.2s",  # Mock
+            "first_contact_resolution": "82%"  # Mock
+        }
+
+    @staticmethod
+    def metricas_gerais(counts: Dict[str, int]) -> Dict[str, any]:
+        """Métricas gerais de atendimento (/api/metricas)."""
+        total_chamados = counts["total_chamados"]
+        automaticos = counts["chamados_automaticos"]
+        taxa_resolucao = automaticos / total_chamados * 100 if total_chamados > 0 else 0
+        return {
+            "total_chamados": total_chamados,
+            "total_clientes": counts["total_clientes"],
+            "chamados_resolvidos_automaticamente": automaticos,
+            "chamados_encaminhados_para_humano": counts["chamados_encaminhados"],
+            "taxa_resolucao_automatica": f"{taxa_resolucao:.1f}%",
+            "tempo_medio_resposta_segundos": "< 1s (mock)",
+        }
@@ -0,0 +1,187 @@
+"""
+Snapshots materializados dos KPIs na tabela `metricas`.
+
+O dashboard e /api/metricas servem o último snapshot em vez de contar as
+tabelas a cada requisição (stale-while-revalidate):
+- snapshot com menos de KPI_SNAPSHOT_INTERVAL segundos: servido como está;
+- snapshot mais antigo: servido como está e atualizado em segundo plano;
+- nenhum snapshot (primeira requisição): calculado na hora.
+
+Uma tarefa de fundo também atualiza a cada KPI_SNAPSHOT_INTERVAL. Com vários
+workers, quem encontra no banco um snapshot recente gravado por outro apenas
+o adota, sem recalcular. Snapshots com mais de KPI_SNAPSHOT_RETENTION_DAYS
+dias são removidos a cada gravação.
+"""
+import asyncio
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config.settings import settings
+from src.models.metrica import Metrica
+from src.services.kpi_service import KPIService
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    # metricas.data_atualizacao é DateTime sem fuso: gravado em UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class KPISnapshotRefresher:
+
+    def __init__(self, session_factory=None, interval: float = 300, retention_days: int = 7):
+        self._session_factory = session_factory
+        self.interval = interval
+        self.retention_days = retention_days
+        # {"counts": {...}, "data_atualizacao": datetime (UTC)}
+        self._snapshot: Optional[Dict[str, any]] = None
+        self._revalidating: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.stale_served = 0
+        self.errors = 0
+
+    def _sessions(self, db: Optional[AsyncSession] = None):
+        # Sessão da requisição quando disponível; senão, uma própria
+        if db is not None:
+            return nullcontext(db)
+        if self._session_factory is None:
+            from src.config.database import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory()
+
+    def _age(self, snapshot: Dict[str, any]) -> float:
+        return (_utcnow() - snapshot["data_atualizacao"]).total_seconds()
+
+    async def _load_latest(self, db: Optional[AsyncSession] = None) -> Optional[Dict[str, any]]:
+        async with self._sessions(db) as session:
+            metrica = (await session.execute(
+                select(Metrica).where(Metrica.kpis.isnot(None)).order_by(Metrica.id.desc()).limit(1)
+            )).scalar_one_or_none()
+        if metrica is None:
+            return None
+        return {"counts": metrica.kpis, "data_atualizacao": metrica.data_atualizacao}
+
+    async def refresh(self, db: Optional[AsyncSession] = None) -> Dict[str, any]:
+        """Calcula as contagens agora e grava um novo snapshot."""
+        async with self._sessions(db) as session:
+            counts = await KPIService.get_counts(session)
+            now = _utcnow()
+            session.add(Metrica(
+                total_chamados=counts["total_chamados"],
+                chamados_automaticos=counts["chamados_automaticos"],
+                chamados_encaminhados=counts["chamados_encaminhados"],
+                kpis=counts,
+                data_atualizacao=now,
+            ))
+            await session.execute(
+                delete(Metrica).where(Metrica.data_atualizacao < now - timedelta(days=self.retention_days))
+            )
+            await session.commit()
+        self._snapshot = {"counts": counts, "data_atualizacao": now}
+        self.refreshes += 1
+        return self._snapshot
+
+    async def revalidate(self):
+        """Adota o snapshot do banco se outro worker já o atualizou; senão recalcula."""
+        try:
+            latest = await self._load_latest()
+            if latest is not None and self._age(latest) < self.interval:
+                self._snapshot = latest
+            else:
+                await self.refresh()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Erro ao atualizar o snapshot de KPIs: {e}")
+
+    def _revalidate_in_background(self):
+        if self._revalidating is None or self._revalidating.done():
+            self._revalidating = asyncio.create_task(self.revalidate())
+
+    async def get_snapshot(self, db: Optional[AsyncSession] = None) -> Dict[str, any]:
+        """Último snapshot; se estiver velho, é servido e atualizado em segundo plano."""
+        if self._snapshot is None:
+            self._snapshot = await self._load_latest(db)
+        if self._snapshot is None:
+            return await self.refresh(db)
+        if self._age(self._snapshot) >= self.interval:
+            self.stale_served += 1
+            self._revalidate_in_background()
+        return self._snapshot
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.revalidate()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._revalidating):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._revalidating = None
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "refreshes": self.refreshes,
+            "stale_served": self.stale_served,
+            "errors": self.errors,
+            "age_seconds": round(self._age(self._snapshot), 1) if self._snapshot else None,
+        }
+
+
+async def get_kpi_counts(db: AsyncSession) -> Dict[str, any]:
+    """
+    Contagens dos KPIs e `data_atualizacao` (ISO, UTC) do cálculo: o último
+    snapshot, ou contagem na hora quando os snapshots estão desativados.
+    """
+    refresher = get_kpi_refresher()
+    if refresher is None:
+        snapshot = {"counts": await KPIService.get_counts(db), "data_atualizacao": _utcnow()}
+    else:
+        snapshot = await refresher.get_snapshot(db)
+    return {"counts": snapshot["counts"], "data_atualizacao": snapshot["data_atualizacao"].isoformat()}
+
+
+# ==================== INSTÂNCIA DO PROCESSO ====================
+
+_kpi_refresher: Optional[KPISnapshotRefresher] = None
+
+
+def get_kpi_refresher() -> Optional[KPISnapshotRefresher]:
+    """Refresher iniciado pelo lifespan (None quando desativado ou não iniciado)."""
+    return _kpi_refresher
+
+
+def start_kpi_refresher() -> Optional[KPISnapshotRefresher]:
+    global _kpi_refresher
+    if not settings.KPI_SNAPSHOT_ENABLED:
+        return None
+    if _kpi_refresher is None:
+        _kpi_refresher = KPISnapshotRefresher(
+            interval=settings.KPI_SNAPSHOT_INTERVAL,
+            retention_days=settings.KPI_SNAPSHOT_RETENTION_DAYS
+        )
+    _kpi_refresher.start()
+    return _kpi_refresher
+
+
+async def stop_kpi_refresher():
+    global _kpi_refresher
+    if _kpi_refresher is not None:
+        await _kpi_refresher.stop()
+        _kpi_refresher = None
@@ -0,0 +1,202 @@
+"""
+Índice lexical (BM25) dos trechos da base de conhecimento.
+
+Complementa a busca vetorial do RAGService: termos exatos ("LOS vermelha",
+"PON", códigos de erro) são bem ranqueados pelo BM25 e mal pelos embeddings.
+Os dois rankings são combinados com Reciprocal Rank Fusion (RRF) e, quando o
+resultado lexical é inequívoco, a busca responde sem gerar embedding.
+
+- tokenização com normalização de acentos e stemming leve para português
+  (remoção de sufixos inspirada no RSLP, sem dependências externas);
+- índice invertido em memória, carregado no startup e atualizado
+  incrementalmente quando documentos são adicionados.
+
+Cada processo mantém a sua cópia: documentos adicionados por outra instância
+aparecem após o próximo carregamento.
+"""
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from src.config.settings import settings
+from src.models.knowledge_base import KnowledgeBaseChunk, KnowledgeBaseItem
+from src.services.vector_store import chunk_metadata
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_STOPWORDS = frozenset(
+    "a o as os um uma uns umas de da do das dos em na no nas nos por para pra com sem "
+    "e ou que se ao aos como qual quais meu minha meus minhas seu sua esta este isso "
+    "eu voce ele ela ja mais muito tem ter ser estou sao foi".split()
+)
+
+# Sufixos removidos (o primeiro que casar), do mais longo para o mais curto
+_SUFFIXES = (
+    "amentos", "imentos", "amento", "imento", "acoes", "icoes", "mente", "acao", "icao",
+    "ando", "endo", "indo", "ados", "idos", "adas", "idas", "ada", "ado", "ida", "ido",
+    "oes", "aes", "ais", "eis", "ao", "ar", "er", "ir", "es", "os", "as", "a", "o", "e", "s",
+)
+_MIN_STEM = 3
+
+
+def fold(text: str) -> str:
+    """Minúsculas sem acentos ("Conexão" -> "conexao")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(token: str) -> str:
+    # Siglas e códigos (PON, LOS, E012) ficam como estão
+    if len(token) <= _MIN_STEM or any(c.isdigit() for c in token):
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in _TOKEN_RE.findall(fold(text)) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Índice invertido termo -> {documento: frequência} com pontuação Okapi BM25.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._metadata: List[Dict[str, any]] = []
+        self._chunk_ids: set = set()
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._metadata)
+
+    def add(self, metadata: List[Dict[str, any]]):
+        """Indexa trechos (título do documento + seção + conteúdo); ignora ids já presentes."""
+        for meta in metadata:
+            if meta.get("id") in self._chunk_ids:
+                continue
+            doc = len(self._metadata)
+            terms = tokenize(" ".join(filter(None, (meta.get("topic"), meta.get("section"), meta.get("content")))))
+            for term, frequency in Counter(terms).items():
+                self._postings.setdefault(term, {})[doc] = frequency
+            self._lengths.append(len(terms))
+            self._total_length += len(terms)
+            self._metadata.append(meta)
+            self._chunk_ids.add(meta.get("id"))
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, any]]:
+        """
+        Top-k por BM25. Cada resultado traz `score` e `coverage` (fração dos
+        termos da consulta presentes no trecho).
+        """
+        terms = set(tokenize(query))
+        if not terms or not self._metadata:
+            return []
+
+        total = len(self._metadata)
+        avg_length = self._total_length / total
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+                matched[doc] += 1
+
+        top = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [
+            {
+                **{f: self._metadata[doc].get(f) for f in ("topic", "section", "content", "document_id", "chunk_index")},
+                "score": round(scores[doc], 4),
+                "coverage": round(matched[doc] / len(terms), 4),
+            }
+            for doc in top
+        ]
+
+
+def is_confident(results: List[Dict[str, any]], margin: float) -> bool:
+    """
+    Resultado lexical inequívoco: o melhor trecho contém todos os termos da
+    consulta e supera em `margin` vezes o melhor trecho de outro documento.
+    """
+    if not results or results[0]["coverage"] < 1.0:
+        return False
+    best = results[0]
+    runner_up = next((r for r in results[1:] if r.get("document_id") != best.get("document_id")), None)
+    return runner_up is None or best["score"] >= margin * runner_up["score"]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, any]]], k: int = 60) -> List[Dict[str, any]]:
+    """
+    Combina rankings pela soma de 1 / (k + posição). O trecho é identificado
+    por (document_id, chunk_index, topic) — documentos antigos não têm trechos;
+    o `score` passa a ser o valor do RRF.
+    """
+    fused: Dict[tuple, Dict[str, any]] = {}
+    scores: Dict[tuple, float] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, start=1):
+            key = (result.get("document_id"), result.get("chunk_index"), result.get("topic"))
+            fused.setdefault(key, result)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [
+        {**{f: v for f, v in fused[key].items() if f != "coverage"}, "score": round(scores[key], 6)}
+        for key in ordered
+    ]
+
+
+# ==================== INSTÂNCIA DO PROCESSO ====================
+
+_lexical_index: Optional[BM25Index] = None
+
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Índice carregado (None antes do primeiro carregamento ou com a busca híbrida desativada)."""
+    return _lexical_index if settings.RAG_HYBRID_ENABLED else None
+
+
+async def load_lexical_index(session_factory=None) -> Optional[BM25Index]:
+    """Constrói o índice a partir dos trechos gravados no banco."""
+    global _lexical_index
+    if not settings.RAG_HYBRID_ENABLED:
+        _lexical_index = None
+        return None
+    if session_factory is None:
+        from src.config.database import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    index = BM25Index()
+    async with session_factory() as session:
+        result = await session.execute(
+            select(KnowledgeBaseChunk, KnowledgeBaseItem.topic)
+            .join(KnowledgeBaseItem, KnowledgeBaseChunk.document_id == KnowledgeBaseItem.id)
+            .options(load_only(  # sem a coluna de embedding
+                KnowledgeBaseChunk.id, KnowledgeBaseChunk.document_id, KnowledgeBaseChunk.chunk_index,
+                KnowledgeBaseChunk.heading, KnowledgeBaseChunk.content
+            ))
+            .order_by(KnowledgeBaseChunk.id)
+        )
+        index.add([chunk_metadata(chunk, topic) for chunk, topic in result.all()])
+    _lexical_index = index
+    logger.info(f"✅ Índice lexical (BM25) carregado ({len(index)} trechos)")
+    return index
@@ -1,4 +1,4 @@
-from openai import AsyncAzureOpenAI
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
 import logging
 
@@ -10,11 +10,7 @@ class AzureOpenAIService:
             logger.warning("Azure OpenAI credentials not found. Service will fail if used.")
             self.client = None
         else:
-            self.client = AsyncAzureOpenAI(
-                api_key=settings.AZURE_OPENAI_KEY,
-                api_version=settings.AZURE_OPENAI_API_VERSION,
-                azure_endpoint=settings.AZURE_OPENAI_ENDPOINT
-            )
+            self.client = get_openai_client()
             self.deployment_name = settings.AZURE_OPENAI_DEPLOYMENT_GPT4O
 
     async def get_chat_response(self, messages: list, temperature: float = 0.7) -> str:
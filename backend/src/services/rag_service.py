@@ -1,13 +1,22 @@
+import asyncio
 import logging
-from typing import List, Dict
-from sqlalchemy import select
+import time
+from typing import AsyncIterable, Dict, Iterable, List, Tuple, Union
+from openai import RateLimitError
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from pgvector.sqlalchemy import Vector
-from openai import AsyncAzureOpenAI
 
 from src.config.database import AsyncSessionLocal
+from src.config.openai_client import get_openai_client
 from src.config.settings import settings
-from src.models.knowledge_base import KnowledgeBaseItem
+from src.services.embedding_cache import get_embedding_cache
+from src.services.lexical_index import get_lexical_index, is_confident, load_lexical_index, reciprocal_rank_fusion
+from src.services.vector_index import VectorIndexManager
+from src.services.vector_store import chunk_metadata, get_vector_store, load_vector_store, use_numpy_backend
+from src.models.knowledge_base import KnowledgeBaseChunk, KnowledgeBaseItem
+from src.utils.chunking import chunk_text
+from src.utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -15,75 +24,315 @@ class RAGService:
     
     @staticmethod
     def _get_client():
-        return AsyncAzureOpenAI(
-            api_key=settings.AZURE_OPENAI_KEY,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT
-        )
+        # Cliente compartilhado (pool de conexões com keep-alive)
+        client = get_openai_client()
+        if client is None:
+            raise ValueError("Azure OpenAI não configurado (AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_KEY)")
+        return client
 
     @staticmethod
     async def generate_embedding(text: str) -> List[float]:
         """
-        Gera embedding usando Azure OpenAI.
+        Gera embedding usando Azure OpenAI (consulta antes o cache de embeddings).
         """
+        deployment = settings.AZURE_OPENAI_DEPLOYMENT_EMBEDDING
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = (await cache.get_many(deployment, [text]))[0]
+            if cached is not None:
+                return cached
+
         client = RAGService._get_client()
         try:
             response = await client.embeddings.create(
                 input=text,
-                model=settings.AZURE_OPENAI_DEPLOYMENT_EMBEDDING
+                model=deployment
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
         except Exception as e:
             logger.error(f"Erro ao gerar embedding: {e}")
             raise
+        if cache is not None:
+            await cache.put_many(deployment, [text], [embedding])
+        return embedding
+
+    @staticmethod
+    async def generate_embeddings(texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para vários textos em uma única chamada (a API aceita listas).
+        """
+        if not texts:
+            return []
+        deployment = settings.AZURE_OPENAI_DEPLOYMENT_EMBEDDING
+        cache = get_embedding_cache()
+        results = await cache.get_many(deployment, texts) if cache is not None else [None] * len(texts)
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if not missing:
+            return results
+
+        client = RAGService._get_client()
+        try:
+            response = await client.embeddings.create(
+                input=[texts[i] for i in missing],
+                model=deployment
+            )
+            # A API devolve os itens com 'index'; garante a ordem da entrada
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except Exception as e:
+            logger.error(f"Erro ao gerar embeddings em lote: {e}")
+            raise
+        for i, embedding in zip(missing, embeddings):
+            results[i] = embedding
+        if cache is not None:
+            await cache.put_many(deployment, [texts[i] for i in missing], embeddings)
+        return results
+
+    @staticmethod
+    def _chunk_document(topic: str, content: str) -> Tuple[KnowledgeBaseItem, List[str]]:
+        """
+        Cria o documento com seus trechos (sem vetores) e os textos a embutir,
+        um por trecho.
+        """
+        item = KnowledgeBaseItem(topic=topic, content=content)
+        texts = []
+        for chunk in chunk_text(content, settings.KB_CHUNK_MAX_TOKENS, settings.KB_CHUNK_OVERLAP_TOKENS):
+            item.chunks.append(KnowledgeBaseChunk(
+                chunk_index=chunk.index,
+                start_offset=chunk.start,
+                end_offset=chunk.end,
+                heading=chunk.heading[:255] if chunk.heading else None,
+                content=chunk.content
+            ))
+            # Tópico e título da seção dão contexto ao vetor do trecho
+            prefix = f"{topic} - {chunk.heading}" if chunk.heading else topic
+            texts.append(f"{prefix}: {chunk.content}")
+        return item, texts
+
+    @staticmethod
+    def _index_in_memory(items: List[KnowledgeBaseItem]):
+        """Atualiza os índices em memória (BM25 e backend numpy) com os trechos já gravados."""
+        chunks = [(chunk, item.topic) for item in items for chunk in item.chunks if chunk.embedding is not None]
+        if not chunks:
+            return
+        metadata = [chunk_metadata(chunk, topic) for chunk, topic in chunks]
+        index = get_lexical_index()
+        if index is not None:
+            index.add(metadata)
+        store = get_vector_store()
+        if store is not None:
+            store.add([chunk.embedding for chunk, _ in chunks], metadata)
 
     @staticmethod
     async def add_document(topic: str, content: str) -> Dict[str, any]:
         """
-        Adiciona um documento à base de conhecimento.
+        Adiciona um documento à base de conhecimento (dividido em trechos).
         """
         try:
-            # Gera embedding do conteúdo (ou tópico + conteúdo)
-            text_to_embed = f"{topic}: {content}"
-            embedding = await RAGService.generate_embedding(text_to_embed)
+            item, texts = RAGService._chunk_document(topic, content)
+            embeddings = await RAGService.generate_embeddings(texts)
+            for chunk, embedding in zip(item.chunks, embeddings):
+                chunk.embedding = embedding
             
             async with AsyncSessionLocal() as session:
-                item = KnowledgeBaseItem(
-                    topic=topic,
-                    content=content,
-                    embedding=embedding
-                )
                 session.add(item)
                 await session.commit()
-                return {"success": True, "id": item.id, "topic": topic}
+            RAGService._index_in_memory([item])
+            return {"success": True, "id": item.id, "topic": topic, "chunks": len(item.chunks)}
         except Exception as e:
             logger.error(f"Erro ao adicionar documento: {e}")
             return {"error": str(e)}
 
     @staticmethod
-    async def search(query: str, limit: int = 3) -> List[Dict[str, str]]:
+    async def _embed_with_retry(texts: List[str], max_retries: int, stats: Dict[str, int]) -> List[List[float]]:
         """
-        Busca documentos relevantes usando similaridade de cosseno.
+        Embeddings em lote com backoff exponencial em 429 (respeita Retry-After).
         """
+        for attempt in range(max_retries + 1):
+            try:
+                return await RAGService.generate_embeddings(texts)
+            except RateLimitError as e:
+                if attempt == max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    delay = min(2 ** attempt, 60)
+                stats["retries"] += 1
+                logger.warning(f"⏳ Rate limit no embedding (tentativa {attempt + 1}), aguardando {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _ingest_batch(batch: List[Tuple[str, str]], max_retries: int, stats: Dict[str, int]):
         try:
-            query_embedding = await RAGService.generate_embedding(query)
+            items, texts = [], []
+            for topic, content in batch:
+                item, chunk_texts = RAGService._chunk_document(topic, content)
+                items.append(item)
+                texts.extend(chunk_texts)
+            
+            # Uma chamada de embeddings para todos os trechos do lote
+            embeddings = iter(await RAGService._embed_with_retry(texts, max_retries, stats))
+            for item in items:
+                for chunk in item.chunks:
+                    chunk.embedding = next(embeddings)
             
+            # Uma transação por lote
             async with AsyncSessionLocal() as session:
-                # Busca usando o operador de distância L2 (<->) ou similaridade de cosseno (<=>)
-                # pgvector recomenda <=> para cosseno (quanto menor, mais similar se normalizado, mas aqui é distância de cosseno)
-                # Na verdade, para cosine similarity, usamos <=> e ordenamos.
-                
-                result = await session.execute(
-                    select(KnowledgeBaseItem)
-                    .order_by(KnowledgeBaseItem.embedding.cosine_distance(query_embedding))
-                    .limit(limit)
-                )
-                items = result.scalars().all()
-                
+                session.add_all(items)
+                await session.commit()
+            RAGService._index_in_memory(items)
+            stats["documents"] += len(batch)
+            stats["chunks"] += len(texts)
+            stats["batches"] += 1
+        except Exception as e:
+            logger.error(f"Erro ao ingerir lote de {len(batch)} documentos: {e}")
+            stats["failed"] += len(batch)
+
+    @staticmethod
+    async def ingest_documents(
+        documents: Union[Iterable[Tuple[str, str]], AsyncIterable[Tuple[str, str]]],
+        batch_size: int = None,
+        concurrency: int = None,
+        max_retries: int = None,
+        max_batch_tokens: int = None
+    ) -> Dict[str, any]:
+        """
+        Ingestão em lote da base de conhecimento.
+
+        Consome `documents` (pares topic, content) como stream, agrupa em lotes
+        (por quantidade e por tokens), gera os embeddings de cada lote em uma
+        chamada e insere os itens em uma transação por lote, com até
+        `concurrency` lotes em paralelo.
+        """
+        batch_size = batch_size or settings.KB_INGEST_BATCH_SIZE
+        concurrency = concurrency or settings.KB_INGEST_CONCURRENCY
+        max_retries = settings.KB_INGEST_MAX_RETRIES if max_retries is None else max_retries
+        max_batch_tokens = max_batch_tokens or settings.KB_INGEST_MAX_BATCH_TOKENS
+
+        stats = {"documents": 0, "chunks": 0, "batches": 0, "failed": 0, "retries": 0}
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+        start = time.perf_counter()
+
+        async def run(batch):
+            try:
+                await RAGService._ingest_batch(batch, max_retries, stats)
+            finally:
+                semaphore.release()
+
+        async def submit(batch):
+            # Backpressure: não lê mais documentos enquanto houver `concurrency` lotes em voo
+            await semaphore.acquire()
+            task = asyncio.create_task(run(batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        async def iterate():
+            if hasattr(documents, "__aiter__"):
+                async for document in documents:
+                    yield document
+            else:
+                for document in documents:
+                    yield document
+
+        batch, batch_tokens = [], 0
+        async for topic, content in iterate():
+            tokens = count_tokens(f"{topic}: {content}")
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+                await submit(batch)
+                batch, batch_tokens = [], 0
+            batch.append((topic, content))
+            batch_tokens += tokens
+        if batch:
+            await submit(batch)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+        elapsed = time.perf_counter() - start
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["docs_per_second"] = round(stats["documents"] / elapsed, 2) if elapsed else 0.0
+        logger.info(f"📚 Ingestão concluída: {stats}")
+        return stats
+
+    @staticmethod
+    async def _vector_search(query_embedding: List[float], limit: int) -> List[Dict[str, str]]:
+        """Trechos mais próximos do embedding (similaridade de cosseno)."""
+        # Backend em memória (sem pgvector): busca sem ida ao banco
+        if use_numpy_backend():
+            # Índice vazio é falsy (__len__): testar None para não recarregar
+            store = get_vector_store()
+            if store is None:
+                store = await load_vector_store()
+            return store.search(query_embedding, limit)
+        
+        async with AsyncSessionLocal() as session:
+            # Parâmetros do índice ANN valem só para esta transação
+            if session.get_bind().dialect.name == "postgresql":
+                for statement in VectorIndexManager.query_settings():
+                    await session.execute(text(statement))
+            
+            # <=> (cosine_distance) do pgvector: quanto menor, mais similar
+            result = await session.execute(
+                select(KnowledgeBaseChunk, KnowledgeBaseItem.topic)
+                .join(KnowledgeBaseItem, KnowledgeBaseChunk.document_id == KnowledgeBaseItem.id)
+                .filter(KnowledgeBaseChunk.embedding.isnot(None))
+                .order_by(KnowledgeBaseChunk.embedding.cosine_distance(query_embedding))
+                .limit(limit)
+            )
+            rows = result.all()
+            if rows:
                 return [
-                    {"topic": item.topic, "content": item.content}
-                    for item in items
+                    {
+                        "topic": topic,
+                        "section": chunk.heading,
+                        "content": chunk.content,
+                        "document_id": chunk.document_id,
+                        "chunk_index": chunk.chunk_index,
+                    }
+                    for chunk, topic in rows
                 ]
+            
+            # Documentos antigos (ingeridos inteiros, sem trechos)
+            result = await session.execute(
+                select(KnowledgeBaseItem)
+                .filter(KnowledgeBaseItem.embedding.isnot(None))
+                .order_by(KnowledgeBaseItem.embedding.cosine_distance(query_embedding))
+                .limit(limit)
+            )
+            return [
+                {"topic": item.topic, "content": item.content}
+                for item in result.scalars().all()
+            ]
+
+    @staticmethod
+    async def search(query: str, limit: int = 3) -> List[Dict[str, str]]:
+        """
+        Busca os trechos mais relevantes: BM25 + similaridade de cosseno
+        combinados por RRF. Se o resultado lexical for inequívoco, responde sem
+        gerar o embedding da consulta.
+        """
+        try:
+            lexical_results = []
+            if settings.RAG_HYBRID_ENABLED:
+                index = get_lexical_index()
+                if index is None:
+                    index = await load_lexical_index()
+                lexical_results = index.search(query, max(limit, settings.RAG_HYBRID_CANDIDATES))
+                if settings.RAG_LEXICAL_ONLY_ENABLED and is_confident(lexical_results, settings.RAG_LEXICAL_CONFIDENCE_MARGIN):
+                    return [
+                        {k: v for k, v in result.items() if k != "coverage"}
+                        for result in lexical_results[:limit]
+                    ]
+            
+            query_embedding = await RAGService.generate_embedding(query)
+            if not lexical_results:
+                return await RAGService._vector_search(query_embedding, limit)
+            
+            vector_results = await RAGService._vector_search(
+                query_embedding, max(limit, settings.RAG_HYBRID_CANDIDATES)
+            )
+            return reciprocal_rank_fusion([lexical_results, vector_results], k=settings.RAG_RRF_K)[:limit]
         except Exception as e:
             logger.error(f"Erro na busca RAG: {e}")
             return []
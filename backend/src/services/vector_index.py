@@ -0,0 +1,137 @@
+"""
+Ciclo de vida dos índices ANN (pgvector) da base de conhecimento.
+
+- `ensure_indexes`: chamado no init_db, cria os índices HNSW/IVFFlat que
+  faltam e avisa quando um índice existente difere da configuração;
+- `rebuild`: recria os índices (CREATE INDEX CONCURRENTLY, sem bloquear
+  escrita) — ver scripts/rebuild_vector_index.py;
+- `query_settings`: parâmetros por consulta (hnsw.ef_search / ivfflat.probes).
+
+Sem pgvector (ou fora do Postgres) nada é criado: as colunas de embedding
+ficam em JSONB (EmbeddingVector) e a busca usa o índice em memória
+(src/services/vector_store.py).
+"""
+import logging
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (tabela, coluna, nome do índice)
+VECTOR_INDEXES = [
+    ("knowledge_base_chunks", "embedding", "idx_knowledge_base_chunks_embedding"),
+    ("knowledge_base_items", "embedding", "idx_knowledge_base_items_embedding"),
+]
+
+INDEX_TYPES = ("hnsw", "ivfflat", "none")
+
+_WITH_RE = re.compile(r"WITH \((.*)\)")
+
+
+class VectorIndexManager:
+
+    @staticmethod
+    def index_options(index_type: Optional[str] = None) -> Dict[str, int]:
+        index_type = index_type or settings.VECTOR_INDEX_TYPE
+        if index_type == "hnsw":
+            return {"m": settings.VECTOR_INDEX_HNSW_M, "ef_construction": settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION}
+        if index_type == "ivfflat":
+            return {"lists": settings.VECTOR_INDEX_IVFFLAT_LISTS}
+        return {}
+
+    @staticmethod
+    def index_ddl(table: str, column: str, name: str, index_type: Optional[str] = None, concurrently: bool = False) -> str:
+        """CREATE INDEX para o tipo configurado (distância de cosseno)."""
+        index_type = index_type or settings.VECTOR_INDEX_TYPE
+        if index_type not in INDEX_TYPES or index_type == "none":
+            raise ValueError(f"Tipo de índice vetorial inválido: {index_type}")
+        options = ", ".join(f"{k} = {int(v)}" for k, v in VectorIndexManager.index_options(index_type).items())
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+            f"ON {table} USING {index_type} ({column} vector_cosine_ops) WITH ({options})"
+        )
+
+    @staticmethod
+    def query_settings(index_type: Optional[str] = None) -> List[str]:
+        """SET LOCAL a executar na transação da busca (recall x latência)."""
+        index_type = index_type or settings.VECTOR_INDEX_TYPE
+        if index_type == "hnsw":
+            return [f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_INDEX_HNSW_EF_SEARCH)}"]
+        if index_type == "ivfflat":
+            return [f"SET LOCAL ivfflat.probes = {int(settings.VECTOR_INDEX_IVFFLAT_PROBES)}"]
+        return []
+
+    @staticmethod
+    def _matches(indexdef: str, index_type: str) -> bool:
+        if f"USING {index_type} " not in indexdef:
+            return False
+        match = _WITH_RE.search(indexdef)
+        current = {}
+        if match:
+            for option in match.group(1).split(","):
+                key, _, value = option.partition("=")
+                current[key.strip()] = value.strip().strip("'")
+        expected = {k: str(v) for k, v in VectorIndexManager.index_options(index_type).items()}
+        return all(current.get(k) == v for k, v in expected.items())
+
+    @staticmethod
+    async def status(conn) -> List[Dict[str, any]]:
+        """Índices vetoriais existentes e se batem com a configuração atual."""
+        result = await conn.execute(
+            text("SELECT indexname, indexdef FROM pg_indexes WHERE indexname = ANY(:names)"),
+            {"names": [name for _, _, name in VECTOR_INDEXES]}
+        )
+        existing = dict(result.all())
+        return [
+            {
+                "table": table,
+                "index": name,
+                "exists": name in existing,
+                "up_to_date": name in existing and VectorIndexManager._matches(existing[name], settings.VECTOR_INDEX_TYPE),
+                "definition": existing.get(name),
+            }
+            for table, _, name in VECTOR_INDEXES
+        ]
+
+    @staticmethod
+    async def ensure_indexes(conn):
+        """
+        Cria os índices vetoriais ausentes (usar no startup, após create_all).
+        Índices com parâmetros diferentes da configuração não são recriados
+        automaticamente (custo alto): apenas um aviso é registrado.
+        """
+        if conn.dialect.name != "postgresql" or settings.VECTOR_INDEX_TYPE == "none":
+            return
+        for item in await VectorIndexManager.status(conn):
+            if not item["exists"]:
+                table, column, name = next(i for i in VECTOR_INDEXES if i[2] == item["index"])
+                await conn.execute(text(VectorIndexManager.index_ddl(table, column, name)))
+                logger.info(f"✅ Índice vetorial {name} criado ({settings.VECTOR_INDEX_TYPE})")
+            elif not item["up_to_date"]:
+                logger.warning(
+                    f"⚠️ Índice {item['index']} difere da configuração ({settings.VECTOR_INDEX_TYPE} "
+                    f"{VectorIndexManager.index_options()}). Execute scripts/rebuild_vector_index.py."
+                )
+
+    @staticmethod
+    async def rebuild(engine, tables: Optional[List[str]] = None, concurrently: bool = True):
+        """
+        Recria os índices vetoriais com a configuração atual.
+        CONCURRENTLY não pode rodar dentro de transação: usa AUTOCOMMIT.
+        """
+        if engine.dialect.name != "postgresql":
+            raise RuntimeError("Índices vetoriais só são suportados no PostgreSQL (pgvector)")
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for table, column, name in VECTOR_INDEXES:
+                if tables and table not in tables:
+                    continue
+                await conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}"))
+                if settings.VECTOR_INDEX_TYPE != "none":
+                    await conn.execute(text(VectorIndexManager.index_ddl(table, column, name, concurrently=concurrently)))
+                logger.info(f"🔁 Índice vetorial {name} recriado ({settings.VECTOR_INDEX_TYPE})")
@@ -0,0 +1,215 @@
+"""
+Índice vetorial em memória (NumPy) para a base de conhecimento.
+
+Backend alternativo ao pgvector para o RAGService (VECTOR_STORE_BACKEND):
+os vetores dos trechos ficam normalizados numa matriz float32 e a busca é um
+produto escalar vetorizado com top-k via argpartition, sem ida ao banco.
+
+- carregado no startup a partir do banco ou de um snapshot `.npy`
+  (memory-mapped) + metadados `.json` ao lado (VECTOR_STORE_SNAPSHOT_PATH);
+- atualizado incrementalmente quando documentos são adicionados.
+
+Cada processo mantém a sua cópia: documentos adicionados por outra instância
+aparecem após o próximo carregamento.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+
+from src.config.settings import settings
+from src.models.knowledge_base import KnowledgeBaseChunk, KnowledgeBaseItem
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "pgvector", "numpy")
+
+# Campos devolvidos pela busca (mesmo formato do caminho pgvector)
+_METADATA_FIELDS = ("topic", "section", "content", "document_id", "chunk_index")
+
+
+class NumpyVectorStore:
+    """
+    Matriz (n, dim) float32 de vetores normalizados com capacidade crescente.
+    """
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._metadata: List[Dict[str, any]] = []
+        self._chunk_ids: set = set()
+        self.dirty = False  # há vetores fora do snapshot
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+        # Crescimento geométrico (e cópia do snapshot mmap, que é somente leitura)
+        capacity = max(needed, 2 * self._matrix.shape[0], 64)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def add(self, embeddings, metadata: List[Dict[str, any]]):
+        """Adiciona vetores (ignora trechos já presentes, pelo `id`)."""
+        rows = [i for i, meta in enumerate(metadata) if meta.get("id") not in self._chunk_ids]
+        if not rows:
+            return
+        vectors = self._normalize(np.asarray([embeddings[i] for i in rows], dtype=np.float32).reshape(len(rows), self.dim))
+        self._reserve(len(rows))
+        self._matrix[self._size:self._size + len(rows)] = vectors
+        self._size += len(rows)
+        for i in rows:
+            self._metadata.append(metadata[i])
+            self._chunk_ids.add(metadata[i].get("id"))
+        self.dirty = True
+
+    def search(self, query_embedding, limit: int = 3) -> List[Dict[str, any]]:
+        """Top-k por similaridade de cosseno."""
+        if not self._size:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self._matrix[:self._size] @ (query / norm if norm else query)
+
+        k = min(limit, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**{f: self._metadata[i].get(f) for f in _METADATA_FIELDS}, "score": round(float(scores[i]), 4)}
+            for i in top
+        ]
+
+    # ==================== SNAPSHOT ====================
+
+    def save(self, path: str):
+        # Grava em arquivo temporário e troca: o snapshot anterior pode estar mapeado (mmap)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        metadata_path = f"{os.path.splitext(path)[0]}.json"
+        with open(f"{path}.tmp", "wb") as f:
+            np.save(f, self._matrix[:self._size])
+        with open(f"{metadata_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._metadata, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+        self.dirty = False
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> Optional["NumpyVectorStore"]:
+        metadata_path = f"{os.path.splitext(path)[0]}.json"
+        if not os.path.exists(path) or not os.path.exists(metadata_path):
+            return None
+        matrix = np.load(path, mmap_mode="r")
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if matrix.shape[0] != len(metadata):
+            logger.warning(f"⚠️ Snapshot vetorial inconsistente ({path}), ignorando")
+            return None
+        store = cls(dim=matrix.shape[1])
+        store._matrix = matrix
+        store._size = matrix.shape[0]
+        store._metadata = metadata
+        store._chunk_ids = {meta.get("id") for meta in metadata}
+        store.dirty = False
+        return store
+
+    # ==================== BANCO ====================
+
+    @classmethod
+    async def load_from_db(cls, session_factory, dim: int = 1536) -> "NumpyVectorStore":
+        store = cls(dim=dim)
+        async with session_factory() as session:
+            result = await session.execute(
+                select(KnowledgeBaseChunk, KnowledgeBaseItem.topic)
+                .join(KnowledgeBaseItem, KnowledgeBaseChunk.document_id == KnowledgeBaseItem.id)
+                .filter(KnowledgeBaseChunk.embedding.isnot(None))
+                .order_by(KnowledgeBaseChunk.id)
+            )
+            rows = result.all()
+        if rows:
+            store.add(
+                [chunk.embedding for chunk, _ in rows],
+                [chunk_metadata(chunk, topic) for chunk, topic in rows]
+            )
+        return store
+
+
+def chunk_metadata(chunk: KnowledgeBaseChunk, topic: str) -> Dict[str, any]:
+    return {
+        "id": chunk.id,
+        "topic": topic,
+        "section": chunk.heading,
+        "content": chunk.content,
+        "document_id": chunk.document_id,
+        "chunk_index": chunk.chunk_index,
+    }
+
+
+# ==================== INSTÂNCIA DO PROCESSO ====================
+
+_vector_store: Optional[NumpyVectorStore] = None
+
+
+def use_numpy_backend() -> bool:
+    """numpy explícito, ou auto quando o banco não oferece pgvector (SQLite, Azure sem extensão)."""
+    from src.config import database
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "auto":
+        return database.engine.dialect.name != "postgresql" or database.pgvector_available is False
+    return backend == "numpy"
+
+
+def get_vector_store() -> Optional[NumpyVectorStore]:
+    """Índice em memória carregado (None quando o backend é pgvector)."""
+    return _vector_store if use_numpy_backend() else None
+
+
+async def load_vector_store(session_factory=None) -> Optional[NumpyVectorStore]:
+    """
+    Carrega o índice no startup: usa o snapshot se estiver em dia com o banco
+    (mesma quantidade de trechos), senão lê do banco e grava um novo snapshot.
+    """
+    global _vector_store
+    if not use_numpy_backend():
+        _vector_store = None
+        return None
+    if session_factory is None:
+        from src.config.database import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    path = settings.VECTOR_STORE_SNAPSHOT_PATH
+    store = NumpyVectorStore.load_snapshot(path) if path else None
+    if store is not None:
+        async with session_factory() as session:
+            total = (await session.execute(
+                select(func.count(KnowledgeBaseChunk.id)).filter(KnowledgeBaseChunk.embedding.isnot(None))
+            )).scalar()
+        if total != len(store):
+            store = None
+
+    if store is None:
+        store = await NumpyVectorStore.load_from_db(session_factory)
+        if path:
+            store.save(path)
+    _vector_store = store
+    logger.info(f"✅ Índice vetorial em memória carregado ({len(store)} trechos)")
+    return store
+
+
+def save_vector_store():
+    """Grava o snapshot no shutdown (inclui os trechos adicionados em execução)."""
+    if _vector_store is not None and _vector_store.dirty and settings.VECTOR_STORE_SNAPSHOT_PATH:
+        _vector_store.save(settings.VECTOR_STORE_SNAPSHOT_PATH)
@@ -0,0 +1,101 @@
+"""
+Divisão de documentos da base de conhecimento em trechos (chunks).
+
+O texto é separado em seções por títulos e, dentro de cada seção, em
+parágrafos/linhas/frases. As partes são agrupadas em janelas de até
+`max_tokens`, e cada janela repete o final da anterior (`overlap_tokens`)
+para não perder contexto na fronteira. Os trechos guardam os offsets
+(caracteres) no documento original.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from src.utils.tokens import count_tokens
+
+# Títulos: markdown (# Título), linhas em caixa alta ou linhas curtas terminadas em ":"
+_HEADING_RE = re.compile(r"^(#{1,6}\s+\S.*|[A-ZÀ-Ý0-9][A-ZÀ-Ý0-9 \-/]{2,79}|[^\s\-*\d].{0,78}:)\s*$")
+
+# Separadores tentados em ordem quando uma parte excede o tamanho da janela
+_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+@dataclass
+class Chunk:
+    index: int
+    start: int
+    end: int
+    content: str
+    heading: Optional[str] = None
+
+
+def _sections(text: str) -> List[Tuple[int, int, Optional[str]]]:
+    """Spans (início, fim, título) das seções do documento."""
+    sections = []
+    start, heading = 0, None
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped and _HEADING_RE.match(stripped):
+            if offset > start:
+                sections.append((start, offset, heading))
+                start = offset
+            heading = stripped.lstrip("#").strip().rstrip(":")
+        offset += len(line)
+    if offset > start:
+        sections.append((start, offset, heading))
+    return sections
+
+
+def _split(text: str, start: int, end: int, max_tokens: int, separators=_SEPARATORS) -> List[Tuple[int, int]]:
+    """Quebra o span em partes de até max_tokens, nos separadores mais "fortes" possíveis."""
+    if count_tokens(text[start:end]) <= max_tokens or not separators:
+        return [(start, end)] if text[start:end].strip() else []
+
+    separator, rest = separators[0], separators[1:]
+    pieces, piece_start = [], start
+    while piece_start < end:
+        position = text.find(separator, piece_start, end)
+        piece_end = end if position == -1 else position + len(separator)
+        pieces.append((piece_start, piece_end))
+        piece_start = piece_end
+    if len(pieces) == 1:
+        return _split(text, start, end, max_tokens, rest)
+
+    spans = []
+    for piece_start, piece_end in pieces:
+        spans.extend(_split(text, piece_start, piece_end, max_tokens, rest))
+    return spans
+
+
+def chunk_text(text: str, max_tokens: int = 300, overlap_tokens: int = 50) -> List[Chunk]:
+    """
+    Divide `text` em trechos de até ~max_tokens tokens com sobreposição.
+    Trechos nunca atravessam a fronteira entre seções.
+    """
+    chunks: List[Chunk] = []
+
+    def emit(units, heading):
+        start, end = units[0][0], units[-1][1]
+        content = text[start:end].strip()
+        if content:
+            # Ajusta os offsets para o conteúdo sem espaços nas pontas
+            start += len(text[start:end]) - len(text[start:end].lstrip())
+            chunks.append(Chunk(len(chunks), start, start + len(content), content, heading))
+
+    for section_start, section_end, heading in _sections(text):
+        current: List[Tuple[int, int]] = []
+        for span_start, span_end in _split(text, section_start, section_end, max_tokens):
+            if current and count_tokens(text[current[0][0]:span_end]) > max_tokens:
+                emit(current, heading)
+                # Sobreposição: a próxima janela começa com o final desta
+                while current and (
+                    count_tokens(text[current[0][0]:current[-1][1]]) > overlap_tokens
+                    or count_tokens(text[current[0][0]:span_end]) > max_tokens
+                ):
+                    current.pop(0)
+            current.append((span_start, span_end))
+        if current:
+            emit(current, heading)
+
+    return chunks
@@ -0,0 +1,47 @@
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Encoding used by gpt-4o / gpt-4o-mini
+ENCODING_NAME = "o200k_base"
+
+_encoding = None
+_encoding_unavailable = False
+
+
+def _get_encoding():
+    """
+    Carrega o encoding do tiktoken uma única vez.
+    O tiktoken baixa o arquivo BPE no primeiro uso; se não houver acesso
+    (ex: container sem internet), usa a estimativa por caracteres.
+    """
+    global _encoding, _encoding_unavailable
+    if _encoding is None and not _encoding_unavailable:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception as e:
+            logger.warning(f"⚠️ tiktoken indisponível ({e}). Usando estimativa de tokens por caracteres.")
+            _encoding_unavailable = True
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Conta (ou estima, ~4 caracteres por token) os tokens de um texto."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: Optional[str], max_tokens: int, suffix: str = " [...]") -> str:
+    """Corta o texto para caber em `max_tokens` (mantém o início e marca o corte)."""
+    if not text or count_tokens(text) <= max_tokens:
+        return text or ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4] + suffix
+    return encoding.decode(encoding.encode(text)[:max_tokens]) + suffix
@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.config import database
+from src.config.database import TimedQueuePool, engine_options
+
+
+def test_engine_options_per_pool_mode():
+    queue = engine_options("queue")
+    assert queue["poolclass"] is TimedQueuePool
+    assert queue["pool_size"] == database.settings.DB_POOL_SIZE
+    assert queue["pool_pre_ping"] is database.settings.DB_POOL_PRE_PING
+    assert "statement_cache_size" not in queue["connect_args"]
+
+    # PgBouncer (transaction mode): no prepared statement caches, unique names
+    pgbouncer = engine_options("pgbouncer")
+    assert pgbouncer["poolclass"] is TimedQueuePool
+    assert pgbouncer["connect_args"]["statement_cache_size"] == 0
+    assert pgbouncer["connect_args"]["prepared_statement_cache_size"] == 0
+    name_func = pgbouncer["connect_args"]["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+    assert engine_options("null")["poolclass"] is NullPool
+    with pytest.raises(ValueError):
+        engine_options("bogus")
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_report_usage_and_wait(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=5
+    )
+    try:
+        with patch.object(database, "engine", engine):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                stats = database.pool_stats()
+                assert stats["pool"] == "TimedQueuePool"
+                assert stats["in_use"] == 1 and stats["overflow"] == 0
+
+                # Second checkout waits until the first connection is returned
+                async def second():
+                    async with engine.connect() as other:
+                        await other.execute(text("SELECT 1"))
+
+                task = asyncio.create_task(second())
+                await asyncio.sleep(0.05)
+            await task
+
+            stats = database.pool_stats()
+            assert stats["in_use"] == 0 and stats["idle"] == 1
+            assert stats["checkouts"] == 2 and stats["timeouts"] == 0
+            # Waited for the first connection (sleep timing is loose on busy machines)
+            assert stats["max_wait_ms"] >= 10
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_timeouts_apart_from_connect_errors(tmp_path):
+    from sqlalchemy import exc
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    # Database that cannot be opened: a connection error, not pool exhaustion
+    broken = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'pool.db'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=0
+    )
+    try:
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        with pytest.raises(exc.OperationalError):
+            async with broken.connect():
+                pass
+
+        assert (engine.pool.timeouts, engine.pool.connect_errors) == (1, 0)
+        assert (broken.pool.timeouts, broken.pool.connect_errors) == (0, 1)
+    finally:
+        await engine.dispose()
+        await broken.dispose()
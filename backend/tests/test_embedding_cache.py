@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import database
+from src.services.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def session_factory(db_session):
+    # database.engine aponta para o SQLite de teste (ver conftest)
+    return async_sessionmaker(bind=database.engine, expire_on_commit=False)
+
+@pytest.mark.asyncio
+async def test_embedding_cache_memory_and_durable_tiers(session_factory):
+    cache = EmbeddingCache(session_factory=session_factory)
+    await cache.put_many("emb", ["internet lenta"], [[0.25, 0.5, 1.0]])
+
+    assert await cache.get_many("emb", ["internet lenta", "sem sinal"]) == [[0.25, 0.5, 1.0], None]
+    await cache.flush()  # gravação no banco em segundo plano
+    # Outro processo (sem memória) encontra o embedding no banco
+    fresh = EmbeddingCache(session_factory=session_factory)
+    assert await fresh.get_many("emb", ["internet lenta"]) == [[0.25, 0.5, 1.0]]
+    # Deployment faz parte da chave
+    assert await fresh.get_many("outro-modelo", ["internet lenta"]) == [None]
+
+    assert cache.stats()["memory_hits"] == 1
+    assert fresh.stats()["durable_hits"] == 1
+    assert fresh.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_embedding_cache_concurrent_writes_of_the_same_key(session_factory):
+    # Outra instância já gravou "internet lenta": o lote não falha por causa dela
+    other = EmbeddingCache(session_factory=session_factory)
+    await other.put_many("emb", ["internet lenta"], [[0.25, 0.5, 1.0]], wait=True)
+
+    cache = EmbeddingCache(session_factory=session_factory)
+    await cache.put_many("emb", ["internet lenta", "boleto"], [[0.25, 0.5, 1.0], [1.0, 0.0, 0.0]])
+    await cache.flush()
+
+    fresh = EmbeddingCache(session_factory=session_factory)
+    assert await fresh.get_many("emb", ["internet lenta", "boleto"]) == [[0.25, 0.5, 1.0], [1.0, 0.0, 0.0]]
+
+@pytest.mark.asyncio
+async def test_generate_embedding_uses_cache():
+    from src.services.rag_service import RAGService
+
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(return_value=SimpleNamespace(
+        data=[SimpleNamespace(index=0, embedding=[0.1, 0.2])]
+    ))
+    cache = EmbeddingCache(persist=False)
+
+    with patch("src.services.rag_service.get_embedding_cache", return_value=cache), \
+         patch.object(RAGService, "_get_client", return_value=client):
+        first = await RAGService.generate_embedding("internet lenta")
+        second = await RAGService.generate_embedding("internet lenta")
+        batch = await RAGService.generate_embeddings(["internet lenta", "boleto"])
+
+    assert first == second == [0.1, 0.2]
+    assert batch[0] == [0.1, 0.2]
+    assert client.embeddings.create.await_count == 2
+    # O lote só envia os textos ausentes do cache
+    assert client.embeddings.create.await_args.kwargs["input"] == ["boleto"]
@@ -201,6 +201,7 @@ class TestMetricas:
         assert response.status_code == 200
         assert "total_chamados" in response.json()
         assert "taxa_resolucao_automatica" in response.json()
+        assert "data_atualizacao" in response.json()
 
     def test_metricas_por_canal(self, auth_token):
         headers = {"Authorization": f"Bearer {auth_token}"}
@@ -213,3 +214,16 @@ class TestMetricas:
         response = client.get("/api/metricas/por-status", headers=headers)
         assert response.status_code == 200
         assert isinstance(response.json(), dict)
+
+    def test_metricas_agrupadas(self, auth_token):
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        response = client.get(
+            "/api/metricas/agrupadas?dimensoes=canal&dimensoes=prioridade&data_inicio=2024-01-01",
+            headers=headers,
+        )
+        assert response.status_code == 200
+        assert response.json()["dimensoes"] == ["canal", "prioridade"]
+        assert isinstance(response.json()["grupos"], list)
+
+        response = client.get("/api/metricas/agrupadas?dimensoes=mensagem", headers=headers)
+        assert response.status_code == 400
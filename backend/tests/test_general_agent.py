@@ -1,6 +1,8 @@
-import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
 import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
 from src.agents.general_agent import GeneralAgent, GeneralPlugin
 from src.services.general_service import GeneralService
 
@@ -68,3 +70,77 @@ async def test_process_message(mock_kernel, mock_azure_chat_completion):
         
         chat_service = agent.kernel.get_service.return_value
         chat_service.get_chat_message_content.assert_called_once()
+
+# ================== ANSWER CACHE TESTS ==================
+
+def test_answer_cache_similarity_and_faq_invalidation():
+    from src.agents.answer_cache import SemanticAnswerCache
+
+    cache = SemanticAnswerCache(similarity_threshold=0.9, ttl_seconds=60)
+    cache.set([1.0, 0.0, 0.0], "Atendemos 24h")
+
+    assert cache.get([0.99, 0.05, 0.0])[0] == "Atendemos 24h"
+    assert cache.get([0.0, 1.0, 0.0]) is None
+
+    with patch.dict(GeneralService.FAQ, {"horario": "Atendemos das 8h às 18h."}):
+        assert cache.get([1.0, 0.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+@pytest.mark.asyncio
+async def test_answer_cache_sees_plan_changes_from_other_writers(db_session):
+    from sqlalchemy import insert, update
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from src.agents.answer_cache import SemanticAnswerCache
+    from src.config import database
+    from src.models.plano import Plano
+
+    session_factory = async_sessionmaker(bind=database.engine, expire_on_commit=False)
+    async with session_factory() as session:
+        await session.execute(insert(Plano).values(plano_id=1, nome="Fibra 500", preco=99.9, tipo="internet"))
+        await session.commit()
+
+    cache = SemanticAnswerCache(similarity_threshold=0.9, catalog_check_seconds=0, session_factory=session_factory)
+    await cache.refresh_catalog()
+    cache.set([1.0, 0.0, 0.0], "O Fibra 500 custa R$ 99,90")
+    await cache.refresh_catalog()
+    assert cache.get([1.0, 0.0, 0.0])[0] == "O Fibra 500 custa R$ 99,90"
+
+    # Core UPDATE (no ORM events), as another worker or a migration would do
+    async with session_factory() as session:
+        await session.execute(update(Plano).where(Plano.plano_id == 1).values(preco=109.9))
+        await session.commit()
+    await cache.refresh_catalog()
+    assert cache.get([1.0, 0.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_answer_cache_skips_customer_specific_turns():
+    from src.agents.answer_cache import is_cacheable
+
+    assert is_cacheable("Qual o horário de atendimento?", {"chat_history": [{"role": "user", "content": "oi"}]})
+    assert not is_cacheable("Qual o horário?", {"client_id": 1, "is_authenticated": True})
+    assert not is_cacheable("Meu email é joao@teste.com", {})
+    assert not is_cacheable("Meu CPF é 123.456.789-00", {})
+    assert not is_cacheable("E o segundo?", {"chat_history": [{"role": "assistant", "content": "...", "agent": "general_agent"}]})
+
+@pytest.mark.asyncio
+async def test_process_message_served_from_answer_cache(mock_kernel, mock_azure_chat_completion):
+    from src.agents.answer_cache import SemanticAnswerCache
+
+    with patch("src.agents.general_agent.settings") as mock_settings, \
+         patch("src.agents.general_agent.RAGService.generate_embedding", new_callable=AsyncMock) as mock_embedding:
+        mock_settings.AZURE_OPENAI_KEY = "dummy"
+        mock_settings.AZURE_OPENAI_ENDPOINT = "dummy"
+        mock_embedding.return_value = [0.1, 0.2, 0.3]
+        
+        agent = GeneralAgent()
+        agent.answer_cache = SemanticAnswerCache()
+        
+        first = await agent.process_message("Qual o horario?")
+        second = await agent.process_message("qual o horário de vocês?")
+        
+        assert first == second == "Nosso horario é 24h"
+        assert not getattr(first, "cached", False)
+        assert second.cached is True
+        chat_service = agent.kernel.get_service.return_value
+        chat_service.get_chat_message_content.assert_called_once()
@@ -0,0 +1,162 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import database
+from src.models.chamado import Chamado
+from src.models.cliente import Cliente
+from src.models.contrato import Contrato
+from src.services.kpi_service import KPIService
+
+
+@pytest.fixture
+def session_factory(db_session):
+    # database.engine aponta para o SQLite de teste (ver conftest)
+    return async_sessionmaker(bind=database.engine, expire_on_commit=False)
+
+def _chamado(n, canal, status, encaminhado):
+    return Chamado(
+        protocolo=f"P{n}", cliente_id=1, canal=canal, mensagem="teste",
+        status=status, encaminhado_para_humano=encaminhado
+    )
+
+@pytest.mark.asyncio
+async def test_kpi_counts_in_one_query(session_factory):
+    async with session_factory() as session:
+        session.add_all([
+            Cliente(nome="Ana", email="ana@example.com", hashed_password="x"),
+            Cliente(nome="Bia", email="bia@example.com", hashed_password="x"),
+            Contrato(cliente_id=1, plano_id=1, data_inicio=date(2024, 1, 1), status="ativo"),
+            Contrato(cliente_id=1, plano_id=1, data_inicio=date(2024, 1, 1), status="ativo"),
+            Contrato(cliente_id=2, plano_id=1, data_inicio=date(2024, 1, 1), status="ativo"),
+            Contrato(cliente_id=2, plano_id=1, data_inicio=date(2024, 1, 1), status="cancelado"),
+            _chamado(1, "chat_ia", "resolvido", False),
+            _chamado(2, "chat_ia", "resolvido", False),
+            _chamado(3, "site", "aberto", False),
+            _chamado(4, "whatsapp", "encaminhado", True),
+        ])
+        await session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(database.engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        async with session_factory() as session:
+            counts = await KPIService.get_counts(session)
+    finally:
+        event.remove(database.engine.sync_engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert counts == {
+        "total_clientes": 2,
+        "total_contratos": 4,
+        "contratos_ativos": 3,
+        "contratos_cancelados": 1,
+        "total_chamados": 4,
+        "chamados_abertos": 1,
+        "chamados_automaticos": 3,
+        "chamados_encaminhados": 1,
+        "chamados_ia_resolvidos": 2,
+    }
+
+    kpis = KPIService.dashboard_kpis(counts)
+    assert kpis["churn_rate"] == "25.0%"
+    assert kpis["ai_resolution_rate"] == "50.0%"
+    assert kpis["total_savings"] == "R$ 29.00"
+    assert KPIService.metricas_gerais(counts)["taxa_resolucao_automatica"] == "75.0%"
+
+@pytest.mark.asyncio
+async def test_kpi_counts_on_empty_tables(session_factory):
+    async with session_factory() as session:
+        counts = await KPIService.get_counts(session)
+    assert set(counts.values()) == {0}
+    assert KPIService.dashboard_kpis(counts)["churn_rate"] == "0%"
+
+@pytest.mark.asyncio
+async def test_grouped_metrics_single_group_by(session_factory):
+    from datetime import datetime
+
+    async with session_factory() as session:
+        chamados = [
+            _chamado(1, "chat_ia", "resolvido", False),
+            _chamado(2, "chat_ia", "resolvido", False),
+            _chamado(3, "chat_ia", "encaminhado", True),
+            _chamado(4, "site", "aberto", False),
+        ]
+        chamados[3].data_criacao = datetime(2024, 1, 10, 15, 0)
+        session.add_all(chamados)
+        await session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(database.engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        async with session_factory() as session:
+            grupos = await KPIService.get_grouped(session, ["canal", "status"])
+    finally:
+        event.remove(database.engine.sync_engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert grupos[0] == {
+        "canal": "chat_ia", "status": "resolvido", "total": 2,
+        "resolvidos_automaticamente": 2, "taxa_resolucao": "100.0%",
+    }
+    assert len(grupos) == 3
+
+    async with session_factory() as session:
+        # Período inclusivo: o chamado das 15h do dia 10 entra com data_fim = 10
+        grupos = await KPIService.get_grouped(session, ["canal"], date(2024, 1, 1), date(2024, 1, 10))
+        assert [(g["canal"], g["total"]) for g in grupos] == [("site", 1)]
+
+        with pytest.raises(ValueError):
+            await KPIService.get_grouped(session, ["cliente_id"])
+
+@pytest.mark.asyncio
+async def test_kpi_snapshot_stale_while_revalidate(session_factory):
+    from datetime import timedelta
+
+    from sqlalchemy import func, select
+
+    from src.models.metrica import Metrica
+    from src.services.kpi_snapshot import KPISnapshotRefresher
+
+    refresher = KPISnapshotRefresher(session_factory, interval=60)
+    # No snapshot yet: computed on the request
+    snapshot = await refresher.get_snapshot()
+    assert snapshot["counts"]["total_chamados"] == 0
+    assert refresher.refreshes == 1
+
+    async with session_factory() as session:
+        session.add(_chamado(1, "site", "aberto", False))
+        await session.commit()
+
+    # Fresh snapshot is served as is
+    assert (await refresher.get_snapshot())["counts"]["total_chamados"] == 0
+
+    # Stale snapshot is served once and refreshed in the background
+    async with session_factory() as session:
+        metrica = (await session.execute(select(Metrica))).scalar_one()
+        metrica.data_atualizacao -= timedelta(seconds=120)
+        await session.commit()
+    refresher._snapshot = None  # e.g. a worker that just started
+    assert (await refresher.get_snapshot())["counts"]["total_chamados"] == 0
+    await refresher._revalidating
+    assert (await refresher.get_snapshot())["counts"]["total_chamados"] == 1
+    assert refresher.stats()["stale_served"] == 1 and refresher.refreshes == 2
+
+    # Another worker adopts the recent snapshot instead of counting again
+    other = KPISnapshotRefresher(session_factory, interval=60)
+    await other.revalidate()
+    assert other.refreshes == 0 and other._snapshot["counts"]["total_chamados"] == 1
+
+    # Snapshots older than the retention are pruned on the next write
+    async with session_factory() as session:
+        old = (await session.execute(select(Metrica).order_by(Metrica.id).limit(1))).scalar_one()
+        old.data_atualizacao -= timedelta(days=30)
+        await session.commit()
+    await refresher.refresh()
+    async with session_factory() as session:
+        assert (await session.execute(select(func.count()).select_from(Metrica))).scalar() == 2
+    await refresher.stop()
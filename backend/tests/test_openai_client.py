@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.config import openai_client
+from src.config.settings import settings
+
+
+@pytest.fixture
+def azure_settings():
+    with patch.object(settings, "AZURE_OPENAI_ENDPOINT", "https://fake.openai.azure.com/"), \
+         patch.object(settings, "AZURE_OPENAI_KEY", "fake-key"):
+        yield
+
+@pytest.mark.asyncio
+async def test_openai_client_is_shared_and_uses_pool(azure_settings):
+    client_a = openai_client.get_openai_client()
+    client_b = openai_client.get_openai_client()
+
+    assert client_a is client_b
+    assert client_a._client is openai_client.get_http_client()
+
+    stats = openai_client.pool_stats()
+    assert stats["connections"] == 0
+    assert stats["http2"] is False
+
+    await openai_client.close_openai_client()
+    assert openai_client.pool_stats()["connections"] == 0
+    assert openai_client.get_openai_client() is not client_a
+    await openai_client.close_openai_client()
+
+def test_openai_client_not_configured():
+    with patch.object(settings, "AZURE_OPENAI_KEY", None):
+        assert openai_client.get_openai_client() is None
+
+@pytest.mark.asyncio
+async def test_rag_service_uses_shared_client(azure_settings):
+    from src.services.rag_service import RAGService
+
+    assert RAGService._get_client() is openai_client.get_openai_client()
+    await openai_client.close_openai_client()
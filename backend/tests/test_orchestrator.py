@@ -1,7 +1,10 @@
-import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
 from src.agents.orchestrator import AgentOrchestrator
 
+
 @pytest.fixture
 def mock_router():
     with patch("src.agents.orchestrator.RouterAgent") as MockRouter:
@@ -68,3 +71,175 @@ async def test_orchestrator_error(mock_router, mock_agents):
     
     assert result["agent_used"] == "system_error"
     assert "erro interno" in result["response"]
+
+@pytest.mark.asyncio
+async def test_orchestrator_stream_events(mock_router, mock_agents):
+    mock_router.route.return_value = {"agent": "technical_agent", "confidence": 0.8}
+
+    async def fake_stream(message, context=None):
+        yield {"event": "tool_call", "data": {"plugin": "TechnicalPlugin", "function": "search_knowledge_base"}}
+        yield {"event": "delta", "data": {"text": "Reinicie "}}
+        yield {"event": "delta", "data": {"text": "o modem"}}
+
+    mock_agents["technical_agent"].stream_message = fake_stream
+
+    orchestrator = AgentOrchestrator()
+    events = [e async for e in orchestrator.stream_message("Internet caiu", {"session_id": "stream-test"})]
+
+    assert events[0] == {"event": "routing", "data": {"agent": "technical_agent", "confidence": 0.8, "reasoning": None}}
+    assert [e["event"] for e in events[1:]] == ["tool_call", "delta", "delta", "done"]
+
+    from src.memory.session_manager import get_session_manager
+    history, version = await get_session_manager().get_history("stream-test")
+    assert history[-1]["content"] == "Reinicie o modem"
+
+@pytest.mark.asyncio
+async def test_orchestrator_speculation_hit(mock_router, mock_agents):
+    mock_router.route.return_value = {"agent": "technical_agent", "confidence": 0.9}
+
+    orchestrator = AgentOrchestrator()
+    orchestrator.speculation_mode = "history"
+    context = {"session_id": "spec-hit"}
+    from src.memory.session_manager import get_session_manager
+    await get_session_manager().append_history("spec-hit", [
+        {"role": "user", "content": "Sem internet"},
+        {"role": "assistant", "content": "Reinicie o modem", "agent": "technical_agent"},
+    ])
+
+    result = await orchestrator.process_message("Continua sem sinal", context)
+
+    assert result["response"] == "Technical Response"
+    mock_agents["technical_agent"].process_message.assert_called_once()
+    assert orchestrator.get_stats()["speculation"]["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_orchestrator_speculation_miss_cancels(mock_router, mock_agents):
+    import asyncio
+
+    async def slow_route(message, context=None):
+        await asyncio.sleep(0.01)
+        return {"agent": "financial_agent", "confidence": 0.9}
+    mock_router.route.side_effect = slow_route
+
+    started = asyncio.Event()
+    async def never_finishes(message, context=None):
+        started.set()
+        await asyncio.sleep(10)
+    mock_agents["technical_agent"].process_message = AsyncMock(side_effect=never_finishes)
+
+    orchestrator = AgentOrchestrator()
+    orchestrator.speculation_mode = "history"
+    from src.memory.session_manager import get_session_manager
+    await get_session_manager().append_history("spec-miss", [
+        {"role": "assistant", "content": "Reinicie o modem", "agent": "technical_agent"},
+    ])
+
+    result = await orchestrator.process_message("Quero meu boleto", {"session_id": "spec-miss"})
+
+    assert started.is_set()
+    assert result["agent_used"] == "financial_agent"
+    assert result["response"] == "Financial Response"
+    stats = orchestrator.get_stats()["speculation"]
+    assert stats["misses"] == 1 and stats["wasted_tokens_estimated"] > 0
+
+@pytest.mark.asyncio
+async def test_speculative_side_effects_wait_for_confirmation():
+    import asyncio
+
+    from src.agents.context import confirm_side_effects, set_speculation_gate
+
+    gate = asyncio.Event()
+    writes = []
+
+    async def speculative_tool():
+        set_speculation_gate(gate)
+        await confirm_side_effects()
+        writes.append("ticket")
+
+    task = asyncio.create_task(speculative_tool())
+    await asyncio.sleep(0)
+    assert writes == []
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert writes == []
+
+    await confirm_side_effects()  # no gate outside speculation: returns immediately
+
+def test_assemble_history_fits_budget_and_truncates_assistant_turns():
+    from src.agents.history import assemble_history
+
+    history = [
+        {"role": "user", "content": "primeira pergunta " * 50},
+        {"role": "assistant", "content": "resposta muito longa " * 200, "agent": "general_agent"},
+        {"role": "user", "content": "e agora?"},
+    ]
+    turns, tokens = assemble_history(history, budget_tokens=120, max_assistant_tokens=50)
+
+    assert [t["role"] for t in turns] == ["assistant", "user"]
+    assert turns[0]["content"].endswith("[...]")
+    assert turns[0]["agent"] == "general_agent"
+    assert tokens <= 120
+
+@pytest.mark.asyncio
+async def test_orchestrator_reports_prompt_tokens_and_budgeted_history(mock_router, mock_agents):
+    mock_router.route.return_value = {"agent": "sales_agent", "confidence": 0.9}
+
+    from src.memory.session_manager import get_session_manager
+    await get_session_manager().append_history("budget", [
+        {"role": "user", "content": f"mensagem {i} " * 100} for i in range(30)
+    ])
+
+    orchestrator = AgentOrchestrator()
+    with patch("src.agents.orchestrator.history_budget", return_value=200):
+        result = await orchestrator.process_message("Quero um upgrade", {"session_id": "budget"})
+
+    assert result["prompt_tokens"] > 0
+    agent_context = mock_agents["sales_agent"].process_message.call_args[0][1]
+    assert len(agent_context["chat_history"]) < 30
+    assert agent_context["chat_history"][-1]["content"] == "Quero um upgrade"
+
+@pytest.mark.asyncio
+async def test_orchestrator_stream_agent_error_is_not_saved(mock_router, mock_agents):
+    mock_router.route.return_value = {"agent": "technical_agent", "confidence": 0.8}
+
+    async def failing_stream(message, context=None):
+        yield {"event": "delta", "data": {"text": "Reinicie "}}
+        yield {"event": "error", "data": {"message": "Ocorreu um erro ao processar sua solicitação."}}
+
+    mock_agents["technical_agent"].stream_message = failing_stream
+
+    orchestrator = AgentOrchestrator()
+    events = [e async for e in orchestrator.stream_message("Internet caiu", {"session_id": "stream-error"})]
+
+    assert [e["event"] for e in events[1:]] == ["delta", "error"]
+    from src.memory.session_manager import get_session_manager
+    assert await get_session_manager().get_history("stream-error") == ([], 0)
+
+@pytest.mark.asyncio
+async def test_orchestrator_concurrent_turns_of_a_session_are_both_saved(mock_router, mock_agents):
+    import asyncio
+
+    from src.memory.session_manager import get_session_manager
+
+    mock_router.route.return_value = {"agent": "financial_agent", "confidence": 0.9}
+    second_done = asyncio.Event()
+
+    async def answer(message, context=None):
+        # The first message finishes only after the second one was saved
+        if message == "primeira":
+            await second_done.wait()
+        return f"resposta {message}"
+
+    mock_agents["financial_agent"].process_message = AsyncMock(side_effect=answer)
+    orchestrator = AgentOrchestrator()
+    context = {"session_id": "concurrent-turns"}
+
+    async def second():
+        await orchestrator.process_message("segunda", context)
+        second_done.set()
+
+    await asyncio.gather(orchestrator.process_message("primeira", context), second())
+
+    history, _ = await get_session_manager().get_history("concurrent-turns")
+    assert [entry["content"] for entry in history] == ["segunda", "resposta segunda", "primeira", "resposta primeira"]
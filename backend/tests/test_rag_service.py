@@ -0,0 +1,264 @@
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from openai import RateLimitError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import database
+from src.models.knowledge_base import KnowledgeBaseItem
+from src.services.rag_service import RAGService
+
+
+@pytest.fixture
+def session_factory(db_session):
+    # database.engine aponta para o SQLite de teste (ver conftest)
+    return async_sessionmaker(bind=database.engine, expire_on_commit=False)
+
+def rate_limit_error():
+    response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://fake"))
+    return RateLimitError("Too Many Requests", response=response, body=None)
+
+@pytest.mark.asyncio
+async def test_ingest_documents_batches_and_retries(session_factory):
+    documents = ((f"Artigo {i}", f"Conteúdo do artigo {i}") for i in range(7))
+    calls = []
+
+    async def fake_embeddings(texts):
+        calls.append(len(texts))
+        if len(calls) == 1:
+            raise rate_limit_error()
+        return [[0.1] * 1536 for _ in texts]
+
+    with patch.object(RAGService, "generate_embeddings", side_effect=fake_embeddings), \
+         patch("src.services.rag_service.AsyncSessionLocal", session_factory):
+        report = await RAGService.ingest_documents(documents, batch_size=3, concurrency=2)
+
+    assert report["documents"] == 7
+    assert report["batches"] == 3
+    assert report["retries"] == 1
+    assert report["failed"] == 0
+    assert sorted(calls) == [1, 3, 3, 3]
+    assert report["docs_per_second"] > 0
+
+    async with session_factory() as session:
+        total = (await session.execute(select(func.count(KnowledgeBaseItem.id)))).scalar()
+    assert total == 7
+
+@pytest.mark.asyncio
+async def test_ingest_documents_reports_failed_batch(session_factory):
+    with patch.object(RAGService, "generate_embeddings", AsyncMock(side_effect=Exception("boom"))), \
+         patch("src.services.rag_service.AsyncSessionLocal", session_factory):
+        report = await RAGService.ingest_documents([("A", "a"), ("B", "b")], batch_size=10)
+
+    assert report["documents"] == 0
+    assert report["failed"] == 2
+
+def test_chunk_text_sections_offsets_and_overlap():
+    from src.utils.chunking import chunk_text
+    from src.utils.tokens import count_tokens
+
+    text = (
+        "# Internet lenta\n"
+        + "\n\n".join(f"Passo {i}: reinicie o modem e aguarde as luzes estabilizarem." for i in range(12))
+        + "\n# TV sem sinal\nVerifique o cabo HDMI.\n"
+    )
+    chunks = chunk_text(text, max_tokens=60, overlap_tokens=20)
+
+    assert len(chunks) > 2
+    assert all(text[c.start:c.end] == c.content for c in chunks)
+    assert all(count_tokens(c.content) <= 60 for c in chunks)
+    # Trechos consecutivos da mesma seção se sobrepõem
+    internet = [c for c in chunks if c.heading == "Internet lenta"]
+    assert all(b.start < a.end for a, b in zip(internet, internet[1:]))
+    # A última seção não é misturada com a anterior
+    assert chunks[-1].heading == "TV sem sinal"
+    assert chunks[-1].content.startswith("# TV sem sinal")
+
+@pytest.mark.asyncio
+async def test_ingested_documents_are_stored_as_chunks(session_factory):
+    from src.models.knowledge_base import KnowledgeBaseChunk
+
+    content = "\n\n".join(f"Parágrafo {i} sobre configuração do roteador Wi-Fi." for i in range(40))
+    with patch.object(RAGService, "generate_embeddings", AsyncMock(side_effect=lambda texts: [[0.1] * 1536 for _ in texts])), \
+         patch("src.services.rag_service.AsyncSessionLocal", session_factory), \
+         patch("src.services.rag_service.settings.KB_CHUNK_MAX_TOKENS", 80):
+        report = await RAGService.ingest_documents([("Roteador", content)])
+
+    async with session_factory() as session:
+        chunks = (await session.execute(
+            select(KnowledgeBaseChunk).order_by(KnowledgeBaseChunk.chunk_index)
+        )).scalars().all()
+        document = await session.get(KnowledgeBaseItem, chunks[0].document_id)
+
+    assert report["chunks"] == len(chunks) > 1
+    assert document.embedding is None
+    assert all(content[c.start_offset:c.end_offset] == c.content for c in chunks)
+
+def test_vector_index_ddl_and_query_settings():
+    from src.services.vector_index import VectorIndexManager
+
+    with patch("src.services.vector_index.settings") as mock_settings:
+        mock_settings.VECTOR_INDEX_TYPE = "hnsw"
+        mock_settings.VECTOR_INDEX_HNSW_M = 24
+        mock_settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION = 128
+        mock_settings.VECTOR_INDEX_HNSW_EF_SEARCH = 80
+
+        ddl = VectorIndexManager.index_ddl("knowledge_base_chunks", "embedding", "idx_chunks", concurrently=True)
+        assert ddl == (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks ON knowledge_base_chunks "
+            "USING hnsw (embedding vector_cosine_ops) WITH (m = 24, ef_construction = 128)"
+        )
+        assert VectorIndexManager.query_settings() == ["SET LOCAL hnsw.ef_search = 80"]
+
+        # Definição como retornada por pg_indexes
+        indexdef = "CREATE INDEX idx_chunks ON public.knowledge_base_chunks USING hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64')"
+        assert not VectorIndexManager._matches(indexdef, "hnsw")
+        assert VectorIndexManager._matches(indexdef.replace("'16'", "'24'").replace("'64'", "'128'"), "hnsw")
+        assert not VectorIndexManager._matches(indexdef, "ivfflat")
+
+def test_numpy_vector_store_top_k_and_snapshot(tmp_path):
+    import numpy as np
+
+    from src.services.vector_store import NumpyVectorStore
+
+    store = NumpyVectorStore(dim=4)
+    vectors = np.eye(4, dtype=np.float32).tolist()
+    metadata = [{"id": i, "topic": f"T{i}", "content": f"c{i}", "document_id": i, "chunk_index": 0} for i in range(4)]
+    store.add(vectors, metadata)
+    store.add(vectors[:1], metadata[:1])  # trecho repetido é ignorado
+    assert len(store) == 4
+
+    results = store.search([0.1, 0.9, 0.3, 0.0], limit=2)
+    assert [r["topic"] for r in results] == ["T1", "T2"]
+    assert results[0]["score"] > results[1]["score"]
+
+    path = str(tmp_path / "kb.npy")
+    store.save(path)
+    loaded = NumpyVectorStore.load_snapshot(path)
+    assert len(loaded) == 4 and not loaded.dirty
+    assert loaded.search([0.1, 0.9, 0.3, 0.0], limit=2) == results
+
+    # Snapshot é somente leitura (mmap): adicionar copia a matriz
+    loaded.add([[0.0, 0.0, 0.0, 1.0]], [{"id": 99, "topic": "T99"}])
+    assert len(loaded) == 5 and loaded.dirty
+
+@pytest.mark.asyncio
+async def test_search_uses_numpy_backend_without_pgvector(session_factory):
+    from src.services import vector_store
+
+    def fake_embeddings(texts):
+        return [[1.0 if "modem" in t else 0.0] + [0.0] * 1534 + [0.0 if "modem" in t else 1.0] for t in texts]
+
+    with patch.object(RAGService, "generate_embeddings", AsyncMock(side_effect=fake_embeddings)), \
+         patch.object(RAGService, "generate_embedding", AsyncMock(return_value=[1.0] + [0.0] * 1535)), \
+         patch("src.services.rag_service.AsyncSessionLocal", session_factory), \
+         patch("src.services.rag_service.settings.RAG_HYBRID_ENABLED", False), \
+         patch.object(vector_store, "_vector_store", None):
+        await RAGService.ingest_documents([("Internet", "Reinicie o modem."), ("Fatura", "Segunda via do boleto.")])
+        await vector_store.load_vector_store(session_factory)
+        await RAGService.add_document("Modem", "Luzes do modem piscando.")
+
+        results = await RAGService.search("modem", limit=3)
+
+    assert vector_store.use_numpy_backend()  # SQLite de teste
+    assert {r["topic"] for r in results[:2]} == {"Internet", "Modem"}
+    assert results[-1]["topic"] == "Fatura"
+
+def test_lexical_tokenizer_folds_accents_and_stems():
+    from src.services.lexical_index import tokenize
+
+    assert tokenize("Conexão") == tokenize("conexao")
+    assert tokenize("luz vermelha") == tokenize("Luzes VERMELHO")
+    # Siglas e códigos não passam pelo stemming; stopwords são removidas
+    assert tokenize("LOS da PON com erro E012") == ["los", "pon", "err", "e012"]
+
+def test_bm25_and_reciprocal_rank_fusion():
+    from src.services.lexical_index import (
+        BM25Index,
+        is_confident,
+        reciprocal_rank_fusion,
+    )
+
+    index = BM25Index()
+    index.add([
+        {"id": 1, "topic": "Internet lenta", "content": "Reinicie o roteador e teste a velocidade.", "document_id": 1, "chunk_index": 0},
+        {"id": 2, "topic": "ONU", "content": "Luz LOS vermelha na ONU indica rompimento da fibra (PON).", "document_id": 2, "chunk_index": 0},
+        {"id": 3, "topic": "Wi-Fi", "content": "Altere o canal do roteador para reduzir interferência.", "document_id": 3, "chunk_index": 0},
+    ])
+    results = index.search("luz los vermelho", limit=3)
+    assert results[0]["topic"] == "ONU" and results[0]["coverage"] == 1.0
+    assert is_confident(results, margin=1.5)
+    assert not is_confident(index.search("roteador", limit=3), margin=1.5)
+
+    lexical = [{"topic": "A", "document_id": 1, "chunk_index": 0}, {"topic": "B", "document_id": 2, "chunk_index": 0}]
+    vector = [{"topic": "B", "document_id": 2, "chunk_index": 0}, {"topic": "C", "document_id": 3, "chunk_index": 0}]
+    assert [r["topic"] for r in reciprocal_rank_fusion([lexical, vector], k=60)] == ["B", "A", "C"]
+
+@pytest.mark.asyncio
+async def test_hybrid_search_lexical_only_and_fused(session_factory):
+    from src.services import lexical_index
+
+    documents = [
+        ("ONU", "Luz LOS vermelha na ONU indica rompimento da fibra."),
+        ("Internet lenta", "Reinicie o roteador e teste a velocidade da internet."),
+        ("Wi-Fi", "Altere o canal do roteador Wi-Fi para reduzir interferência."),
+    ]
+    embed_query = AsyncMock(return_value=[0.1] * 1536)
+    vector_results = [{"topic": "Wi-Fi", "content": "...", "document_id": 3, "chunk_index": 0}]
+
+    with patch.object(RAGService, "generate_embeddings", AsyncMock(side_effect=lambda texts: [[0.1] * 1536 for _ in texts])), \
+         patch.object(RAGService, "generate_embedding", embed_query), \
+         patch.object(RAGService, "_vector_search", AsyncMock(return_value=vector_results)), \
+         patch("src.services.rag_service.AsyncSessionLocal", session_factory), \
+         patch.object(lexical_index, "_lexical_index", None):
+        await RAGService.ingest_documents(documents[:2])
+        await lexical_index.load_lexical_index(session_factory)
+        await RAGService.add_document(*documents[2])  # atualização incremental do índice
+
+        # Termos exatos e inequívocos: sem chamada de embedding
+        results = await RAGService.search("LOS vermelha", limit=2)
+        assert results[0]["topic"] == "ONU"
+        embed_query.assert_not_awaited()
+
+        # Ambíguo: combina BM25 e vetorial
+        results = await RAGService.search("roteador", limit=3)
+        embed_query.assert_awaited_once()
+        assert results[0]["topic"] == "Wi-Fi"
+        assert {r["topic"] for r in results} == {"Wi-Fi", "Internet lenta"}
+
+@pytest.mark.asyncio
+async def test_empty_vector_store_is_not_reloaded_on_every_search(session_factory):
+    from src.services import vector_store
+
+    async def load_from_test_db():
+        return await vector_store.load_vector_store(session_factory)
+
+    load = AsyncMock(side_effect=load_from_test_db)
+    with patch.object(RAGService, "generate_embedding", AsyncMock(return_value=[1.0] + [0.0] * 1535)), \
+         patch("src.services.rag_service.settings.RAG_HYBRID_ENABLED", False), \
+         patch("src.services.rag_service.load_vector_store", load), \
+         patch("src.services.vector_store.settings.VECTOR_STORE_SNAPSHOT_PATH", None), \
+         patch.object(vector_store, "_vector_store", None):
+        assert await RAGService.search("modem") == []
+        assert await RAGService.search("modem") == []
+
+    assert load.await_count == 1
+
+@pytest.mark.asyncio
+async def test_empty_lexical_index_is_not_rebuilt_on_every_search(session_factory):
+    from src.services import lexical_index
+
+    async def load_from_test_db():
+        return await lexical_index.load_lexical_index(session_factory)
+
+    load = AsyncMock(side_effect=load_from_test_db)
+    with patch.object(RAGService, "generate_embedding", AsyncMock(return_value=[0.1] * 1536)), \
+         patch.object(RAGService, "_vector_search", AsyncMock(return_value=[])), \
+         patch("src.services.rag_service.load_lexical_index", load), \
+         patch.object(lexical_index, "_lexical_index", None):
+        assert await RAGService.search("modem") == []
+        assert await RAGService.search("modem") == []
+
+    assert load.await_count == 1
@@ -136,3 +136,195 @@ async def test_get_agent_info(router_agent):
     
     assert info is not None
     assert "Boletos" in info or "pagamentos" in info
+
+
+# ================== EMBEDDING FAST PATH ==================
+
+from src.agents.embedding_router import EmbeddingRouter, RoutingDecisionLog
+
+
+def test_embedding_router_classify_margin():
+    centroids = EmbeddingRouter.compute_centroids(
+        ["financial_agent", "financial_agent", "technical_agent"],
+        [[1.0, 0.1, 0.0], [0.9, 0.0, 0.1], [0.0, 1.0, 0.0]],
+    )
+    router = EmbeddingRouter(centroids, margin_threshold=0.1)
+
+    agent, similarity, margin = router.classify([1.0, 0.05, 0.0])
+    assert agent == "financial_agent"
+    assert similarity > 0.9
+    assert margin > 0.1
+
+
+@pytest.mark.asyncio
+async def test_embedding_router_embeds_the_logged_form_of_the_message(tmp_path):
+    from src.services.rag_service import RAGService
+
+    router = EmbeddingRouter({"financial_agent": [1.0, 0.0], "technical_agent": [0.0, 1.0]})
+    path = str(tmp_path / "centroids.json")
+    router.save(path)
+    loaded = EmbeddingRouter.load(path)
+
+    embed = AsyncMock(return_value=[1.0, 0.0])
+    with patch.object(RAGService, "generate_embedding", embed):
+        result = await loaded.route("Fatura 123 de joão@mail.com.br")
+    # Same text the decision log (training data) stores
+    embed.assert_awaited_once_with("fatura <num> de <email>")
+    assert result["agent"] == "financial_agent"
+
+    raw = EmbeddingRouter({"financial_agent": [1.0, 0.0], "technical_agent": [0.0, 1.0]}, raw_text=True)
+    raw.save(path)
+    assert EmbeddingRouter.load(path).prepare("Fatura 123") == "Fatura 123"
+
+
+@pytest.mark.asyncio
+async def test_route_uses_fast_path(router_agent, mock_kernel):
+    fast_path = MagicMock()
+    fast_path.route = AsyncMock(return_value={"agent": "financial_agent", "confidence": 0.97, "source": "embedding"})
+    router_agent.fast_path = fast_path
+
+    result = await router_agent.route("segunda via do boleto")
+
+    assert result["source"] == "embedding"
+    mock_kernel.get_service.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_route_fast_path_fallback_logs_decision(router_agent, mock_kernel, tmp_path):
+    fast_path = MagicMock()
+    fast_path.route = AsyncMock(return_value=None)  # margin too low
+    router_agent.fast_path = fast_path
+    router_agent.decision_log = RoutingDecisionLog(str(tmp_path / "decisions.jsonl"))
+
+    mock_response = MagicMock()
+    mock_response.__str__ = lambda self: '{"agent": "technical_agent", "confidence": 0.9, "reasoning": "Sem sinal"}'
+    mock_chat_service = AsyncMock()
+    mock_chat_service.get_chat_message_content = AsyncMock(return_value=mock_response)
+    mock_kernel.get_service.return_value = mock_chat_service
+
+    result = await router_agent.route("Estou sem internet, meu CPF é 123.456.789-00")
+
+    assert result["agent"] == "technical_agent"
+    router_agent.decision_log.flush()
+    logged = router_agent.decision_log.read()
+    # Stored normalized: numbers (CPF, phone, invoice) and emails masked
+    assert logged[0]["text"] == "estou sem internet, meu cpf e <num>"
+    assert logged[0]["agent"] == "technical_agent"
+
+
+def test_decision_log_retention(tmp_path):
+    import json
+    from datetime import datetime, timedelta, timezone
+
+    path = tmp_path / "decisions.jsonl"
+    old = (datetime.now(timezone.utc) - timedelta(days=40)).isoformat()
+    path.write_text(json.dumps({"text": "antiga", "agent": "general_agent", "confidence": 0.9, "ts": old}) + "\n")
+
+    log = RoutingDecisionLog(str(path), raw_text=True, retention_days=30)
+    assert [d["text"] for d in log.read()] == ["antiga"]
+    # The first write of the process prunes expired lines
+    log.append("Boleto 2024", {"agent": "financial_agent", "confidence": 0.9}).result()
+    assert [d["text"] for d in log.read()] == ["Boleto 2024"]
+
+
+# ================== ROUTER DECISION CACHE ==================
+
+from src.agents.router_cache import RouterDecisionCache, normalize_message
+
+
+def test_normalize_message():
+    assert normalize_message("  Segunda   VIA do Boleto!! ") == "segunda via do boleto!!"
+    assert normalize_message("Fatura 123 de joão@mail.com.br") == "fatura <num> de <email>"
+    assert normalize_message("Olá") == normalize_message("ola")
+
+
+def test_router_cache_lru_and_ttl():
+    cache = RouterDecisionCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", None, {"agent": "general_agent"})
+    cache.set("b", None, {"agent": "sales_agent"})
+    assert cache.get("a") == {"agent": "general_agent"}  # "a" becomes most recent
+    cache.set("c", None, {"agent": "technical_agent"})    # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    expired = RouterDecisionCache(ttl_seconds=-1)
+    expired.set("a", None, {"agent": "general_agent"})
+    assert expired.get("a") is None
+
+
+def test_router_cache_key_uses_routing_context_only():
+    ctx_a = {"is_authenticated": True, "client_tickets": [1], "chat_history": []}
+    ctx_b = {"is_authenticated": True, "client_tickets": [2, 3], "chat_history": []}
+    ctx_c = {"is_authenticated": True, "chat_history": [{"role": "assistant", "agent": "sales_agent"}]}
+
+    assert RouterDecisionCache.make_key("oi", ctx_a) == RouterDecisionCache.make_key("Oi", ctx_b)
+    assert RouterDecisionCache.make_key("oi", ctx_a) != RouterDecisionCache.make_key("oi", ctx_c)
+
+
+@pytest.mark.asyncio
+async def test_route_cache_hit_skips_llm(router_agent, mock_kernel):
+    router_agent.cache = RouterDecisionCache()
+
+    mock_response = MagicMock()
+    mock_response.__str__ = lambda self: '{"agent": "financial_agent", "confidence": 0.95, "reasoning": "Boleto"}'
+    mock_chat_service = AsyncMock()
+    mock_chat_service.get_chat_message_content = AsyncMock(return_value=mock_response)
+    mock_kernel.get_service.return_value = mock_chat_service
+
+    await router_agent.route("Segunda via do boleto")
+    result = await router_agent.route("segunda  via do BOLETO")
+
+    assert result["agent"] == "financial_agent"
+    assert result["cached"] is True
+    mock_chat_service.get_chat_message_content.assert_called_once()
+
+
+# ================== ROUTER MICRO-BATCHING ==================
+
+from src.agents.router_batcher import RouterBatcher
+
+
+@pytest.mark.asyncio
+async def test_router_batcher_single_llm_call(router_agent, mock_kernel):
+    import asyncio
+
+    mock_response = MagicMock()
+    mock_response.__str__ = lambda self: (
+        '{"decisions": ['
+        '{"id": 1, "agent": "technical_agent", "confidence": 0.9, "reasoning": "Sem sinal"},'
+        '{"id": 0, "agent": "financial_agent", "confidence": 0.95, "reasoning": "Boleto"}]}'
+    )
+    mock_chat_service = AsyncMock()
+    mock_chat_service.get_chat_message_content = AsyncMock(return_value=mock_response)
+    mock_kernel.get_service.return_value = mock_chat_service
+    router_agent.batcher = RouterBatcher(router_agent, window_ms=5, max_batch=10)
+
+    results = await asyncio.gather(
+        router_agent.route("Segunda via do boleto"),
+        router_agent.route("Estou sem internet"),
+    )
+
+    assert [r["agent"] for r in results] == ["financial_agent", "technical_agent"]
+    mock_chat_service.get_chat_message_content.assert_called_once()
+    assert router_agent.batcher.stats()["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_router_batcher_missing_decision_falls_back(router_agent, mock_kernel):
+    import asyncio
+
+    batch_response = MagicMock()
+    batch_response.__str__ = lambda self: '{"decisions": [{"id": 0, "agent": "sales_agent", "confidence": 0.9}]}'
+    single_response = MagicMock()
+    single_response.__str__ = lambda self: '{"agent": "general_agent", "confidence": 0.8, "reasoning": "Saudação"}'
+    mock_chat_service = AsyncMock()
+    mock_chat_service.get_chat_message_content = AsyncMock(side_effect=[batch_response, single_response])
+    mock_kernel.get_service.return_value = mock_chat_service
+    router_agent.batcher = RouterBatcher(router_agent, window_ms=50, max_batch=2)
+
+    results = await asyncio.gather(router_agent.route("Quero upgrade"), router_agent.route("Oi"))
+
+    assert [r["agent"] for r in results] == ["sales_agent", "general_agent"]
+    assert router_agent.batcher.stats()["individual_fallbacks"] == 1
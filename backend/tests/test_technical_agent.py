@@ -1,6 +1,8 @@
-import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
 import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
 from src.agents.technical_agent import TechnicalAgent, TechnicalPlugin
 from src.services.technical_service import TechnicalService
 
@@ -100,3 +102,49 @@ async def test_process_message(mock_kernel, mock_azure_chat_completion):
         
         chat_service = agent.kernel.get_service.return_value
         chat_service.get_chat_message_content.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_stream_message_failure_is_an_error_event(mock_kernel, mock_azure_chat_completion):
+    with patch("src.agents.technical_agent.settings") as mock_settings:
+        mock_settings.AZURE_OPENAI_KEY = "dummy"
+        mock_settings.AZURE_OPENAI_ENDPOINT = "dummy"
+
+        agent = TechnicalAgent()
+        chat_service = agent.kernel.get_service.return_value
+        chat_service.get_streaming_chat_message_contents = MagicMock(side_effect=RuntimeError("timeout"))
+
+        events = [e async for e in agent.stream_message("Minha internet caiu")]
+        assert [e["event"] for e in events] == ["error"]
+        assert events[0]["data"]["error"] == "timeout"
+
+@pytest.mark.asyncio
+async def test_technical_plugin_context_isolated_per_request():
+    """A shared plugin instance must not leak client ids between concurrent requests."""
+    import asyncio
+
+    from src.agents.context import set_request_context
+
+    plugin = TechnicalPlugin()
+
+    async def handle(client_id):
+        set_request_context({"client_id": client_id})
+        await asyncio.sleep(0)
+        return plugin.current_client_id
+
+    results = await asyncio.gather(handle(1), handle(2))
+    assert results == [1, 2]
+
+@pytest.mark.asyncio
+async def test_technical_plugin_recall_past_conversations():
+    plugin = TechnicalPlugin()
+    assert "não identificado" in await plugin.recall_past_conversations("luz vermelha")
+
+    from src.agents.context import set_request_context
+    set_request_context({"client_id": 7, "session_id": "s1"})
+    store = MagicMock()
+    store.search_similar = AsyncMock(return_value=[{"content": "LOS vermelha ontem", "similarity": 0.9}])
+    with patch("src.agents.technical_agent.get_conversation_store", return_value=store):
+        result = await plugin.recall_past_conversations("luz vermelha")
+    assert "LOS vermelha ontem" in result
+    # The current conversation is already in the agent's history
+    store.search_similar.assert_awaited_with("luz vermelha", 7, exclude_session_id="s1")